@@ -1,6 +1,8 @@
 # src/backtest.py
 import argparse
+import numpy as np
 import pandas as pd
+from .bar_store import add_store_args, load_store_args
 from .data import load_csv
 from .strategy import MACrossover
 from .metrics import equity_to_returns, sharpe_ratio, max_drawdown, total_return
@@ -13,10 +15,16 @@ class Backtester:
         self.fee = float(fee)
         self.equity_curve = []
 
-    def run(self, strategy: MACrossover):
+    def run(self, strategy: MACrossover, incremental: bool = False):
+        """
+        Simulación barra a barra. Con incremental=True usa strategy.update(bar)
+        (O(1) por barra) en lugar de recalcular signal() sobre df.loc[:ts].
+        """
+        if incremental:
+            strategy.reset()
         for ts, row in self.df.iterrows():
             price = float(row["close"])
-            sig = strategy.signal(self.df.loc[:ts])
+            sig = strategy.update(row) if incremental else strategy.signal(self.df.loc[:ts])
             # Ejecuta operaciones simples long-only
             if sig == "BUY" and self.shares == 0:
                 qty = int(self.cash // price)
@@ -31,6 +39,53 @@ class Backtester:
         curve = pd.DataFrame(self.equity_curve, columns=["timestamp", "equity"]).set_index("timestamp")
         return curve
 
+    def run_vectorized(self, strategy: MACrossover):
+        """
+        Misma simulación que run(), pero la serie de señales se calcula una
+        sola vez (O(n)) y cash/acciones/equity se derivan en forma de arrays.
+        Devuelve la misma curva de equity que run().
+        """
+        close = self.df["close"].to_numpy(dtype=float)
+        sig = strategy.signal_series(self.df).to_numpy()
+        equity, self.cash, self.shares = simulate_long_only(close, sig, self.cash, self.shares, self.fee)
+        self.equity_curve = list(zip(self.df.index, equity.tolist()))
+        curve = pd.DataFrame({"equity": equity}, index=self.df.index.rename("timestamp"))
+        return curve
+
+
+def simulate_long_only(close: np.ndarray, signals: np.ndarray, cash: float, shares: int = 0, fee: float = 0.0):
+    """
+    Simulación long-only all-in a partir de un array de señales ("BUY"/"SELL"/None).
+    Solo se recorre en Python la lista (dispersa) de barras con señal; el estado
+    entre eventos se rellena por tramos y la equity se calcula vectorizada.
+    Retorna: (equity: np.ndarray, cash_final, shares_final)
+    """
+    n = len(close)
+    cash_arr = np.empty(n, dtype=float)
+    shares_arr = np.empty(n, dtype=float)
+    events = np.flatnonzero((signals == "BUY") | (signals == "SELL"))
+    last = 0
+    for i in events:
+        price = float(close[i])
+        if signals[i] == "BUY" and shares == 0:
+            qty = int(cash // price)
+            if qty <= 0:
+                continue
+            cash_arr[last:i] = cash
+            shares_arr[last:i] = shares
+            cash -= qty * price + fee
+            shares += qty
+            last = i
+        elif signals[i] == "SELL" and shares > 0:
+            cash_arr[last:i] = cash
+            shares_arr[last:i] = shares
+            cash += shares * price - fee
+            shares = 0
+            last = i
+    cash_arr[last:] = cash
+    shares_arr[last:] = shares
+    return cash_arr + shares_arr * close, cash, shares
+
 def _infer_steps_per_year(df: pd.DataFrame) -> int:
     """Heurística simple: si los timestamps están a ~1 día => 252; si son min => 252*390 (~98k).
     Puedes ajustar manualmente con --steps-per-year.
@@ -47,17 +102,27 @@ def _infer_steps_per_year(df: pd.DataFrame) -> int:
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Backtester MACrossover con métricas")
-    parser.add_argument("--file", required=True, help="CSV: timestamp, open, high, low, close, volume")
+    parser.add_argument("--file", default="", help="CSV: timestamp, open, high, low, close, volume")
+    add_store_args(parser)
     parser.add_argument("--cash", type=float, default=10_000.0)
     parser.add_argument("--fee", type=float, default=0.0)
     parser.add_argument("--fast", type=int, default=10)
     parser.add_argument("--slow", type=int, default=30)
     parser.add_argument("--steps-per-year", type=int, default=0, help="Override de anualización (0 = inferir)")
+    parser.add_argument("--engine", choices=["loop", "incremental", "vectorized"], default="loop",
+                        help="loop = barra a barra (O(n²)); incremental = update() por barra (O(n)); "
+                             "vectorized = señales en una pasada (O(n))")
     args = parser.parse_args()
 
-    df = load_csv(args.file)
+    if not args.file and not args.store:
+        parser.error("Indica --file o --store/--symbol")
+    df = load_store_args(args) if args.store else load_csv(args.file)
     bt = Backtester(df, cash=args.cash, fee=args.fee)
-    curve = bt.run(MACrossover(fast=args.fast, slow=args.slow))
+    strategy = MACrossover(fast=args.fast, slow=args.slow)
+    if args.engine == "vectorized":
+        curve = bt.run_vectorized(strategy)
+    else:
+        curve = bt.run(strategy, incremental=args.engine == "incremental")
     rets = equity_to_returns(curve["equity"])
     spy = args.steps_per_year or _infer_steps_per_year(curve)
 
@@ -0,0 +1,171 @@
+# src/bar_cache.py
+"""
+Caché local incremental de barras por (símbolo, timeframe).
+
+- Tras la primera descarga solo se piden barras desde el último timestamp
+  cacheado (incluido), así la vela en formación se vuelve a pedir y su
+  corrección reemplaza a la versión anterior.
+- Se guarda en disco (JSON por clave) para que un reinicio arranque en caliente.
+- Los timestamps son ISO-8601 UTC ("2025-09-21T13:30:00Z"), que se comparan
+  bien como texto.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+Bar = Dict[str, Any]
+
+
+class BarCache:
+    def __init__(self, cache_dir: Optional[str] = "data/bar_cache", max_bars: int = 5_000, persist_every: float = 30.0):
+        """
+        - cache_dir: carpeta de persistencia (None = solo memoria)
+        - max_bars: barras máximas por clave (se recortan las más antiguas)
+        - persist_every: segundos mínimos entre escrituras a disco por clave
+        """
+        self.dir = Path(cache_dir) if cache_dir else None
+        self.max_bars = int(max_bars)
+        self.persist_every = float(persist_every)
+        self._bars: Dict[Tuple[str, str], List[Bar]] = {}
+        self._ts: Dict[Tuple[str, str], List[str]] = {}
+        self._dirty: Dict[Tuple[str, str], float] = {}
+        self._saved_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.RLock()
+        self.stats = {"cold_fetches": 0, "incremental_fetches": 0, "bars_received": 0, "bars_served": 0}
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.flush)
+
+    # ---------- Persistencia ----------
+    def _path(self, key: Tuple[str, str]) -> Path:
+        sym, tf = key
+        return self.dir / f"{sym}_{tf}.json"  # type: ignore[operator]
+
+    def _ensure(self, key: Tuple[str, str]) -> None:
+        if key in self._bars:
+            return
+        bars: List[Bar] = []
+        if self.dir is not None and self._path(key).exists():
+            try:
+                bars = json.loads(self._path(key).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                bars = []
+        self._bars[key] = bars
+        self._ts[key] = [b["t"] for b in bars]
+
+    def _save(self, key: Tuple[str, str]) -> None:
+        if self.dir is None:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self._bars[key], separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+        self._saved_at[key] = time.time()
+        self._dirty.pop(key, None)
+
+    def flush(self) -> None:
+        """Escribe a disco todas las claves pendientes."""
+        with self._lock:
+            for key in list(self._dirty):
+                self._save(key)
+
+    def _bump(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    # ---------- API ----------
+    def last_ts(self, symbol: str, timeframe: str) -> Optional[str]:
+        key = (symbol.upper(), timeframe)
+        with self._lock:
+            self._ensure(key)
+            ts = self._ts[key]
+            return ts[-1] if ts else None
+
+    def merge(self, symbol: str, timeframe: str, bars: List[Bar]) -> None:
+        """Añade barras nuevas; las que comparten timestamp con las cacheadas las reemplazan."""
+        if not bars:
+            return
+        key = (symbol.upper(), timeframe)
+        bars = sorted(bars, key=lambda b: b["t"])
+        with self._lock:
+            self._ensure(key)
+            cached, ts = self._bars[key], self._ts[key]
+            cut = bisect_left(ts, bars[0]["t"])
+            del cached[cut:]
+            del ts[cut:]
+            cached.extend(bars)
+            ts.extend(b["t"] for b in bars)
+            if len(cached) > self.max_bars:
+                drop = len(cached) - self.max_bars
+                del cached[:drop]
+                del ts[:drop]
+            self.stats["bars_received"] += len(bars)
+            self._dirty[key] = time.time()
+            if time.time() - self._saved_at.get(key, 0.0) >= self.persist_every:
+                self._save(key)
+
+    def tail(self, symbol: str, timeframe: str, limit: int, start_iso: Optional[str] = None) -> List[Bar]:
+        """Últimas `limit` barras (con t >= start_iso si se indica)."""
+        key = (symbol.upper(), timeframe)
+        with self._lock:
+            self._ensure(key)
+            cached, ts = self._bars[key], self._ts[key]
+            lo = max(0, len(cached) - int(limit))
+            if start_iso:
+                lo = max(lo, bisect_left(ts, start_iso))
+            out = cached[lo:]
+            self.stats["bars_served"] += len(out)
+            return list(out)
+
+    def fetch(self, fetcher, symbol: str, timeframe: str, limit: int, start_iso: Optional[str] = None,
+              cold_limit: int = 10_000, incremental_limit: int = 1_000) -> List[Bar]:
+        """
+        Devuelve barras desde la caché pidiendo al broker solo lo que falta.
+        - fetcher(symbol, timeframe, limit, start_iso) -> List[Bar]  (una llamada HTTP)
+        Una página llena se continúa desde su último timestamp (incluido) hasta
+        recibir una incompleta: tras un hueco largo no queda un tramo sin pedir.
+        """
+        last = self.last_ts(symbol, timeframe)
+        if last is None or (start_iso and last < start_iso):
+            since, page_limit = start_iso, cold_limit
+            self._bump("cold_fetches")
+        else:
+            since, page_limit = last, incremental_limit
+            self._bump("incremental_fetches")
+        while True:
+            fresh = fetcher(symbol, timeframe, page_limit, since)
+            self.merge(symbol, timeframe, fresh)
+            if len(fresh) < page_limit or fresh[-1]["t"] == since:
+                break
+            since = fresh[-1]["t"]
+        return self.tail(symbol, timeframe, limit, start_iso)
+
+    def fetch_multi(self, fetcher_multi, symbols: List[str], timeframe: str, limit: int,
+                    start_iso: Optional[str] = None) -> Dict[str, List[Bar]]:
+        """
+        Versión multi-símbolo de fetch(). Agrupa los símbolos por punto de
+        partida (fríos desde start_iso; calientes desde su último timestamp,
+        normalmente el mismo para todos) y hace una llamada por grupo.
+        - fetcher_multi(symbols, timeframe, start_iso) -> Dict[str, List[Bar]]
+        """
+        groups: Dict[Optional[str], List[str]] = {}
+        for sym in symbols:
+            last = self.last_ts(sym, timeframe)
+            if last is None or (start_iso and last < start_iso):
+                groups.setdefault(start_iso, []).append(sym)
+                self._bump("cold_fetches")
+            else:
+                groups.setdefault(last, []).append(sym)
+                self._bump("incremental_fetches")
+        for since, syms in groups.items():
+            fresh = fetcher_multi(syms, timeframe, since)
+            for sym in syms:
+                self.merge(sym, timeframe, fresh.get(sym) or [])
+        return {sym: self.tail(sym, timeframe, limit, start_iso) for sym in symbols}
@@ -0,0 +1,237 @@
+# src/bar_store.py
+"""
+Almacén local de barras en columnas binarias (.npy), particionado por
+símbolo / timeframe / mes:
+
+  <root>/<SYM>/<timeframe>/<YYYY-MM>/ts.npy, open.npy, high.npy, low.npy, close.npy, volume.npy
+
+- ts: int64 ns UTC, ordenado y sin duplicados dentro de cada partición.
+- OHLCV: float64, o float32 si se escribe con dtype="float32" (mitad de disco
+  y de páginas a mapear).
+- read() solo abre las particiones que solapan con [start, end] y las columnas
+  pedidas, con np.load(mmap_mode="r"): si el rango cae en una partición, las
+  columnas son vistas del fichero mapeado (no se lee nada más); si cruza
+  varias, solo se copian los tramos del rango. dtype="float32" compacta al leer.
+- write() fusiona con lo ya guardado (el mismo timestamp se sustituye) y
+  reescribe solo las particiones tocadas.
+- `end` es inclusivo; una fecha sin hora ("2024-03-31") cubre todo ese día.
+- El convertidor lee los CSV actuales (timestamp,open,high,low,close,volume)
+  por bloques, así que no hace falta que quepan en memoria.
+
+Ejemplo:
+  python -m src.bar_store --root data/store --data-dir data/csv --timeframe 1Min --float32
+  python -m src.bar_store --root data/store --info
+  python -m src.backtest --store data/store --symbol AAPL --start 2024-01-01 --end 2024-03-31
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def to_ns(t) -> int:
+    """str/Timestamp -> ns UTC (las fechas sin zona se toman como UTC)."""
+    ts = pd.Timestamp(t)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.as_unit("ns").value
+
+
+_DATE_ONLY = re.compile(r"^\s*\d{4}-\d{2}-\d{2}\s*$")
+
+
+def end_ns(t) -> int:
+    """Fin inclusivo en ns UTC; una fecha sin hora es el último ns de ese día."""
+    if isinstance(t, str) and _DATE_ONLY.match(t):
+        return to_ns(pd.Timestamp(t) + pd.Timedelta(days=1)) - 1
+    return to_ns(t)
+
+
+def _month_key(ns: int) -> str:
+    return str(np.datetime64(int(ns), "ns").astype("datetime64[M]"))
+
+
+class BarStore:
+    def __init__(self, root: str = "data/store"):
+        self.root = Path(root)
+
+    def path(self, symbol: str, timeframe: str) -> Path:
+        return self.root / symbol.upper() / timeframe
+
+    def partitions(self, symbol: str, timeframe: str) -> List[str]:
+        """Particiones ("YYYY-MM") de un símbolo/timeframe, ordenadas."""
+        base = self.path(symbol, timeframe)
+        if not base.is_dir():
+            return []
+        return sorted(p.name for p in base.iterdir() if p.is_dir() and (p / "ts.npy").exists())
+
+    def symbols(self, timeframe: Optional[str] = None) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir()
+                      if p.is_dir() and (timeframe is None or (p / timeframe).is_dir()))
+
+    # ---------- Escritura ----------
+    def _load_partition(self, part: Path) -> Dict[str, np.ndarray]:
+        out = {"ts": np.load(part / "ts.npy")}
+        for col in COLUMNS:
+            f = part / f"{col}.npy"
+            if f.exists():
+                out[col] = np.load(f)
+        return out
+
+    def _save_partition(self, part: Path, cols: Dict[str, np.ndarray]) -> None:
+        """Escribe en una carpeta temporal y la cambia por la anterior (un lector nunca ve columnas a medias)."""
+        tmp = part.with_name(part.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, arr in cols.items():
+            np.save(tmp / f"{name}.npy", arr)
+        old = part.with_name(part.name + ".old")
+        if part.exists():
+            os.replace(part, old)
+        os.replace(tmp, part)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def write(self, symbol: str, timeframe: str, df: pd.DataFrame, dtype: str = "float64") -> int:
+        """Añade/actualiza barras (índice de fechas, columnas OHLCV); devuelve nº de particiones tocadas."""
+        if df is None or df.empty:
+            return 0
+        idx = df.index if df.index.tz is not None else df.index.tz_localize("UTC")
+        ts = idx.as_unit("ns").asi8
+        new = {"ts": ts}
+        for col in COLUMNS:
+            if col in df.columns:
+                new[col] = df[col].to_numpy(dtype=dtype)
+        months = ts.astype("datetime64[ns]").astype("datetime64[M]")
+        base = self.path(symbol, timeframe)
+        touched = 0
+        for month in np.unique(months):
+            mask = months == month
+            cols = {k: v[mask] for k, v in new.items()}
+            part = base / str(month)
+            if (part / "ts.npy").exists():
+                old = self._load_partition(part)
+                n_old, n_new = len(old["ts"]), len(cols["ts"])
+                merged = {}
+                for k in ["ts"] + [c for c in COLUMNS if c in old or c in cols]:
+                    head = old[k] if k in old else np.full(n_old, np.nan)
+                    tail = cols[k] if k in cols else np.full(n_new, np.nan)
+                    merged[k] = np.concatenate([head, tail]).astype(np.int64 if k == "ts" else dtype, copy=False)
+                cols = merged
+            # orden estable: ante timestamps repetidos gana el último (lo recién escrito)
+            order = np.argsort(cols["ts"], kind="stable")
+            cols = {k: v[order] for k, v in cols.items()}
+            keep = np.append(cols["ts"][1:] != cols["ts"][:-1], True)
+            self._save_partition(part, {k: np.ascontiguousarray(v[keep]) for k, v in cols.items()})
+            touched += 1
+        return touched
+
+    def convert_csv(self, path: str, symbol: str, timeframe: str = "1Min", dtype: str = "float64",
+                    chunksize: int = 1_000_000) -> int:
+        """Convierte un CSV (timestamp,open,high,low,close,volume) por bloques; devuelve nº de barras."""
+        n = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], utc=True)
+            self.write(symbol, timeframe, chunk.set_index("timestamp"), dtype=dtype)
+            n += len(chunk)
+        return n
+
+    # ---------- Lectura ----------
+    def read_arrays(self, symbol: str, timeframe: str, start=None, end=None,
+                    columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        {"ts": int64 ns, col: array} de las barras en [start, end] (ambos incluidos;
+        end sin hora = hasta el final de ese día). Con una sola partición en el
+        rango son vistas del fichero mapeado.
+        """
+        cols = list(columns) if columns is not None else COLUMNS
+        lo = to_ns(start) if start is not None else None
+        hi = end_ns(end) if end is not None else None
+        parts = self.partitions(symbol, timeframe)
+        if lo is not None:
+            parts = [p for p in parts if p >= _month_key(lo)]
+        if hi is not None:
+            parts = [p for p in parts if p <= _month_key(hi)]
+        base = self.path(symbol, timeframe)
+        pieces: Dict[str, List[np.ndarray]] = {"ts": []}
+        for name in parts:
+            ts = np.load(base / name / "ts.npy", mmap_mode="r")
+            i = int(np.searchsorted(ts, lo, side="left")) if lo is not None else 0
+            j = int(np.searchsorted(ts, hi, side="right")) if hi is not None else len(ts)
+            if j <= i:
+                continue
+            pieces["ts"].append(ts[i:j])
+            for col in cols:
+                f = base / name / f"{col}.npy"
+                if f.exists():
+                    pieces.setdefault(col, []).append(np.load(f, mmap_mode="r")[i:j])
+        out: Dict[str, np.ndarray] = {"ts": np.empty(0, np.int64)}
+        for k, seq in pieces.items():
+            if not seq or len(seq) != len(pieces["ts"]):
+                continue  # columna que falta en alguna partición
+            arr = seq[0] if len(seq) == 1 else np.concatenate(seq)  # una partición: vista sin copia
+            out[k] = arr.astype(dtype, copy=False) if dtype is not None and k != "ts" else arr
+        return out
+
+    def read(self, symbol: str, timeframe: str = "1Min", start=None, end=None,
+             columns: Optional[Sequence[str]] = None, dtype: Optional[str] = None) -> pd.DataFrame:
+        """DataFrame OHLCV como el de data.load_csv (índice "timestamp" UTC), restringido a [start, end]."""
+        arrs = self.read_arrays(symbol, timeframe, start, end, columns, dtype)
+        ts = arrs.pop("ts")
+        index = pd.DatetimeIndex(np.asarray(ts).view("datetime64[ns]"), name="timestamp").tz_localize("UTC")
+        return pd.DataFrame(arrs, index=index, copy=False)
+
+
+# ---------- Opciones de CLI compartidas (backtest, sweep, portfolio_backtest) ----------
+def add_store_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--store", type=str, default="", help="Carpeta del BarStore (en lugar de CSV)")
+    p.add_argument("--symbol", type=str, default="", help="Símbolo(s) a leer del --store (A o A,B,C)")
+    p.add_argument("--store-timeframe", type=str, default="1Min")
+    p.add_argument("--start", type=str, default="", help="Inicio (ISO, incluido)")
+    p.add_argument("--end", type=str, default="", help="Fin (ISO, incluido; una fecha sola = todo ese día)")
+
+
+def load_store_args(args, symbol: Optional[str] = None) -> pd.DataFrame:
+    """Lee del --store el rango [--start, --end] de `symbol` (por defecto el primero de --symbol)."""
+    sym = symbol or args.symbol.split(",")[0]
+    df = BarStore(args.store).read(sym, args.store_timeframe, start=args.start or None, end=args.end or None)
+    if df.empty:
+        raise ValueError(f"Sin barras de {sym} ({args.store_timeframe}) en {args.store}")
+    return df
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Almacén columnar de barras (.npy mapeados por símbolo/timeframe/mes)")
+    p.add_argument("--root", type=str, default="data/store")
+    p.add_argument("--csv", type=str, default="", help="SYM=ruta.csv,SYM2=ruta2.csv a convertir")
+    p.add_argument("--data-dir", type=str, default="", help="Carpeta con SYM.csv a convertir")
+    p.add_argument("--timeframe", type=str, default="1Min")
+    p.add_argument("--float32", action="store_true", help="Guarda OHLCV en float32")
+    p.add_argument("--chunksize", type=int, default=1_000_000, help="Filas de CSV por bloque")
+    p.add_argument("--info", action="store_true", help="Lista símbolos y particiones del almacén")
+    args = p.parse_args()
+
+    from .replay import parse_data_arg
+
+    store = BarStore(args.root)
+    paths = parse_data_arg(args.csv, args.data_dir)
+    for sym, path in paths.items():
+        n = store.convert_csv(path, sym, args.timeframe, dtype="float32" if args.float32 else "float64",
+                              chunksize=args.chunksize)
+        print(f"💾 {sym}: {n} barras -> {store.path(sym, args.timeframe)}")
+    if args.info or not paths:
+        for sym in store.symbols():
+            for tf in sorted(d.name for d in (store.root / sym).iterdir() if d.is_dir()):
+                parts = store.partitions(sym, tf)
+                rows = sum(len(np.load(store.path(sym, tf) / x / "ts.npy", mmap_mode="r")) for x in parts)
+                span = f"{parts[0]} … {parts[-1]}" if parts else "-"
+                print(f"{sym:>8} {tf:>6} | {len(parts)} particiones ({span}) | {rows} barras")
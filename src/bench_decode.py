@@ -0,0 +1,62 @@
+# src/bench_decode.py
+"""
+Benchmark de la decodificación de barras: respuesta JSON del broker ->
+DataFrame OHLCV.
+
+- antes: json.loads + DataFrame de dicts + pd.to_datetime + sort_index
+- ahora: loads_json (orjson si está) + data.bars_to_df (columnas NumPy,
+  timestamps ISO de formato fijo, sin ordenar si ya viene ordenado)
+
+Ejemplo:
+  python -m src.bench_decode --sizes 100,1000,10000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from .data import _bars_to_df_generic, bars_to_df, loads_json, orjson
+
+
+def make_payload(n: int, seed: int = 0) -> bytes:
+    """Cuerpo de /stocks/{symbol}/bars con n velas de 1m (mismos campos que Alpaca)."""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2024-01-02 14:30", periods=n, freq="min", tz="UTC")
+    close = 100 + rng.normal(0, 0.1, n).cumsum()
+    bars = [
+        {"t": t, "o": round(c - 0.01, 4), "h": round(c + 0.05, 4), "l": round(c - 0.05, 4), "c": round(c, 4),
+         "v": int(v), "n": int(v // 10), "vw": round(c, 4)}
+        for t, c, v in zip(idx.strftime("%Y-%m-%dT%H:%M:%SZ"), close, rng.integers(100, 10_000, n))
+    ]
+    return json.dumps({"bars": bars, "symbol": "AAA", "next_page_token": None}).encode()
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Benchmark de decodificación JSON -> DataFrame de barras")
+    p.add_argument("--sizes", type=str, default="100,1000,10000", help="Nº de velas por respuesta")
+    p.add_argument("--repeat", type=int, default=20)
+    args = p.parse_args()
+
+    print(f"Parser JSON: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'velas':>7} | {'antes ms':>9} | {'ahora ms':>9} | {'speedup':>7} | igual")
+    for n in (int(s) for s in args.sizes.split(",")):
+        raw = make_payload(n)
+        old = lambda: _bars_to_df_generic(json.loads(raw)["bars"])
+        new = lambda: bars_to_df(loads_json(raw)["bars"])
+        same = new().equals(old().astype(float))
+        t_old, t_new = best_of(old, args.repeat), best_of(new, args.repeat)
+        print(f"{n:>7} | {t_old * 1e3:>9.2f} | {t_new * 1e3:>9.2f} | {t_old / t_new:>6.1f}x | {same}")
@@ -1,7 +1,18 @@
 # src/broker_alpaca.py
+import random
+import threading
+import time
+import pandas as pd
 import requests
-from typing import Dict, Any, List
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional
 from .config import settings
+from .bar_cache import BarCache
+from .meta_cache import AssetCache, ClockCache
+from .data import bars_to_df, loads_json
+from .telemetry import METRICS, endpoint_label
+
+OHLCV = ["open", "high", "low", "close", "volume"]
 
 
 def _headers() -> Dict[str, str]:
@@ -11,56 +22,277 @@ def _headers() -> Dict[str, str]:
     }
 
 
+class TokenBucket:
+    """
+    Limitador token-bucket thread-safe. Por defecto 200 req/min (presupuesto de
+    Alpaca), con ráfaga igual al presupuesto completo de un minuto.
+    pause_until() bloquea a todos los llamadores hasta un instante (429 / cuota agotada).
+    """
+    def __init__(self, rate_per_min: float = 200.0, burst: Optional[float] = None):
+        self.rate = float(rate_per_min) / 60.0
+        self.capacity = float(burst if burst is not None else rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Consume un token; devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = max(self.blocked_until - now, (1.0 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause_until(self, monotonic_ts: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, monotonic_ts)
+
+
+# Sesión HTTP y limitador compartidos por proceso (keep-alive, pool de conexiones)
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+LIMITER = TokenBucket(200)
+
+
+def _session() -> requests.Session:
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            sess.headers.update(_headers())
+            _SESSION = sess
+        return _SESSION
+
+
 class BrokerAlpaca:
-    def __init__(self):
+    RETRY_STATUS = {500, 502, 503, 504}
+    MULTI_CHUNK = 100        # símbolos por petición al endpoint multi
+    MULTI_PAGE_LIMIT = 10_000  # barras por página (total, no por símbolo)
+
+    def __init__(self, bar_cache: Optional[BarCache] = None, limiter: Optional[TokenBucket] = None,
+                 max_retries: int = 4, backoff_base: float = 0.5, asset_ttl: float = 6 * 3600):
         self.base = settings.alpaca_base_url
         self.data_base = settings.alpaca_data_url
+        # Caché incremental de barras (None = siempre descarga la ventana completa)
+        self.bar_cache = bar_cache
+        self.session = _session()
+        self.limiter = limiter or LIMITER
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttle_waits": 0, "throttle_wait_s": 0.0, "rate_limited": 0}
+        # Metadatos que cambian como mucho una vez al día
+        self.assets = AssetCache(self._fetch_all_assets, self._fetch_asset, ttl_seconds=asset_ttl)
+        self.clock = ClockCache(self._fetch_clock)
+
+    def _count(self, key: str, inc: float = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += inc
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Envía la petición por la sesión compartida respetando el rate limit.
+        - 429: espera Retry-After (o backoff) y reintenta; la orden no se ejecutó, así que es seguro en POST/DELETE.
+        - 5xx / errores de red: reintento con backoff exponencial solo en GET (idempotente).
+        - X-RateLimit-Remaining == 0: pausa el limitador hasta X-RateLimit-Reset.
+        No llama a raise_for_status(): eso queda en cada método.
+        """
+        kwargs.setdefault("timeout", 15)
+        idempotent = method.upper() == "GET"
+        endpoint = endpoint_label(url)
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire()
+            if waited > 0:
+                self._count("throttle_waits")
+                self._count("throttle_wait_s", waited)
+            self._count("requests")
+            t0 = time.perf_counter()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.inc("bot_http_requests_total", endpoint=endpoint, method=method, status="error")
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(self._backoff(attempt))
+                continue
+            # Latencia de cada intento (sin la espera del limitador ni los backoffs)
+            METRICS.observe("bot_http_seconds", time.perf_counter() - t0, endpoint=endpoint, method=method)
+            METRICS.inc("bot_http_requests_total", endpoint=endpoint, method=method, status=r.status_code)
+
+            self._honor_rate_headers(r)
+            retryable = r.status_code == 429 or (idempotent and r.status_code in self.RETRY_STATUS)
+            if not retryable or attempt >= self.max_retries:
+                return r
+            attempt += 1
+            self._count("retries")
+            delay = self._backoff(attempt)
+            if r.status_code == 429:
+                self._count("rate_limited")
+                retry_after = r.headers.get("Retry-After")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                self.limiter.pause_until(time.monotonic() + delay)
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** (attempt - 1)) * (1.0 + random.random() * 0.25)
+
+    def _honor_rate_headers(self, r: requests.Response) -> None:
+        remaining = r.headers.get("X-RateLimit-Remaining")
+        reset = r.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            if int(remaining) <= 0:
+                wait = max(0.0, float(reset) - time.time())
+                self.limiter.pause_until(time.monotonic() + wait)
+        except ValueError:
+            pass
 
     def get_account(self) -> Dict[str, Any]:
         """Devuelve info de la cuenta (Paper)."""
-        r = requests.get(f"{self.base}/v2/account", headers=_headers(), timeout=15)
+        r = self._request("GET", f"{self.base}/v2/account")
+        r.raise_for_status()
+        return r.json()
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        """Posiciones abiertas (qty como string; negativa en cortos)."""
+        r = self._request("GET", f"{self.base}/v2/positions")
         r.raise_for_status()
         return r.json()
 
     def get_bars(self, symbol: str, timeframe: str = "1Min", limit: int = 120, start_iso: str | None = None):
+        """
+        Barras OHLCV (lista de dicts t/o/h/l/c/v). Con bar_cache solo se piden
+        las barras desde la última cacheada y se devuelven las `limit` más recientes.
+        """
+        if self.bar_cache is not None:
+            return self.bar_cache.fetch(self._fetch_bars, symbol, timeframe, limit, start_iso)
+        return self._fetch_bars(symbol, timeframe, limit, start_iso)
+
+    def _fetch_bars(self, symbol: str, timeframe: str, limit: int, start_iso: str | None):
         params = {"timeframe": timeframe, "limit": limit, "feed": "iex"}  # feed gratuito
         if start_iso:
             params["start"] = start_iso  # ISO8601, ej: 2025-09-21T13:00:00Z
-        r = requests.get(
-            f"{self.data_base}/stocks/{symbol}/bars",
-            headers=_headers(),
-            params=params,
-            timeout=15,
-        )
+        r = self._request("GET", f"{self.data_base}/stocks/{symbol}/bars", params=params)
         r.raise_for_status()
-        data = r.json()
-        return data.get("bars", [])
+        data = loads_json(r.content)
+        return data.get("bars") or []
+
+    def get_bars_range(self, symbol: str, timeframe: str = "1Min", start_iso: str | None = None,
+                       end_iso: str | None = None) -> List[dict]:
+        """
+        Todas las barras de [start_iso, end_iso] de un símbolo, siguiendo
+        next_page_token (descargas históricas; get_bars solo trae una página).
+        """
+        params = {"timeframe": timeframe, "limit": self.MULTI_PAGE_LIMIT, "feed": "iex"}
+        if start_iso:
+            params["start"] = start_iso
+        if end_iso:
+            params["end"] = end_iso
+        out: List[dict] = []
+        while True:
+            r = self._request("GET", f"{self.data_base}/stocks/{symbol}/bars", params=params)
+            r.raise_for_status()
+            data = loads_json(r.content)
+            out.extend(data.get("bars") or [])
+            token = data.get("next_page_token")
+            if not token:
+                return out
+            params["page_token"] = token
+
+    def get_bars_multi(self, symbols: List[str], timeframe: str = "1Min", limit: int = 120,
+                       start_iso: str | None = None, frames: bool = True) -> Dict[str, Any]:
+        """
+        Barras de varios símbolos con el endpoint multi (/stocks/bars?symbols=...),
+        en bloques de MULTI_CHUNK símbolos y siguiendo next_page_token.
+        Devuelve {símbolo: DataFrame OHLCV con las `limit` velas más recientes};
+        los símbolos sin barras tienen un DataFrame vacío.
+        frames=False: devuelve las listas de barras tal cual (p. ej. para un BarRing).
+        """
+        symbols = [s.upper() for s in symbols]
+        if self.bar_cache is not None:
+            raw = self.bar_cache.fetch_multi(self._fetch_bars_multi, symbols, timeframe, limit, start_iso)
+        else:
+            fetched = self._fetch_bars_multi(symbols, timeframe, start_iso)
+            raw = {s: (fetched.get(s) or [])[-int(limit):] for s in symbols}
+        if not frames:
+            return raw
+        return {s: bars_to_df(b) if b else pd.DataFrame(columns=OHLCV) for s, b in raw.items()}
+
+    def _fetch_bars_multi(self, symbols: List[str], timeframe: str, start_iso: str | None) -> Dict[str, List[dict]]:
+        out: Dict[str, List[dict]] = {s: [] for s in symbols}
+        for i in range(0, len(symbols), self.MULTI_CHUNK):
+            params = {
+                "symbols": ",".join(symbols[i:i + self.MULTI_CHUNK]),
+                "timeframe": timeframe,
+                "limit": self.MULTI_PAGE_LIMIT,
+                "feed": "iex",
+            }
+            if start_iso:
+                params["start"] = start_iso
+            while True:
+                r = self._request("GET", f"{self.data_base}/stocks/bars", params=params)
+                r.raise_for_status()
+                data = loads_json(r.content)
+                for sym, bars in (data.get("bars") or {}).items():
+                    out.setdefault(sym, []).extend(bars or [])
+                token = data.get("next_page_token")
+                if not token:
+                    break
+                params["page_token"] = token
+        return out
+
     def get_clock_is_open(self) -> bool:
-        """Devuelve True si el mercado está abierto (según Alpaca)."""
-        r = requests.get(f"{self.base}/v2/clock", headers=_headers(), timeout=15)
+        """Devuelve True si el mercado está abierto (según Alpaca; cacheado hasta la próxima apertura/cierre)."""
+        return self.clock.is_open()
+
+    def _fetch_clock(self) -> Dict[str, Any]:
+        r = self._request("GET", f"{self.base}/v2/clock")
         r.raise_for_status()
-        data = r.json()
-        return bool(data.get("is_open", False))
+        return r.json()
 
     def get_asset_tradable(self, symbol: str) -> bool:
         """Comprueba si el símbolo es 'tradable' en Alpaca."""
-        r = requests.get(f"{self.base}/v2/assets/{symbol}", headers=_headers(), timeout=15)
-        r.raise_for_status()
-        data = r.json()
-        return bool(data.get("tradable", False))
-   
+        return self.assets.tradable(symbol)
+
     def get_asset_shortable(self, symbol: str) -> bool:
         """Devuelve True si el símbolo se puede shortear en Alpaca."""
-        r = requests.get(f"{self.base}/v2/assets/{symbol}", headers=_headers(), timeout=15)
-        r.raise_for_status()
-        data = r.json()
         # Algunos planes exigen 'easy_to_borrow' además de 'shortable'
-        return bool(data.get("shortable", False))
+        return self.assets.shortable(symbol)
 
+    def _fetch_all_assets(self) -> List[Dict[str, Any]]:
+        r = self._request("GET", f"{self.base}/v2/assets", params={"status": "active", "asset_class": "us_equity"})
+        r.raise_for_status()
+        return r.json()
+
+    def _fetch_asset(self, symbol: str) -> Optional[Dict[str, Any]]:
+        r = self._request("GET", f"{self.base}/v2/assets/{symbol}")
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
 
     def get_position_qty(self, symbol: str) -> int:
         """Devuelve la cantidad actual (entera) en la posición del símbolo; 0 si no hay."""
-        r = requests.get(f"{self.base}/v2/positions/{symbol}", headers=_headers(), timeout=15)
+        r = self._request("GET", f"{self.base}/v2/positions/{symbol}")
         if r.status_code == 404:
             return 0
         r.raise_for_status()
@@ -73,12 +305,12 @@ class BrokerAlpaca:
 
     def cancel_open_orders(self, symbol: str) -> None:
         """Cancela órdenes abiertas del símbolo (por higiene antes de mandar otra)."""
-        r = requests.get(f"{self.base}/v2/orders", headers=_headers(), params={"status": "open", "symbols": symbol}, timeout=15)
+        r = self._request("GET", f"{self.base}/v2/orders", params={"status": "open", "symbols": symbol})
         r.raise_for_status()
         for o in r.json():
             oid = o.get("id")
             if oid:
-                requests.delete(f"{self.base}/v2/orders/{oid}", headers=_headers(), timeout=15)
+                self._request("DELETE", f"{self.base}/v2/orders/{oid}")
 
     def place_order_market(self, symbol: str, side: str, qty: int, tif: str = "day") -> dict:
         """Envía una orden a mercado simple."""
@@ -89,7 +321,7 @@ class BrokerAlpaca:
             "time_in_force": tif,       # "day" o "gtc"
             "qty": str(qty),
         }
-        r = requests.post(f"{self.base}/v2/orders", headers=_headers(), json=payload, timeout=15)
+        r = self._request("POST", f"{self.base}/v2/orders", json=payload)
         r.raise_for_status()
         return r.json()
 
@@ -109,7 +341,7 @@ class BrokerAlpaca:
             "take_profit": {"limit_price": None, "limit_price_offset": f"{take_profit_pct}%"},  # offset en %
             "stop_loss": {"stop_price": None, "stop_price_offset": f"{stop_loss_pct}%"},
         }
-        r = requests.post(f"{self.base}/v2/orders", headers=_headers(), json=payload, timeout=15)
+        r = self._request("POST", f"{self.base}/v2/orders", json=payload)
         r.raise_for_status()
         return r.json()
 
@@ -55,6 +55,12 @@ class Settings:
         default="https://data.alpaca.markets",
     )
 
+    # ---------- Market Data stream (WebSocket; feed gratuito IEX) ----------
+    APCA_STREAM_URL: str | None = _env(
+        "APCA_STREAM_URL", "ALPACA_STREAM_URL",
+        default="wss://stream.data.alpaca.markets/v2/iex",
+    )
+
     # ---------- Opcionales de la app ----------
     LOG_LEVEL: str = _env("LOG_LEVEL", default="INFO")
 
@@ -66,6 +72,7 @@ class Settings:
             "APCA_API_SECRET_KEY": "***" if self.APCA_API_SECRET_KEY else None,
             "APCA_BASE_URL": self.APCA_BASE_URL,
             "APCA_DATA_BASE_URL": self.APCA_DATA_BASE_URL,
+            "APCA_STREAM_URL": self.APCA_STREAM_URL,
             "LOG_LEVEL": self.LOG_LEVEL,
         }
 
@@ -98,6 +105,10 @@ class Settings:
     @property
     def alpaca_data_url(self) -> str | None:
         return self.APCA_DATA_BASE_URL
+
+    @property
+    def alpaca_stream_url(self) -> str | None:
+        return self.APCA_STREAM_URL
         # --- Aliases extra esperados por broker_alpaca.py ---
     @property
     def alpaca_api_key(self) -> str | None:          # broker usa este nombre
@@ -1,11 +1,43 @@
 # src/data.py
+import json
+import warnings
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Any, Sequence, Union
 
-def bars_to_df(bars: List[Dict]) -> pd.DataFrame:
-    """Convierte lista de barras (JSON) a DataFrame con índice datetime y columnas OHLCV."""
-    if not bars:
-        raise ValueError("Sin barras de datos para convertir.")
+try:  # parser JSON rápido opcional
+    import orjson
+except ImportError:
+    orjson = None
+
+OHLCV = ["open", "high", "low", "close", "volume"]
+_BAR_KEYS = {"o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}
+
+
+def loads_json(raw: Union[bytes, str]) -> Any:
+    """json.loads con orjson si está instalado (cuerpos de respuesta del broker)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def parse_iso_utc(values: Sequence[str]) -> np.ndarray:
+    """
+    Timestamps ISO-8601 -> int64 ns UTC.
+    Camino rápido para el formato de Alpaca ('2024-01-02T14:30:00Z', fracciones
+    opcionales): parser de datetime64 de NumPy sobre el texto sin la 'Z'.
+    Cualquier otra cosa (offsets, formatos libres) pasa por pd.to_datetime.
+    """
+    stripped = [v[:-1] if v[-1:] == "Z" else v for v in values]
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")  # NumPy avisa (y no convierte bien) con offsets
+            return np.array(stripped, dtype="datetime64[ns]").view(np.int64)
+    except (ValueError, TypeError, Warning):
+        return pd.to_datetime(list(values), utc=True).as_unit("ns").asi8
+
+
+def _bars_to_df_generic(bars: List[Dict]) -> pd.DataFrame:
     df = pd.DataFrame(bars).copy()
     # Normaliza nombres comunes
     rename = {"t": "timestamp", "o": "open", "h": "high", "l": "low", "c": "close", "v": "volume"}
@@ -13,9 +45,34 @@ def bars_to_df(bars: List[Dict]) -> pd.DataFrame:
     if "timestamp" in df.columns:
         df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
         df = df.set_index("timestamp").sort_index()
-    cols = [c for c in ["open", "high", "low", "close", "volume"] if c in df.columns]
+    cols = [c for c in OHLCV if c in df.columns]
     return df[cols]
 
+
+def bars_to_df(bars: List[Dict]) -> pd.DataFrame:
+    """
+    Convierte lista de barras (JSON) a DataFrame con índice datetime y columnas OHLCV.
+    Las barras t/o/h/l/c/v del broker se decodifican directamente a columnas
+    float64 de NumPy; solo se ordena si la entrada no viene ya ordenada.
+    """
+    if not bars:
+        raise ValueError("Sin barras de datos para convertir.")
+    first = bars[0]
+    if "t" not in first:
+        return _bars_to_df_generic(bars)
+    n = len(bars)
+    ts = parse_iso_utc([b["t"] for b in bars])
+    cols = {}
+    for key, name in _BAR_KEYS.items():
+        if key in first:
+            cols[name] = np.fromiter((b.get(key, np.nan) for b in bars), dtype=np.float64, count=n)
+    if n > 1 and not (ts[1:] >= ts[:-1]).all():
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        cols = {k: v[order] for k, v in cols.items()}
+    index = pd.DatetimeIndex(ts.view("datetime64[ns]"), name="timestamp").tz_localize("UTC")
+    return pd.DataFrame(cols, index=index, copy=False)
+
 def load_csv(path: str) -> pd.DataFrame:
     """Carga CSV local con columnas: timestamp, open, high, low, close, volume."""
     df = pd.read_csv(path)
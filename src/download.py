@@ -0,0 +1,147 @@
+# src/download.py
+"""
+Descarga masiva de histórico de barras de Alpaca al BarStore local.
+
+- El trabajo se parte en bloques (símbolo, mes UTC), que coinciden con las
+  particiones del BarStore: cada bloque escribe solo su partición.
+- Los bloques se piden en paralelo (hilos) con BrokerAlpaca.get_bars_range,
+  que sigue next_page_token; todas las peticiones pasan por el mismo
+  limitador token-bucket del broker (200 req/min por defecto), así que
+  --workers solo solapa la latencia de red.
+- Manifest JSON en <root>/_download_manifest.json con los bloques
+  terminados: si se corta, al relanzar el mismo comando solo se piden los
+  que faltan. Un bloque a medias se repite entero (write() fusiona por
+  timestamp, así que no duplica barras).
+- Los bloques que fallan se anotan en el log y no cuentan como terminados.
+
+Ejemplo (un año de 1m para la lista de símbolos):
+  python -m src.download --symbols-file data/sp500.txt --start 2024-01-01 --end 2025-01-01 \\
+      --root data/store --workers 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from .bar_store import BarStore, to_ns
+from .data import bars_to_df
+from .logger import logger
+
+_ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+Chunk = Tuple[str, pd.Timestamp, pd.Timestamp]
+
+
+def month_chunks(symbols: List[str], start: str, end: str) -> List[Chunk]:
+    """(símbolo, inicio, fin) por mes UTC, recortados a [start, end)."""
+    lo, hi = pd.Timestamp(to_ns(start), tz="UTC"), pd.Timestamp(to_ns(end), tz="UTC")
+    edges = [lo] + [m for m in pd.date_range(lo.normalize().replace(day=1), hi, freq="MS") if lo < m < hi] + [hi]
+    return [(sym, a, b) for sym in symbols for a, b in zip(edges[:-1], edges[1:])]
+
+
+class Manifest:
+    """Bloques terminados ({clave: nº de barras}), persistido de forma atómica tras cada bloque."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Dict[str, int] = {}
+        if path.exists():
+            self.done = json.loads(path.read_text(encoding="utf-8")).get("done", {})
+
+    @staticmethod
+    def key(timeframe: str, chunk: Chunk) -> str:
+        sym, a, b = chunk
+        return f"{sym}|{timeframe}|{a.strftime(_ISO)}|{b.strftime(_ISO)}"
+
+    def mark(self, key: str, n: int) -> None:
+        with self._lock:
+            self.done[key] = n
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"done": self.done}), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+def download_chunk(broker, store: BarStore, timeframe: str, chunk: Chunk, dtype: str = "float64") -> int:
+    sym, a, b = chunk
+    bars = broker.get_bars_range(sym, timeframe=timeframe, start_iso=a.strftime(_ISO), end_iso=b.strftime(_ISO))
+    if not bars:
+        return 0
+    df = bars_to_df(bars)
+    df = df[df.index < b]  # `end` de Alpaca es inclusivo; la barra de b pertenece al bloque siguiente
+    store.write(sym, timeframe, df, dtype=dtype)
+    return len(df)
+
+
+def run_download(broker, store: BarStore, symbols: List[str], start: str, end: str, timeframe: str = "1Min",
+                 workers: int = 8, dtype: str = "float64") -> Dict[str, Any]:
+    store.root.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(store.root / "_download_manifest.json")
+    chunks = month_chunks(symbols, start, end)
+    todo = [c for c in chunks if Manifest.key(timeframe, c) not in manifest.done]
+    print(f"⬇️  {len(symbols)} símbolos, {len(chunks)} bloques ({len(chunks) - len(todo)} ya descargados)")
+    stats = {"chunks": 0, "bars": 0, "failed": 0}
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(download_chunk, broker, store, timeframe, c, dtype): c for c in todo}
+        for fut in as_completed(futures):
+            chunk = futures[fut]
+            try:
+                n = fut.result()
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error(f"Descarga: fallo en {chunk[0]} {chunk[1]:%Y-%m}: {e}")
+                continue
+            manifest.mark(Manifest.key(timeframe, chunk), n)
+            stats["chunks"] += 1
+            stats["bars"] += n
+            done = stats["chunks"] + stats["failed"]
+            elapsed = time.time() - t0
+            eta = elapsed / done * (len(todo) - done)
+            print(f"\r{done}/{len(todo)} bloques | {stats['bars']} barras | {elapsed:.0f}s (ETA {eta:.0f}s)",
+                  end="", flush=True)
+    print()
+    stats["elapsed_s"] = round(time.time() - t0, 1)
+    return stats
+
+
+def parse_symbols(symbols: str, symbols_file: str) -> List[str]:
+    out = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    if symbols_file:
+        lines = Path(symbols_file).read_text(encoding="utf-8").splitlines()
+        out += [s.strip().upper() for s in lines if s.strip() and not s.startswith("#")]
+    return list(dict.fromkeys(out))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Descarga histórico de barras de Alpaca al BarStore (reanudable)")
+    p.add_argument("--symbols", type=str, default="", help="A,B,C")
+    p.add_argument("--symbols-file", type=str, default="", help="Fichero con un símbolo por línea")
+    p.add_argument("--start", type=str, required=True, help="Inicio (ISO, incluido)")
+    p.add_argument("--end", type=str, required=True, help="Fin (ISO, excluido)")
+    p.add_argument("--timeframe", type=str, default="1Min")
+    p.add_argument("--root", type=str, default="data/store", help="Carpeta del BarStore")
+    p.add_argument("--workers", type=int, default=8, help="Bloques en paralelo (el rate limit es compartido)")
+    p.add_argument("--rate-per-min", type=float, default=200.0, help="Presupuesto de peticiones por minuto")
+    p.add_argument("--float32", action="store_true", help="Guarda OHLCV en float32")
+    args = p.parse_args()
+
+    from .broker_alpaca import BrokerAlpaca, TokenBucket
+
+    syms = parse_symbols(args.symbols, args.symbols_file)
+    if not syms:
+        p.error("Indica --symbols o --symbols-file")
+    broker = BrokerAlpaca(limiter=TokenBucket(args.rate_per_min))
+    stats = run_download(broker, BarStore(args.root), syms, args.start, args.end, timeframe=args.timeframe,
+                         workers=args.workers, dtype="float32" if args.float32 else "float64")
+    print(f"✅ {stats} | HTTP: {broker.stats}")
+    if stats["failed"]:
+        print("⚠️ Hay bloques fallidos: relanza el mismo comando para reintentarlos.")
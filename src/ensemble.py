@@ -4,7 +4,11 @@ from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 
 import math
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .indicators import STORE, true_range
 
 
 @dataclass
@@ -61,23 +65,15 @@ class Ensemble:
             return None
         if len(df) < w + 1:
             return None
-        # True Range
-        prev_close = df["close"].shift(1)
-        tr = pd.concat(
-            [
-                (df["high"] - df["low"]).abs(),
-                (df["high"] - prev_close).abs(),
-                (df["low"] - prev_close).abs(),
-            ],
-            axis=1,
-        ).max(axis=1)
+        # True Range (compartido vía IndicatorStore)
+        tr = true_range(df)
         return float(tr.tail(w).mean())
 
     def _trend_gate(self, df: pd.DataFrame) -> Tuple[bool, bool, Optional[float]]:
         """Devuelve (allow_long, allow_short, sma_val) bajo filtro de tendencia."""
         if not self.use_trend_filter:
             return True, True, None
-        sma = self._sma(df["close"], self.trend_window)
+        sma = STORE.get(df, "sma_last", (self.trend_window,), lambda: self._sma(df["close"], self.trend_window))
         if sma is None:
             return True, True, None
         last = float(df["close"].iloc[-1])
@@ -89,7 +85,7 @@ class Ensemble:
         """Devuelve (suficiente_volatilidad, atr_norm)."""
         if not self.use_atr_filter:
             return True, None
-        atr = self._atr(df, self.atr_window)
+        atr = STORE.get(df, "atr_last", (self.atr_window,), lambda: self._atr(df, self.atr_window))
         if atr is None:
             return True, None
         price = float(df["close"].iloc[-1])
@@ -97,9 +93,16 @@ class Ensemble:
         return (atr_norm >= self.atr_threshold), atr_norm
 
     # -------- núcleo del ensemble --------
-    def decide(self, df: pd.DataFrame, wrappers: List[StrategyWrapper]) -> Tuple[str, Dict]:
+    def decide(
+        self,
+        df: pd.DataFrame,
+        wrappers: List[StrategyWrapper],
+        signals: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Tuple[str, Dict]:
         """
         Ejecuta todas las estrategias y decide una señal final.
+        - signals: señales ya calculadas por nombre (p. ej. vía strategy.update(bar));
+          si se pasa, no se llama a .signal(df).
         Retorna: (signal, meta)  con meta["signals"], meta["votes"], filtros, etc.
         """
         raw_signals: Dict[str, Optional[str]] = {}
@@ -112,7 +115,7 @@ class Ensemble:
 
         # Ejecutar estrategias
         for w in wrappers:
-            sig = w.strategy.signal(df)
+            sig = signals.get(w.name) if signals is not None else w.strategy.signal(df)
             sig = sig if sig in {"BUY", "SELL"} else None  # ignoramos HOLD/EXIT aquí
             # aplicar filtros de régimen como gate
             if sig == "BUY" and (not allow_long or not atr_ok):
@@ -180,3 +183,104 @@ class Ensemble:
             },
         }
         return final, meta
+
+    # -------- versión vectorizada (todo el histórico) --------
+    @staticmethod
+    def _tail_means(values: np.ndarray, w: int) -> np.ndarray:
+        """
+        Media de las últimas w posiciones en cada barra (NaN si no hay w).
+        Suma cada ventana por separado, como series.iloc[-w:].mean(), para
+        dar exactamente el mismo float que la versión barra a barra.
+        """
+        out = np.full(len(values), np.nan)
+        if w > 0 and len(values) >= w:
+            out[w - 1:] = sliding_window_view(values, w).sum(axis=1) / w
+        return out
+
+    def _gates_series(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(allow_long, allow_short, atr_ok) por barra; mismas reglas que _trend_gate/_atr_gate."""
+        n = len(df)
+        close = df["close"].to_numpy(dtype=float)
+        allow_long = np.ones(n, dtype=bool)
+        allow_short = np.ones(n, dtype=bool)
+        atr_ok = np.ones(n, dtype=bool)
+        if self.use_trend_filter:
+            sma = self._tail_means(close, self.trend_window)
+            known = ~np.isnan(sma)
+            allow_long[known] = close[known] >= sma[known]
+            allow_short[known] = close[known] <= sma[known]
+        if self.use_atr_filter and {"high", "low", "close"}.issubset(df.columns):
+            atr = self._tail_means(true_range(df).to_numpy(dtype=float), self.atr_window)
+            atr[: self.atr_window] = np.nan  # _atr exige w + 1 barras
+            known = ~np.isnan(atr)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                atr_norm = np.where(close > 0, atr / close, 0.0)
+            atr_ok[known] = atr_norm[known] >= self.atr_threshold
+        return allow_long, allow_short, atr_ok
+
+    def decide_series(
+        self,
+        df: pd.DataFrame,
+        wrappers: List[StrategyWrapper],
+        signals: Optional[pd.DataFrame] = None,
+    ) -> pd.DataFrame:
+        """
+        decide() para cada barra del histórico en una pasada: la fila i es igual
+        a decide(df.iloc[:i+1], wrappers).
+        - signals: matriz barras × estrategias ya calculada (columnas = w.name);
+          si no se pasa se usa w.strategy.signal_series(df) (o signal() por
+          slices si la estrategia no la tiene).
+        Retorna un DataFrame con la señal filtrada de cada estrategia, votos
+        (buys/sells), score y la decisión final en "signal" (BUY/SELL/HOLD).
+        """
+        n = len(df)
+        allow_long, allow_short, atr_ok = self._gates_series(df)
+        gated: Dict[str, np.ndarray] = {}
+        buys = np.zeros(n, dtype=int)
+        sells = np.zeros(n, dtype=int)
+        score = np.zeros(n, dtype=float)
+        for w in wrappers:
+            raw = signals[w.name].to_numpy() if signals is not None else self._member_series(df, w)
+            is_buy = (raw == "BUY") & allow_long & atr_ok
+            is_sell = (raw == "SELL") & allow_short & atr_ok
+            sig = np.full(n, None, dtype=object)
+            sig[is_buy] = "BUY"
+            sig[is_sell] = "SELL"
+            gated[w.name] = sig
+            buys += is_buy
+            sells += is_sell
+            # misma secuencia de sumas que decide() para obtener el mismo float
+            score = np.where(is_buy, score + float(w.weight), np.where(is_sell, score - float(w.weight), score))
+
+        if self.mode == "consensus":
+            buy = (buys >= self.k) & (sells == 0)
+            sell = (sells >= self.k) & (buys == 0)
+        elif self.mode == "weighted":
+            buy = (score >= self.min_score) & (sells == 0)
+            sell = (score <= -self.min_score) & (buys == 0)
+        else:  # stacked
+            primary = gated.get(self.primary)
+            if primary is None:
+                buy = sell = np.zeros(n, dtype=bool)
+            else:
+                others = [s for name, s in gated.items() if name != self.primary]
+                agree_buy = sum(((s == "BUY") for s in others), np.zeros(n, dtype=int))
+                agree_sell = sum(((s == "SELL") for s in others), np.zeros(n, dtype=int))
+                need = max(0, self.k - 1)
+                buy = (primary == "BUY") & (agree_buy >= need)
+                sell = (primary == "SELL") & (agree_sell >= need)
+
+        cols = {name: pd.Series(sig, index=df.index, dtype=object) for name, sig in gated.items()}
+        out = pd.DataFrame(cols, index=df.index)
+        out["buys"] = buys
+        out["sells"] = sells
+        out["score"] = score
+        out["signal"] = pd.Series(np.where(buy, "BUY", np.where(sell, "SELL", "HOLD")), index=df.index, dtype=object)
+        return out
+
+    @staticmethod
+    def _member_series(df: pd.DataFrame, w: StrategyWrapper) -> np.ndarray:
+        strategy = w.strategy
+        if hasattr(strategy, "signal_series"):
+            return strategy.signal_series(df).to_numpy()
+        return np.array([strategy.signal(df.iloc[: i + 1]) for i in range(len(df))], dtype=object)
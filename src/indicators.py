@@ -0,0 +1,356 @@
+# src/indicators.py
+"""
+Indicadores incrementales (O(1) por barra).
+
+Reproducen la aritmética de pandas (rolling mean/var con compensación de Kahan
+y ewm con adjust=False) para que el resultado coincida con la versión
+vectorizada sobre los mismos datos: mean y ewm bit a bit; var salvo ruido de
+redondeo (~1e-14) tras rachas de precios idénticos.
+
+Todos admiten update(x) (nueva barra) y revise(x) (la última barra cambió,
+p. ej. una vela todavía en formación); revise deshace el último update en O(1).
+
+IndicatorStore: caché LRU de series ya calculadas sobre la ventana de un tick,
+compartida por estrategias, ensemble y flags de MA (ver abajo).
+"""
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import pandas as pd
+
+
+class RollingMean:
+    """Media móvil de ventana fija, equivalente a Series.rolling(window).mean()."""
+
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.reset()
+
+    def reset(self) -> None:
+        self._buf: deque = deque()
+        self._nobs = 0
+        self._sum = 0.0
+        self._neg_ct = 0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self._same = 0
+        self._prev: Optional[float] = None
+        self._undo = None
+        self.value: Optional[float] = None
+
+    def _snapshot(self):
+        return (self._nobs, self._sum, self._neg_ct, self._comp_add, self._comp_remove,
+                self._same, self._prev, self.value)
+
+    def _add(self, x: float) -> None:
+        if x != x:
+            return
+        self._nobs += 1
+        y = x - self._comp_add
+        t = self._sum + y
+        self._comp_add = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, x) < 0:
+            self._neg_ct += 1
+        if x == self._prev:
+            self._same += 1
+        else:
+            self._same = 1
+        self._prev = x
+
+    def _remove(self, x: float) -> None:
+        if x != x:
+            return
+        self._nobs -= 1
+        y = -x - self._comp_remove
+        t = self._sum + y
+        self._comp_remove = t - self._sum - y
+        self._sum = t
+        if math.copysign(1.0, x) < 0:
+            self._neg_ct -= 1
+
+    def _calc(self) -> Optional[float]:
+        if self._nobs < self.window or self._nobs <= 0:
+            return None
+        result = self._sum / self._nobs
+        if self._same >= self._nobs:
+            result = self._prev
+        elif self._neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self._neg_ct == self._nobs and result > 0:
+            result = 0.0
+        return result
+
+    def update(self, x: float) -> Optional[float]:
+        x = float(x)
+        state = self._snapshot()
+        evicted = None
+        if len(self._buf) == self.window:
+            evicted = self._buf.popleft()
+            self._remove(evicted)
+        self._buf.append(x)
+        self._add(x)
+        self.value = self._calc()
+        self._undo = (state, evicted)
+        return self.value
+
+    def revise(self, x: float) -> Optional[float]:
+        if self._undo is None:
+            return self.update(x)
+        state, evicted = self._undo
+        (self._nobs, self._sum, self._neg_ct, self._comp_add, self._comp_remove,
+         self._same, self._prev, self.value) = state
+        self._buf.pop()
+        if evicted is not None:
+            self._buf.appendleft(evicted)
+        return self.update(x)
+
+
+class RollingVar:
+    """Varianza móvil (Welford), equivalente a Series.rolling(window).var(ddof)."""
+
+    def __init__(self, window: int, ddof: int = 1):
+        self.window = int(window)
+        self.ddof = int(ddof)
+        self.reset()
+
+    def reset(self) -> None:
+        self._buf: deque = deque()
+        self._nobs = 0
+        self._mean = 0.0
+        self._ssqdm = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self._same = 0
+        self._prev: Optional[float] = None
+        self._undo = None
+        self.value: Optional[float] = None
+
+    def _snapshot(self):
+        return (self._nobs, self._mean, self._ssqdm, self._comp_add, self._comp_remove,
+                self._same, self._prev, self.value)
+
+    def _add(self, x: float) -> None:
+        if x != x:
+            return
+        if x == self._prev:
+            self._same += 1
+        else:
+            self._same = 1
+        self._prev = x
+        self._nobs += 1
+        prev_mean = self._mean - self._comp_add
+        y = x - self._comp_add
+        t = y - self._mean
+        self._comp_add = t + self._mean - y
+        self._mean += t / self._nobs
+        self._ssqdm += (x - prev_mean) * (x - self._mean)
+
+    def _remove(self, x: float) -> None:
+        if x != x:
+            return
+        self._nobs -= 1
+        if self._nobs:
+            prev_mean = self._mean - self._comp_remove
+            y = x - self._comp_remove
+            t = y - self._mean
+            self._comp_remove = t + self._mean - y
+            self._mean -= t / self._nobs
+            self._ssqdm -= (x - prev_mean) * (x - self._mean)
+        else:
+            self._mean = 0.0
+            self._ssqdm = 0.0
+
+    def _calc(self) -> Optional[float]:
+        if self._nobs < self.window or self._nobs <= self.ddof:
+            return None
+        if self._nobs == 1 or self._same >= self._nobs:
+            return 0.0
+        result = self._ssqdm / (self._nobs - self.ddof)
+        return 0.0 if result < 0 else result
+
+    def update(self, x: float) -> Optional[float]:
+        x = float(x)
+        state = self._snapshot()
+        evicted = None
+        if len(self._buf) == self.window:
+            evicted = self._buf.popleft()
+            self._remove(evicted)
+        self._buf.append(x)
+        self._add(x)
+        self.value = self._calc()
+        self._undo = (state, evicted)
+        return self.value
+
+    def revise(self, x: float) -> Optional[float]:
+        if self._undo is None:
+            return self.update(x)
+        state, evicted = self._undo
+        (self._nobs, self._mean, self._ssqdm, self._comp_add, self._comp_remove,
+         self._same, self._prev, self.value) = state
+        self._buf.pop()
+        if evicted is not None:
+            self._buf.appendleft(evicted)
+        return self.update(x)
+
+    @property
+    def std(self) -> Optional[float]:
+        return None if self.value is None else math.sqrt(self.value)
+
+
+class EWM:
+    """
+    Media exponencial, equivalente a Series.ewm(alpha=..., adjust=False,
+    min_periods=...).mean() (ignore_na=False). Usa from_span() para span=N.
+    """
+
+    def __init__(self, alpha: float, min_periods: int = 0):
+        self.alpha = float(alpha)
+        self.min_periods = max(1, int(min_periods))
+        self.reset()
+
+    @classmethod
+    def from_span(cls, span: int, min_periods: int = 0) -> "EWM":
+        return cls(2.0 / (span + 1.0), min_periods)
+
+    def reset(self) -> None:
+        self._weighted = math.nan
+        self._nobs = 0
+        self._started = False
+        self._undo = None
+        self.value: Optional[float] = None
+
+    def update(self, x: Optional[float]) -> Optional[float]:
+        x = math.nan if x is None else float(x)
+        self._undo = (self._weighted, self._nobs, self._started, self.value)
+        is_obs = x == x
+        if not self._started:
+            self._started = True
+            self._weighted = x
+        else:
+            if self._weighted == self._weighted:
+                if is_obs and self._weighted != x:
+                    old_wt = 1.0 - self.alpha
+                    self._weighted = (old_wt * self._weighted + self.alpha * x) / (old_wt + self.alpha)
+            elif is_obs:
+                self._weighted = x
+        self._nobs += int(is_obs)
+        self.value = self._weighted if self._nobs >= self.min_periods and self._weighted == self._weighted else None
+        return self.value
+
+    def revise(self, x: Optional[float]) -> Optional[float]:
+        if self._undo is None:
+            return self.update(x)
+        self._weighted, self._nobs, self._started, self.value = self._undo
+        return self.update(x)
+
+
+# ---------------- Caché de indicadores por vela ----------------
+class IndicatorStore:
+    """
+    Caché LRU de indicadores: cada serie se calcula una vez por vela nueva y la
+    reutilizan todos los consumidores del tick.
+
+    Clave: (símbolo, timeframe, indicador, params, última vela). Símbolo y
+    timeframe salen de df.attrs (run_paper los fija al preparar el tick); la
+    última vela es (nº de filas, primer y último timestamp, último close,
+    df.attrs["version"]). La versión la sube el BarRing (ventanas ring y
+    stream) al corregir cualquier vela, así que una corrección de una vela
+    anterior tampoco reutiliza la serie vieja.
+    Sin df.attrs["symbol"] se calcula sin cachear (p. ej. backtests sobre slices).
+    Los valores se comparten: los consumidores no deben modificarlos.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = int(max_entries)
+        self._data: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "uncached": 0}
+
+    @staticmethod
+    def key(df: pd.DataFrame, name: str, params: Hashable = ()) -> Optional[Tuple]:
+        symbol = df.attrs.get("symbol")
+        if symbol is None or df.empty:
+            return None
+        last = (len(df), df.index[0], df.index[-1], float(df["close"].iat[-1]) if "close" in df.columns else None,
+                df.attrs.get("version"))
+        return (symbol, df.attrs.get("timeframe"), name, params, last)
+
+    def get(self, df: pd.DataFrame, name: str, params: Hashable, compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor cacheado o lo calcula con compute() y lo guarda."""
+        key = self.key(df, name, params)
+        if key is None:
+            with self._lock:
+                self.stats["uncached"] += 1
+            return compute()
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._data[key]
+            self.stats["misses"] += 1
+        # se calcula fuera del lock: otro hilo puede repetir el cálculo, nunca bloquear
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['hits']} hits / {s['misses']} misses ({self.hit_rate:.0%}), "
+                f"{len(self)} en caché, {s['evictions']} desalojos")
+
+
+STORE = IndicatorStore()
+
+
+def sma(df: pd.DataFrame, window: int, column: str = "close") -> pd.Series:
+    """df[column].rolling(window).mean(), cacheada."""
+    return STORE.get(df, "sma", (column, int(window)), lambda: df[column].rolling(window).mean())
+
+
+def rolling_std(df: pd.DataFrame, window: int, column: str = "close") -> pd.Series:
+    """df[column].rolling(window).std(), cacheada."""
+    return STORE.get(df, "std", (column, int(window)), lambda: df[column].rolling(window).std())
+
+
+def ema(df: pd.DataFrame, span: int, column: str = "close") -> pd.Series:
+    """df[column].ewm(span=span, adjust=False).mean(), cacheada."""
+    return STORE.get(df, "ema", (column, int(span)), lambda: df[column].ewm(span=span, adjust=False).mean())
+
+
+def true_range(df: pd.DataFrame) -> pd.Series:
+    """True Range por vela (la primera usa close previo NaN), cacheado."""
+
+    def compute() -> pd.Series:
+        prev_close = df["close"].shift(1)
+        return pd.concat(
+            [
+                (df["high"] - df["low"]).abs(),
+                (df["high"] - prev_close).abs(),
+                (df["low"] - prev_close).abs(),
+            ],
+            axis=1,
+        ).max(axis=1)
+
+    return STORE.get(df, "tr", (), compute)
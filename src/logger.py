@@ -1,7 +1,28 @@
 # src/logger.py
+"""
+Logging del bot sin bloquear el loop.
+
+- `logger` ("bot") solo encola el registro (QueueHandler); un hilo
+  QueueListener hace la E/S: logs/bot.log (una línea JSON por registro,
+  rotativo) y consola.
+- Campos estructurados: symbol, stage, latency_ms y cualquier otro que se
+  pase a log_event(), p. ej. log_event("Cierre", symbol="AAPL", stage="exit", pnl=12.3).
+- Consola: como máximo `rate` líneas/s (las sobrantes se cuentan y se avisa;
+  WARNING o más siempre pasan). Modo "quiet": solo el resumen por tick
+  (tick_summary) y los errores; "off": nada (replay sin --verbose).
+- overhead(): tiempo acumulado en el hilo que loguea (encolar), para medir
+  qué parte del tick se va en logging; flush() espera a que se escriba la cola.
+"""
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
 
 # Asegura carpeta de logs
 os.makedirs("logs", exist_ok=True)
@@ -9,21 +30,148 @@ os.makedirs("logs", exist_ok=True)
 # Logger principal
 logger = logging.getLogger("bot")
 logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_STRUCT = ("symbol", "stage", "latency_ms")
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, msg y los campos estructurados presentes."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        for key in _STRUCT:
+            val = getattr(record, key, None)
+            if val is not None:
+                out[key] = val
+        out.update(getattr(record, "fields", None) or {})
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class ConsoleFilter(logging.Filter):
+    """Limita la consola (token bucket de líneas/s) y aplica los modos normal | quiet | off."""
+
+    def __init__(self, rate: float = 20.0):
+        super().__init__()
+        self.mode = "normal"
+        self.set_rate(rate)
+        self.suppressed = 0
+
+    def set_rate(self, rate: float) -> None:
+        self.rate = float(rate)
+        self.tokens = max(1.0, self.rate)
+        self.updated = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.mode == "off" or getattr(record, "console", True) is False:
+            return False
+        summary = getattr(record, "summary", False)
+        if self.mode == "quiet" and not summary and record.levelno < logging.ERROR:
+            return False
+        if summary or record.levelno >= logging.WARNING or self.rate <= 0:
+            return self._flush_note(record)
+        now = time.monotonic()
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            self.suppressed += 1
+            return False
+        self.tokens -= 1.0
+        return self._flush_note(record)
+
+    def _flush_note(self, record: logging.LogRecord) -> bool:
+        if self.suppressed:
+            record.msg = f"{record.getMessage()}  (+{self.suppressed} líneas omitidas en consola; ver logs/bot.log)"
+            record.args = None
+            self.suppressed = 0
+        return True
+
+
+class TimedQueueHandler(QueueHandler):
+    """QueueHandler que mide lo que cuesta encolar (lo único que paga el hilo del tick)."""
+
+    def __init__(self, q: "queue.SimpleQueue[logging.LogRecord]"):
+        super().__init__(q)
+        self._lock_stats = threading.Lock()
+        self.records = 0
+        self.seconds = 0.0
 
-# Formato consistente
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Mensajes ya formateados (f-strings) sin excepción: se encolan tal cual, sin copiar el registro
+        if not record.args and not record.exc_info and not record.stack_info:
+            record.message = record.msg = str(record.msg)
+            return record
+        return super().prepare(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        t0 = time.perf_counter()
+        super().emit(record)
+        dt = time.perf_counter() - t0
+        with self._lock_stats:
+            self.records += 1
+            self.seconds += dt
+
+
+# Formato consistente (consola)
 formatter = logging.Formatter(
     "%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"
 )
 
-# Handler de archivo rotativo
+# Handler de archivo rotativo (JSON por línea)
 file_handler = RotatingFileHandler(
     "logs/bot.log", maxBytes=1_000_000, backupCount=5, encoding="utf-8"
 )
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+file_handler.setFormatter(JsonFormatter())
 
-# Handler de consola (imprime en tiempo real)
+# Handler de consola (limitado por ConsoleFilter)
+console_filter = ConsoleFilter()
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+console_handler.addFilter(console_filter)
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+queue_handler = TimedQueueHandler(_queue)
+logger.addHandler(queue_handler)
+listener = QueueListener(_queue, file_handler, console_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)  # vacía la cola al salir
+
+
+def log_event(msg: str, symbol: Optional[str] = None, stage: Optional[str] = None,
+              latency_ms: Optional[float] = None, level: int = logging.INFO, console: bool = True,
+              **fields: Any) -> None:
+    """Registro estructurado; console=False lo deja solo en el fichero."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"symbol": symbol, "stage": stage, "latency_ms": latency_ms,
+                                      "fields": fields, "console": console})
+
+
+def tick_summary(msg: str, **fields: Any) -> None:
+    """Línea de resumen por tick: lo único (junto a los errores) que se ve con --quiet."""
+    logger.info(msg, extra={"stage": "tick", "fields": fields, "summary": True})
+
+
+def set_console(mode: str = "normal", rate: Optional[float] = None) -> None:
+    """mode: normal | quiet | off; rate: líneas/s en consola (0 = sin límite)."""
+    if mode not in ("normal", "quiet", "off"):
+        raise ValueError(f"Modo de consola desconocido: {mode!r} (normal | quiet | off)")
+    console_filter.mode = mode
+    if rate is not None:
+        console_filter.set_rate(rate)
+
+
+def flush() -> None:
+    """Espera a que el hilo del listener escriba todo lo encolado (stop vacía la cola)."""
+    listener.stop()
+    listener.start()
+
+
+def overhead() -> Dict[str, float]:
+    """Registros encolados y segundos gastados encolando (acumulado)."""
+    with queue_handler._lock_stats:
+        return {"records": queue_handler.records, "seconds": queue_handler.seconds}
@@ -0,0 +1,145 @@
+# src/meta_cache.py
+"""
+Cachés de metadatos del broker que cambian como mucho una vez al día.
+
+- AssetCache: carga todos los activos de una vez (/v2/assets) y responde
+  tradable/shortable desde memoria. Caduca por TTL y admite invalidate().
+  Un símbolo que no venga en la carga masiva se pide individualmente y se cachea.
+  Si la carga masiva falla, no se reintenta hasta pasados retry_seconds y
+  mientras tanto cada símbolo se pide individualmente (sin tormenta de
+  peticiones a /v2/assets bajo el rate limit compartido).
+- ClockCache: guarda la respuesta de /v2/clock y no vuelve a preguntar hasta
+  la siguiente frontera de sesión (next_close si está abierto, next_open si
+  está cerrado).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+Asset = Dict[str, Any]
+
+
+def _epoch(iso: Optional[str]) -> Optional[float]:
+    """ISO-8601 (con zona, ej. 2025-09-22T09:30:00-04:00 o ...Z) -> segundos epoch."""
+    if not iso:
+        return None
+    try:
+        return datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class AssetCache:
+    def __init__(
+        self,
+        fetch_all: Callable[[], List[Asset]],
+        fetch_one: Callable[[str], Optional[Asset]],
+        ttl_seconds: float = 6 * 3600,
+        retry_seconds: float = 60.0,
+    ):
+        """
+        - fetch_all() -> lista de activos (dicts de Alpaca con 'symbol')
+        - fetch_one(symbol) -> dict del activo o None si no existe
+        - ttl_seconds: antigüedad máxima de la carga masiva
+        - retry_seconds: espera antes de reintentar una carga masiva fallida
+        """
+        self.fetch_all = fetch_all
+        self.fetch_one = fetch_one
+        self.ttl = float(ttl_seconds)
+        self.retry_seconds = float(retry_seconds)
+        self._assets: Dict[str, Asset] = {}
+        self._single: Set[str] = set()  # pedidos uno a uno desde la última carga masiva
+        self._loaded_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.RLock()
+        self.stats = {"bulk_loads": 0, "bulk_failures": 0, "single_loads": 0, "hits": 0}
+
+    def load(self) -> int:
+        """Carga masiva; devuelve el nº de activos."""
+        assets = self.fetch_all()
+        with self._lock:
+            self._assets = {a["symbol"].upper(): a for a in assets if a.get("symbol")}
+            self._single.clear()
+            self._loaded_at = time.time()
+            self.stats["bulk_loads"] += 1
+            return len(self._assets)
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        """Sin símbolo: fuerza recarga masiva en el próximo acceso. Con símbolo: solo ese."""
+        with self._lock:
+            if symbol is None:
+                self._loaded_at = self._retry_at = 0.0
+            else:
+                self._assets.pop(symbol.upper(), None)
+                self._single.discard(symbol.upper())
+
+    def get(self, symbol: str) -> Asset:
+        symbol = symbol.upper()
+        with self._lock:
+            now = time.time()
+            fresh = now - self._loaded_at < self.ttl
+            if not fresh and now >= self._retry_at:
+                try:
+                    self.load()
+                    fresh = True
+                except Exception:
+                    self._retry_at = now + self.retry_seconds
+                    self.stats["bulk_failures"] += 1
+            asset = self._assets.get(symbol)
+            if asset is not None and (fresh or symbol in self._single):
+                self.stats["hits"] += 1
+                return asset
+            # No vino en la carga (inactivo, otra clase de activo...) o la carga masiva
+            # falló y lo que hay está caducado: pedirlo individualmente una vez
+            asset = self.fetch_one(symbol) or {"symbol": symbol}
+            self._assets[symbol] = asset
+            self._single.add(symbol)
+            self.stats["single_loads"] += 1
+            return asset
+
+    def tradable(self, symbol: str) -> bool:
+        return bool(self.get(symbol).get("tradable", False))
+
+    def shortable(self, symbol: str) -> bool:
+        return bool(self.get(symbol).get("shortable", False))
+
+
+class ClockCache:
+    def __init__(self, fetch_clock: Callable[[], Dict[str, Any]], min_refresh: float = 15.0, max_age: float = 3600.0):
+        """
+        - fetch_clock() -> dict de /v2/clock (is_open, next_open, next_close)
+        - min_refresh: segundos mínimos entre peticiones (por si el broker aún
+          no ha cambiado de estado justo en la frontera)
+        - max_age: tope de validez aunque la frontera esté lejos (fines de semana, festivos)
+        """
+        self.fetch_clock = fetch_clock
+        self.min_refresh = float(min_refresh)
+        self.max_age = float(max_age)
+        self._data: Dict[str, Any] = {}
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"fetches": 0, "hits": 0}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._valid_until = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            if now < self._valid_until:
+                self.stats["hits"] += 1
+                return self._data
+            data = self.fetch_clock()
+            self.stats["fetches"] += 1
+            boundary = _epoch(data.get("next_close") if data.get("is_open") else data.get("next_open"))
+            until = now + self.max_age if boundary is None else min(boundary, now + self.max_age)
+            self._data = data
+            self._valid_until = max(until, now + self.min_refresh)
+            return data
+
+    def is_open(self) -> bool:
+        return bool(self.get().get("is_open", False))
@@ -0,0 +1,274 @@
+# src/portfolio_backtest.py
+"""
+Backtest de portafolio multi-símbolo con equity compartida y límites del
+RiskManager avanzado (calor, nº de posiciones, apalancamiento, exposición por
+símbolo, pérdida diaria, racha negativa).
+
+- Alinea N símbolos en una línea temporal común (matrices T×N).
+- Señales por símbolo vectorizadas (signal_series) -> matriz T×N.
+- Cada timestamp se procesa como lote con NumPy: mark-to-market, salidas
+  (señal SELL, stop, take), trailing ATR y curva por símbolo. Solo las
+  entradas candidatas (dispersas) pasan, una a una, por assess_entry.
+- Long-only, como Backtester.
+
+Ejemplo:
+  python -m src.portfolio_backtest --data-dir data/min --strategy ma --fast 5 --slow 20 --cash 100000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .backtest import _infer_steps_per_year
+from .bar_store import BarStore, add_store_args, load_store_args
+from .data import load_csv
+from .metrics import equity_to_returns, max_drawdown, sharpe_ratio, total_return
+from .replay import parse_data_arg
+from .risk_manager_avanzado import RiskConfig, RiskManager, Side
+from .run_paper import build_strategy, default_risk_config
+
+
+class PortfolioSimAdapter:
+    """Adaptador del RiskManager sobre el estado vectorizado del backtest."""
+
+    def __init__(self, symbols: List[str], cash: float):
+        self.symbols = symbols
+        self.cash = float(cash)
+        n = len(symbols)
+        self.qty = np.zeros(n)
+        self.avg = np.zeros(n)
+        self.stop = np.full(n, np.nan)
+        self.take = np.full(n, np.nan)
+        self.prices = np.zeros(n)  # último precio conocido (mark-to-market)
+
+    def get_equity(self) -> float:
+        return float(self.cash + self.qty @ self.prices)
+
+    def get_open_positions(self) -> List[Dict[str, Any]]:
+        out = []
+        for j in np.flatnonzero(self.qty):
+            out.append({
+                "symbol": self.symbols[j],
+                "qty": float(self.qty[j]),
+                "avg_price": float(self.avg[j]),
+                "side": Side.LONG,
+                "stop": None if np.isnan(self.stop[j]) else float(self.stop[j]),
+            })
+        return out
+
+    def get_open_orders(self) -> List[Dict[str, Any]]:
+        return []
+
+    def round_qty(self, qty: float, lot_size: int) -> int:
+        return max(lot_size, int(qty // lot_size * lot_size))
+
+
+def align(data: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    """Matriz T×N de close alineada (y rellenada hacia delante para valorar) y máscara de barra presente."""
+    symbols = sorted(data)
+    index = data[symbols[0]].index
+    for s in symbols[1:]:
+        index = index.union(data[s].index)
+
+    close = pd.concat([data[s]["close"].reindex(index) for s in symbols], axis=1).to_numpy(dtype=float)
+    return {
+        "symbols": symbols,
+        "index": index,
+        "has_bar": np.column_stack([index.isin(data[s].index) for s in symbols]),
+        "close": close,
+        "mark": pd.DataFrame(close).ffill().fillna(0.0).to_numpy(),
+    }
+
+
+def _signal_matrix(data: Dict[str, pd.DataFrame], symbols: List[str], index: pd.Index, make_strategy) -> np.ndarray:
+    """+1 BUY, -1 SELL, 0 sin señal (T×N). Una llamada vectorizada por símbolo."""
+    out = np.zeros((len(index), len(symbols)), dtype=np.int8)
+    for j, s in enumerate(symbols):
+        sig = make_strategy().signal_series(data[s]).reindex(index).to_numpy()
+        out[sig == "BUY", j] = 1
+        out[sig == "SELL", j] = -1
+    return out
+
+
+def _atr_matrix(raw: List[Dict[str, np.ndarray]], has_bar: np.ndarray, window: int) -> np.ndarray:
+    """ATR (media simple del True Range, como RiskManager._atr) por símbolo,
+    calculado sobre sus propias barras y colocado en la matriz T×N."""
+    out = np.full(has_bar.shape, np.nan)
+    for j, b in enumerate(raw):
+        h, l, c = b["high"], b["low"], b["close"]
+        prev = np.concatenate([[np.nan], c[:-1]])
+        tr = np.fmax(h - l, np.fmax(np.abs(h - prev), np.abs(l - prev)))
+        tr[0] = np.nan
+        out[has_bar[:, j], j] = pd.Series(tr).rolling(window).mean().to_numpy()
+    return out
+
+
+def run_portfolio(
+    data: Dict[str, pd.DataFrame],
+    make_strategy,
+    cfg: Optional[RiskConfig] = None,
+    cash: float = 100_000.0,
+    fee: float = 0.0,
+    record_per_symbol: bool = True,
+) -> Dict[str, Any]:
+    """
+    Ejecuta el backtest de portafolio.
+    Retorna dict con 'equity' (DataFrame), 'per_symbol' (DataFrame de PnL por
+    símbolo o None), 'trades' (nº de cierres) y 'risk' (RiskManager usado).
+    """
+    cfg = cfg or default_risk_config()
+    A = align(data)
+    symbols, index = A["symbols"], A["index"]
+    has_bar, close, mark = A["has_bar"], A["close"], A["mark"]
+    T, N = close.shape
+
+    sig = _signal_matrix(data, symbols, index, make_strategy)
+    # Ventana para assess_entry: cubre ATR (window+1) y liquidez (liq_window),
+    # tomada de las barras propias de cada símbolo (sin huecos de la alineación)
+    look = max(cfg.atr_window + 1, cfg.liq_window)
+    pos = np.cumsum(has_bar, axis=0) - 1
+    raw = [
+        {col: data[s][col].to_numpy(dtype=float) if col in data[s].columns else np.full(len(data[s]), 1_000_000.0)
+         for col in ("close", "high", "low", "volume")}
+        for s in symbols
+    ]
+    atr = _atr_matrix(raw, has_bar, cfg.atr_window)
+
+    adapter = PortfolioSimAdapter(symbols, cash)
+    risk = RiskManager(cfg, adapter)
+    realized = np.zeros(N)
+    equity = np.empty(T)
+    per_symbol = np.empty((T, N)) if record_per_symbol else None
+    slip = cfg.slippage_pct
+    trades = 0
+    days = index.tz_convert("UTC").normalize() if index.tz is not None else index.normalize()
+    current_day = None
+
+    for t in range(T):
+        if days[t] != current_day:
+            current_day = days[t]
+            risk.start_of_day()
+        live = has_bar[t]
+        px = close[t]
+        adapter.prices = mark[t]
+        held = adapter.qty > 0
+
+        # ---- Salidas en lote: señal SELL, stop o take ----
+        exit_mask = held & live & (
+            (sig[t] == -1) | (px <= adapter.stop) | (px >= adapter.take)
+        )
+        if exit_mask.any():
+            idx = np.flatnonzero(exit_mask)
+            fill = px[idx] * (1 - slip)
+            pnl = (fill - adapter.avg[idx]) * adapter.qty[idx]
+            adapter.cash += float(np.sum(fill * adapter.qty[idx])) - fee * len(idx)
+            realized[idx] += pnl - fee
+            for k, j in enumerate(idx):
+                risk.record_close(symbols[j], Side.LONG, int(adapter.qty[j]), float(adapter.avg[j]),
+                                  float(adapter.stop[j]), float(adapter.take[j]), float(pnl[k]))
+            adapter.qty[idx] = 0.0
+            adapter.avg[idx] = 0.0
+            adapter.stop[idx] = np.nan
+            adapter.take[idx] = np.nan
+            trades += len(idx)
+            held = adapter.qty > 0
+
+        # ---- Trailing ATR en lote ----
+        if cfg.trailing_atr_multiple is not None:
+            trail = held & live & ~np.isnan(atr[t])
+            if trail.any():
+                cand = np.round(px - cfg.trailing_atr_multiple * atr[t], cfg.price_precision)
+                new_stop = np.where(trail, np.fmax(adapter.stop, cand), adapter.stop)
+                # solo los stops que se movieron actualizan el libro de riesgo
+                for j in np.flatnonzero(trail & (new_stop != adapter.stop)):
+                    risk.update_position(symbols[j], stop=float(new_stop[j]))
+                adapter.stop = new_stop
+
+        # ---- Entradas: solo candidatas pasan por assess_entry ----
+        entries = np.flatnonzero((sig[t] == 1) & live & ~held)
+        if len(entries) and not risk.should_halt_trading()[0]:
+            for j in entries:
+                k = pos[t, j] + 1
+                own = raw[j]
+                bars = {col: own[col][max(0, k - look):k] for col in ("close", "high", "low", "volume")}  # vistas, sin copia
+                decision = risk.assess_entry(symbols[j], Side.LONG, float(px[j]), bars)
+                if not (decision.allow and decision.qty > 0):
+                    continue
+                entry = float(decision.entry or px[j])
+                if decision.qty * entry + fee > adapter.cash:
+                    continue
+                adapter.cash -= decision.qty * entry + fee
+                realized[j] -= fee
+                adapter.qty[j] = decision.qty
+                adapter.avg[j] = entry
+                adapter.stop[j] = decision.stop if decision.stop is not None else np.nan
+                adapter.take[j] = decision.take_profit if decision.take_profit is not None else np.nan
+                risk.open_position(symbols[j], Side.LONG, decision.qty, entry, decision.stop)
+
+        unreal = adapter.qty * (mark[t] - adapter.avg)
+        equity[t] = adapter.cash + adapter.qty @ mark[t]
+        if per_symbol is not None:
+            per_symbol[t] = realized + np.nan_to_num(unreal)
+
+    eq = pd.DataFrame({"equity": equity}, index=index.rename("timestamp"))
+    ps = pd.DataFrame(per_symbol, index=eq.index, columns=symbols) if per_symbol is not None else None
+    return {"equity": eq, "per_symbol": ps, "trades": trades, "risk": risk}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Backtest de portafolio multi-símbolo con RiskManager")
+    p.add_argument("--data", type=str, default="", help="SYM=ruta.csv,SYM2=ruta2.csv")
+    p.add_argument("--data-dir", type=str, default="", help="Carpeta con SYM.csv")
+    add_store_args(p)
+    p.add_argument("--cash", type=float, default=100_000.0)
+    p.add_argument("--fee", type=float, default=0.0)
+    p.add_argument("--max-positions", type=int, default=0, help="Override de RiskConfig.max_positions (0 = default)")
+    p.add_argument("--steps-per-year", type=int, default=0, help="Override de anualización (0 = inferir)")
+    p.add_argument("--per-symbol-out", type=str, default="", help="CSV con la curva de PnL por símbolo")
+    p.add_argument("--equity-out", type=str, default="", help="CSV con la curva de equity agregada")
+    # estrategia (mismos nombres que run_paper)
+    p.add_argument("--strategy", type=str, default="ma", choices=["ma", "rsi", "macd", "bbands"])
+    p.add_argument("--fast", type=int, default=10)
+    p.add_argument("--slow", type=int, default=30)
+    p.add_argument("--rsi-period", type=int, default=14)
+    p.add_argument("--rsi-buy", type=float, default=30.0)
+    p.add_argument("--rsi-sell", type=float, default=70.0)
+    p.add_argument("--macd-fast", type=int, default=12)
+    p.add_argument("--macd-slow", type=int, default=26)
+    p.add_argument("--macd-signal", type=int, default=9)
+    p.add_argument("--bb-window", type=int, default=20)
+    p.add_argument("--bb-k", type=float, default=2.0)
+    args = p.parse_args()
+
+    if args.store:
+        # --symbol vacío: todos los símbolos del almacén con ese timeframe
+        syms = args.symbol.split(",") if args.symbol else BarStore(args.store).symbols(args.store_timeframe)
+        frames = {sym.upper(): load_store_args(args, sym) for sym in syms}
+    else:
+        paths = parse_data_arg(args.data, args.data_dir)
+        if not paths:
+            p.error("Indica --data SYM=ruta.csv, --data-dir o --store")
+        frames = {sym: load_csv(path) for sym, path in paths.items()}
+    cfg = default_risk_config()
+    if args.max_positions:
+        cfg.max_positions = args.max_positions
+
+    t0 = time.time()
+    res = run_portfolio(frames, lambda: build_strategy(args), cfg=cfg, cash=args.cash, fee=args.fee,
+                        record_per_symbol=bool(args.per_symbol_out))
+    elapsed = time.time() - t0
+
+    curve = res["equity"]
+    spy = args.steps_per_year or _infer_steps_per_year(curve)
+    print(f"Símbolos: {len(frames)} | barras: {len(curve)} | cierres: {res['trades']} | {elapsed:.1f}s")
+    print(f"Total return: {total_return(curve['equity']):.2%}")
+    print(f"Sharpe ratio: {sharpe_ratio(equity_to_returns(curve['equity']), steps_per_year=spy):.2f}  (steps_per_year={spy})")
+    print(f"Max drawdown: {max_drawdown(curve['equity']):.2%}")
+    if args.equity_out:
+        curve.to_csv(args.equity_out)
+    if args.per_symbol_out and res["per_symbol"] is not None:
+        res["per_symbol"].to_csv(args.per_symbol_out)
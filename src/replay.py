@@ -0,0 +1,184 @@
+# src/replay.py
+"""
+Replay event-driven: ejecuta la lógica real de run_paper.trade_one_symbol
+(RiskManager avanzado, ensemble, break-even, scale-out, giveback, trailing ATR)
+contra un SimBroker alimentado con barras históricas y un reloj virtual.
+
+Acepta todos los flags de run_paper más los propios del replay. Ejemplo:
+  python -m src.replay --data AAPL=data/AAPL_1m.csv,MSFT=data/MSFT_1m.csv \
+      --ensemble-mode consensus --cash 25000 --equity-out data/replay_equity.csv
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+from .bar_store import end_ns
+from .data import load_csv
+from .indicators import STORE as INDICATORS
+from .logger import flush as flush_logs, logger, overhead as log_overhead, set_console
+from .telemetry import METRICS
+from .metrics import equity_to_returns, max_drawdown, sharpe_ratio, total_return
+from .backtest import _infer_steps_per_year
+from .risk_manager_avanzado import RiskManager as AdvancedRiskManager
+from .ring_buffer import RingBook
+from .run_paper import (
+    AlpacaRiskAdapter,
+    StreamingSignals,
+    build_ensemble,
+    build_parser,
+    build_strategy,
+    default_risk_config,
+    parse_scale_out,
+    trade_one_symbol,
+)
+from .scheduler import ERROR, SymbolScheduler
+from .sim_broker import SimBroker, SimClock
+from .snapshot import AccountSnapshot
+
+
+def parse_data_arg(data: str, data_dir: str) -> Dict[str, str]:
+    """--data SYM=ruta,SYM2=ruta2  y/o  --data-dir carpeta con SYM.csv"""
+    paths: Dict[str, str] = {}
+    for part in (data or "").split(","):
+        if "=" in part:
+            sym, path = part.split("=", 1)
+            paths[sym.strip().upper()] = path.strip()
+    if data_dir:
+        for f in sorted(Path(data_dir).glob("*.csv")):
+            paths.setdefault(f.stem.upper(), str(f))
+    return paths
+
+
+def run_replay(
+    data: Dict[str, pd.DataFrame],
+    args,
+    cash: float = 10_000.0,
+    slippage_bps: float = 0.0,
+    verbose: bool = False,
+) -> Tuple[pd.DataFrame, SimBroker]:
+    """Recorre la línea temporal común y llama a trade_one_symbol por símbolo con barra nueva."""
+    clock = SimClock()
+    broker = SimBroker(data, cash=cash, clock=clock, timeframe=args.timeframe, slippage_bps=slippage_bps)
+
+    snapshot = AccountSnapshot(broker, max_age=args.snapshot_max_age)
+    position_book: Dict[str, dict] = {}
+    risk = AdvancedRiskManager(default_risk_config(), AlpacaRiskAdapter(snapshot, position_book))
+    strat = build_strategy(args)
+    ensemble, wrappers = build_ensemble(args)
+    streaming = StreamingSignals(strat, wrappers) if args.signal_mode == "incremental" else None
+    rings = RingBook(args.lookback) if args.bar_window == "ring" else None
+    scale_out_levels = parse_scale_out(args.scale_out)
+    session: Dict[str, Any] = {"pnl_today": 0.0, "halted": False}
+    scheduler = SymbolScheduler(base_delay=args.retry_base_seconds, max_delay=args.retry_max_seconds,
+                                breaker_threshold=args.breaker_threshold, breaker_cooldown=args.breaker_cooldown,
+                                clock=lambda: clock.now.timestamp())
+
+    # Qué símbolos tienen barra en cada timestamp
+    by_ts: Dict[int, List[str]] = {}
+    for sym in broker.symbols:
+        for t in broker._bars[sym].ts:
+            by_ts.setdefault(int(t), []).append(sym)
+
+    curve: List[Tuple[pd.Timestamp, float]] = []
+    current_day = None
+    log0 = log_overhead()
+    t_start = time.perf_counter()
+    sink = open(os.devnull, "w") if not verbose else None
+    set_console("normal" if verbose else "off")  # el detalle por tick sigue yendo a logs/bot.log
+    try:
+        with contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext():
+            for t in broker.timeline():
+                now = pd.Timestamp(int(t), tz="UTC")
+                clock.set(now)
+                snapshot.mark_stale()
+                if now.date() != current_day:
+                    current_day = now.date()
+                    risk.start_of_day()
+                    session.update(pnl_today=0.0, halted=False)
+                if not session.get("halted"):
+                    start_iso = clock.iso_hours_back(args.hours_back)
+                    due, _ = scheduler.due(by_ts[int(t)])
+                    for sym in due:
+                        status = ERROR
+                        try:
+                            status = trade_one_symbol(
+                                broker=snapshot, risk=risk, strat=strat, symbol=sym,
+                                timeframe=args.timeframe, lookback=args.lookback, start_iso=start_iso,
+                                args=args, position_book=position_book, ensemble=ensemble,
+                                wrappers=wrappers, scale_out_levels=scale_out_levels,
+                                session=session, streaming=streaming, rings=rings,
+                            )
+                        except Exception as e_sym:
+                            logger.exception(f"Replay: error en [{sym}] @ {now}: {e_sym}")
+                        finally:
+                            scheduler.report(sym, status)
+                curve.append((now, broker._equity()))
+    finally:
+        flush_logs()  # lo encolado con la consola en "off" no debe salir al reactivarla
+        set_console("normal")
+        if sink:
+            sink.close()
+
+    equity = pd.DataFrame(curve, columns=["timestamp", "equity"]).set_index("timestamp")
+    equity.attrs["scheduler"] = dict(scheduler.stats)
+    equity.attrs["indicators"] = INDICATORS.summary()
+    log1 = log_overhead()
+    equity.attrs["logging"] = {"records": int(log1["records"] - log0["records"]),
+                               "seconds": log1["seconds"] - log0["seconds"],
+                               "share": (log1["seconds"] - log0["seconds"]) / max(1e-9, time.perf_counter() - t_start)}
+    return equity, broker
+
+
+def main() -> None:
+    p = build_parser()
+    p.description = "Replay de run_paper contra SimBroker (barras históricas, reloj virtual)"
+    p.add_argument("--data", type=str, default="", help="SYM=ruta.csv,SYM2=ruta2.csv")
+    p.add_argument("--data-dir", type=str, default="", help="Carpeta con SYM.csv (timestamp,open,high,low,close,volume)")
+    p.add_argument("--start", type=str, default="", help="Inicio (ISO, opcional)")
+    p.add_argument("--end", type=str, default="", help="Fin (ISO, incluido; una fecha sola = todo ese día)")
+    p.add_argument("--cash", type=float, default=10_000.0)
+    p.add_argument("--slippage-bps", type=float, default=0.0)
+    p.add_argument("--equity-out", type=str, default="", help="CSV de salida con la curva de equity")
+    p.add_argument("--verbose", action="store_true", help="Muestra la salida por tick de trade_one_symbol")
+    args = p.parse_args()
+
+    paths = parse_data_arg(args.data, args.data_dir)
+    if not paths:
+        p.error("Indica --data SYM=ruta.csv o --data-dir")
+    data = {}
+    for sym, path in paths.items():
+        df = load_csv(path)
+        if args.start:
+            df = df.loc[pd.Timestamp(args.start, tz="UTC"):]
+        if args.end:
+            df = df.loc[:pd.Timestamp(end_ns(args.end), tz="UTC")]
+        data[sym] = df
+
+    t0 = time.time()
+    equity, broker = run_replay(data, args, cash=args.cash, slippage_bps=args.slippage_bps, verbose=args.verbose)
+    elapsed = time.time() - t0
+
+    eq = equity["equity"]
+    spy = _infer_steps_per_year(equity)
+    print(f"Símbolos: {', '.join(broker.symbols)} | barras: {len(equity)} | {elapsed:.1f}s reales")
+    print(f"Total return: {total_return(eq):.2%}")
+    print(f"Sharpe ratio: {sharpe_ratio(equity_to_returns(eq), steps_per_year=spy):.2f}  (steps_per_year={spy})")
+    print(f"Max drawdown: {max_drawdown(eq):.2%}")
+    print(f"Órdenes llenadas: {len(broker.fills)} | ticks omitidos por el scheduler: {equity.attrs['scheduler']['skipped']}")
+    print(f"Indicadores: {equity.attrs['indicators']}")
+    lg = equity.attrs["logging"]
+    print(f"Logging: {lg['records']} registros, {lg['seconds'] * 1000:.0f} ms encolando ({lg['share']:.2%} del replay)")
+    print("Latencia por etapa:\n  " + METRICS.report("bot_stage_seconds").replace("\n", "\n  "))
+    if args.equity_out:
+        equity.to_csv(args.equity_out)
+        print(f"Curva de equity en {args.equity_out}")
+
+
+if __name__ == "__main__":
+    main()
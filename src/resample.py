@@ -0,0 +1,179 @@
+# src/resample.py
+"""
+Remuestreo incremental de velas de 1 minuto (salida de data.bars_to_df) a
+timeframes mayores (5Min, 15Min, 1Hour...), para operar varios timeframes
+sin pedir más barras al broker.
+
+- origin="epoch": cubetas alineadas al epoch UTC (como las velas de Alpaca).
+- origin="session": cubetas ancladas a la apertura (09:30 America/New_York),
+  p. ej. 1Hour = 09:30-10:30, 10:30-11:30...; respeta el cambio de horario.
+- Incremental: en cada update() solo se recalculan las cubetas tocadas por
+  las velas de 1m nuevas (o corregidas) desde la llamada anterior.
+- Si la ventana de 1m empieza a mitad de una cubeta (p. ej. en la primera
+  llamada), esa cubeta está incompleta y no se devuelve.
+- Vela parcial: la cubeta en formación solo se devuelve con include_partial=True.
+  Una cubeta se da por cerrada cuando llega una vela de la siguiente, cuando
+  ya está su último minuto o cuando `now` pasa de su fin + `close_grace`
+  (minutos sin negociación en IEX no llegan nunca).
+
+Ejemplo:
+  python -m src.resample --file data/AAPL_1m.csv --timeframe 15Min --origin session
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .scheduler import timeframe_seconds
+
+_MIN_NS = 60 * 1_000_000_000
+COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def bucket_starts(index: pd.DatetimeIndex, timeframe: str, origin: str = "epoch",
+                  session_open: str = "09:30", tz: str = "America/New_York") -> np.ndarray:
+    """Inicio (ns UTC) de la cubeta de cada timestamp."""
+    step = timeframe_seconds(timeframe) * 1_000_000_000
+    idx = index if index.tz is not None else index.tz_localize("UTC")
+    ts = idx.as_unit("ns").asi8
+    if origin == "epoch":
+        return ts - ts % step
+    if origin != "session":
+        raise ValueError(f"origin desconocido: {origin!r} (epoch | session)")
+    local = idx.tz_convert(tz)
+    day = local.normalize()
+    h, m = (int(x) for x in session_open.split(":"))
+    open_ns = (h * 60 + m) * _MIN_NS
+    since_open = (local.as_unit("ns").asi8 - day.as_unit("ns").asi8) - open_ns
+    # offset local -> UTC del día (el bucket se calcula en hora local y se devuelve en UTC)
+    return ts - since_open + np.floor_divide(since_open, step) * step
+
+
+class Resampler:
+    def __init__(
+        self,
+        timeframe: str,
+        origin: str = "epoch",
+        include_partial: bool = False,
+        session_open: str = "09:30",
+        tz: str = "America/New_York",
+        max_bars: int = 5_000,
+        close_grace: float = 60.0,
+    ):
+        self.timeframe = timeframe
+        self.step_ns = timeframe_seconds(timeframe) * 1_000_000_000
+        self.origin = origin
+        self.include_partial = include_partial
+        self.session_open = session_open
+        self.tz = tz
+        self.max_bars = int(max_bars)
+        self.close_grace_ns = int(close_grace * 1_000_000_000)
+        self._bars: Dict[int, Tuple[float, float, float, float, float]] = {}  # inicio cubeta -> OHLCV
+        self._last_minute: Optional[int] = None  # ns de la última vela de 1m vista
+
+    def reset(self) -> None:
+        self._bars.clear()
+        self._last_minute = None
+
+    def _aggregate(self, df: pd.DataFrame, drop_head: bool = False) -> None:
+        """
+        Recalcula (vectorizado) las cubetas presentes en df, que deben venir completas.
+        drop_head: df es el inicio de la ventana; si su primer minuto no es el inicio
+        de su cubeta, esa primera cubeta está incompleta y se descarta.
+        """
+        starts = bucket_starts(df.index, self.timeframe, self.origin, self.session_open, self.tz)
+        cuts = np.concatenate([[0], np.flatnonzero(np.diff(starts)) + 1])
+        first_ts = df.index[:1].as_unit("ns").asi8[0]
+        head = 1 if drop_head and first_ts != starts[0] else 0
+        o = df["open"].to_numpy(dtype=float)[cuts]
+        h = np.maximum.reduceat(df["high"].to_numpy(dtype=float), cuts)
+        l = np.minimum.reduceat(df["low"].to_numpy(dtype=float), cuts)
+        ends = np.concatenate([cuts[1:], [len(df)]]) - 1
+        c = df["close"].to_numpy(dtype=float)[ends]
+        vol = df["volume"].to_numpy(dtype=float) if "volume" in df.columns else np.zeros(len(df))
+        v = np.add.reduceat(vol, cuts)
+        for i, b in enumerate(starts[cuts].tolist()[head:], start=head):
+            self._bars[b] = (o[i], h[i], l[i], c[i], v[i])
+
+    def update(self, df_1m: pd.DataFrame, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        Incorpora las velas de 1m nuevas de df_1m (ventana ordenada; la última
+        vista se vuelve a leer por si fue corregida) y devuelve el DataFrame
+        OHLCV del timeframe mayor.
+        """
+        if df_1m is not None and not df_1m.empty:
+            idx = df_1m.index if df_1m.index.tz is not None else df_1m.index.tz_localize("UTC")
+            ts = idx.as_unit("ns").asi8
+            first_new = 0
+            if self._last_minute is not None:
+                first_new = int(np.searchsorted(ts, self._last_minute, side="left"))
+            if first_new < len(ts):
+                # las cubetas tocadas se recalculan enteras desde su primer minuto presente en la ventana
+                touched = bucket_starts(idx[first_new:first_new + 1], self.timeframe, self.origin,
+                                        self.session_open, self.tz)[0]
+                lo = int(np.searchsorted(ts, touched, side="left"))
+                self._aggregate(df_1m.iloc[lo:], drop_head=lo == 0)
+                self._last_minute = int(ts[-1])
+            if len(self._bars) > self.max_bars:
+                for b in sorted(self._bars)[: len(self._bars) - self.max_bars]:
+                    del self._bars[b]
+        return self.frame(now)
+
+    def _is_closed(self, start: int, now_ns: Optional[int]) -> bool:
+        end = start + self.step_ns
+        if self._last_minute is not None and (self._last_minute >= end or self._last_minute + _MIN_NS >= end):
+            return True
+        return now_ns is not None and now_ns >= end + self.close_grace_ns
+
+    def frame(self, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        if not self._bars:
+            return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz="UTC", name="timestamp"))
+        keys = sorted(self._bars)
+        now_ns = None if now is None else pd.Timestamp(now).as_unit("ns").value
+        if not self.include_partial and not self._is_closed(keys[-1], now_ns):
+            keys = keys[:-1]
+        data = np.array([self._bars[k] for k in keys], dtype=float).reshape(-1, 5)
+        index = pd.DatetimeIndex(np.array(keys, dtype="datetime64[ns]"), name="timestamp").tz_localize("UTC")
+        return pd.DataFrame(data, index=index, columns=COLUMNS)
+
+
+class ResampleBook:
+    """Un Resampler por (símbolo, timeframe); se crean bajo demanda."""
+
+    def __init__(self, origin: str = "epoch", include_partial: bool = False):
+        self.origin = origin
+        self.include_partial = include_partial
+        self._by_key: Dict[Tuple[str, str], Resampler] = {}
+
+    def update(self, symbol: str, timeframe: str, df_1m: pd.DataFrame, limit: Optional[int] = None,
+               now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        key = (symbol.upper(), timeframe)
+        r = self._by_key.get(key)
+        if r is None:
+            r = self._by_key[key] = Resampler(timeframe, origin=self.origin, include_partial=self.include_partial)
+        out = r.update(df_1m, now=now)
+        return out.tail(limit) if limit else out
+
+
+if __name__ == "__main__":
+    from .data import load_csv
+
+    p = argparse.ArgumentParser(description="Remuestrea un CSV de 1m de forma incremental (simula el loop)")
+    p.add_argument("--file", type=str, required=True)
+    p.add_argument("--timeframe", type=str, default="5Min")
+    p.add_argument("--origin", type=str, default="epoch", choices=["epoch", "session"])
+    p.add_argument("--chunk", type=int, default=1, help="Velas de 1m por update() (simula el loop)")
+    p.add_argument("--out", type=str, default="")
+    args = p.parse_args()
+
+    df = load_csv(args.file)
+    r = Resampler(args.timeframe, origin=args.origin)
+    for end in range(args.chunk, len(df) + args.chunk, args.chunk):
+        out = r.update(df.iloc[max(0, end - 500):end])
+    print(out.tail())
+    print(f"{len(df)} velas 1m -> {len(out)} velas {args.timeframe} cerradas")
+    if args.out:
+        out.to_csv(args.out)
@@ -0,0 +1,219 @@
+# src/ring_buffer.py
+"""
+Ventana de velas por símbolo en arrays preasignados (buffer circular).
+
+BarRing guarda ts (int64 ns UTC) y OHLCV (float64) en arrays de 2·C
+posiciones (C = window + slack) y escribe cada vela dos veces (i y i + C):
+las últimas `window` velas son siempre un tramo contiguo, así que frame() y
+arrays() devuelven vistas sin copiar. Añadir una vela no reserva memoria.
+
+- Las velas nuevas se añaden en su sitio; si llega otra vez el último
+  timestamp (vela en formación o corregida) se sobreescribe.
+- Una vista ya entregada (frame/arrays) no cambia durante las `slack` velas
+  nuevas siguientes; después el buffer circular reutiliza esas posiciones.
+  Quien necesite conservarla más tiempo debe copiarla.
+- Las correcciones y reset() no escriben sobre memoria ya entregada: si hay
+  vistas fuera, primero se pasa a arrays nuevos (copia al escribir).
+- `version` cuenta las velas reescritas con valores distintos; frame() la
+  deja en df.attrs["version"] para que el IndicatorStore no reutilice series
+  calculadas antes de una corrección.
+- extend_bars() recibe la lista de barras del broker (t/o/h/l/c/v) y solo
+  convierte las nuevas; si no solapa con lo guardado (hueco), se reinicia.
+
+Ejemplo:
+  python -m src.ring_buffer --file data/AAPL_1m.csv --window 120
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("open", "high", "low", "close", "volume")
+_BAR_KEYS = ("o", "h", "l", "c", "v")
+
+
+def parse_ts(t) -> int:
+    """Timestamp de una barra de Alpaca ('2024-01-02T14:30:00Z') -> ns UTC."""
+    if isinstance(t, str) and t.endswith("Z"):
+        return int(np.datetime64(t[:-1], "ns").astype(np.int64))
+    return pd.Timestamp(t).as_unit("ns").value
+
+
+class BarRing:
+    def __init__(self, window: int, slack: int = 64):
+        self.window = int(window)
+        self.capacity = self.window + max(1, int(slack))
+        self._ts = np.zeros(2 * self.capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((len(FIELDS), 2 * self.capacity), dtype=np.float64)
+        self._exported = False  # hay vistas de los arrays actuales fuera
+        self.version = 0  # correcciones aplicadas (no se reinicia con reset)
+        self.reset()
+
+    def reset(self) -> None:
+        self._detach()
+        self._count = 0  # velas escritas desde el último reset
+        self.last_ts: Optional[int] = None
+
+    def _detach(self) -> None:
+        """Antes de reescribir posiciones ya escritas: arrays nuevos si hay vistas entregadas."""
+        if self._exported:
+            self._ts = self._ts.copy()
+            self._ohlcv = self._ohlcv.copy()
+            self._exported = False
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    def _bounds(self) -> Tuple[int, int]:
+        """[inicio, fin) del tramo contiguo con las últimas len(self) velas."""
+        if not self._count:
+            return 0, 0
+        end = (self._count - 1) % self.capacity + self.capacity + 1
+        return end - len(self), end
+
+    def _write(self, k: int, ts: int, row: Tuple[float, float, float, float, float]) -> None:
+        j = k % self.capacity
+        for pos in (j, j + self.capacity):
+            self._ts[pos] = ts
+            self._ohlcv[:, pos] = row
+
+    def _rewrite(self, k: int, ts: int, row: Tuple[float, float, float, float, float]) -> None:
+        """Sustituye una vela ya escrita; solo cuenta como corrección si cambia algún valor."""
+        if tuple(self._ohlcv[:, k % self.capacity].tolist()) != row:
+            self._detach()
+            self._write(k, ts, row)
+            self.version += 1
+
+    def append(self, ts: int, o: float, h: float, l: float, c: float, v: float = 0.0) -> None:
+        """Añade una vela (ts en ns); el mismo ts que la última la sustituye."""
+        row = (o, h, l, c, v)
+        if self._count and ts <= self.last_ts:
+            if ts == self.last_ts:
+                self._rewrite(self._count - 1, ts, row)
+                return
+            # corrección de una vela anterior: solo si sigue en la ventana
+            start, end = self._bounds()
+            pos = int(np.searchsorted(self._ts[start:end], ts))
+            if pos < end - start and self._ts[start + pos] == ts:
+                self._rewrite(self._count - (end - start) + pos, ts, row)
+            return
+        self._write(self._count, ts, row)
+        self._count += 1
+        self.last_ts = ts
+
+    def extend_bars(self, bars: List[dict]) -> None:
+        """Incorpora una lista de barras ordenada (t/o/h/l/c/v); solo se leen las nuevas."""
+        if not bars:
+            return
+        if self._count and parse_ts(bars[0]["t"]) > self.last_ts:
+            self.reset()  # hueco: la lista no solapa con lo guardado
+        if self._count:
+            i = len(bars)
+            while i > 0 and parse_ts(bars[i - 1]["t"]) >= self.last_ts:
+                i -= 1
+        else:
+            i = max(0, len(bars) - self.window)  # solo caben las últimas `window`
+        for b in bars[i:]:
+            self.append(parse_ts(b["t"]), *(float(b.get(k, 0.0) or 0.0) for k in _BAR_KEYS))
+
+    def extend_df(self, df: pd.DataFrame) -> None:
+        """Igual que extend_bars() pero desde un DataFrame OHLCV con índice de fechas."""
+        if df is None or df.empty:
+            return
+        idx = df.index if df.index.tz is not None else df.index.tz_localize("UTC")
+        ts = idx.as_unit("ns").asi8
+        if self._count and ts[0] > self.last_ts:
+            self.reset()
+        if self._count:
+            start = int(np.searchsorted(ts, self.last_ts, side="left"))
+        else:
+            start = max(0, len(ts) - self.window)
+        cols = [df[f].to_numpy(dtype=float) if f in df.columns else np.zeros(len(df)) for f in FIELDS]
+        for i in range(start, len(ts)):
+            self.append(int(ts[i]), cols[0][i], cols[1][i], cols[2][i], cols[3][i], cols[4][i])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Vistas (sin copia) de ts y OHLCV de la ventana actual."""
+        start, end = self._bounds()
+        self._exported = True
+        out = {"ts": self._ts[start:end]}
+        for i, f in enumerate(FIELDS):
+            out[f] = self._ohlcv[i, start:end]
+        return out
+
+    def frame(self, since: Optional[int] = None) -> pd.DataFrame:
+        """
+        DataFrame OHLCV sobre vistas de los arrays (no copia los datos).
+        since: ns UTC; omite las velas anteriores (como start_iso en get_bars).
+        """
+        start, end = self._bounds()
+        if since is not None and end > start:
+            start += int(np.searchsorted(self._ts[start:end], since, side="left"))
+        self._exported = True
+        index = pd.DatetimeIndex(self._ts[start:end].view("datetime64[ns]"), name="timestamp").tz_localize("UTC")
+        cols = {f: self._ohlcv[i, start:end] for i, f in enumerate(FIELDS)}
+        df = pd.DataFrame(cols, index=index, copy=False)
+        df.attrs["version"] = self.version
+        return df
+
+
+class RingBook:
+    """Un BarRing por (símbolo, timeframe), creado bajo demanda."""
+
+    def __init__(self, window: int, slack: int = 64):
+        self.window = int(window)
+        self.slack = int(slack)
+        self._rings: Dict[Tuple[str, str], BarRing] = {}
+        self._lock = threading.Lock()
+
+    def ring(self, symbol: str, timeframe: str, window: Optional[int] = None) -> BarRing:
+        key = (symbol.upper(), timeframe)
+        with self._lock:
+            r = self._rings.get(key)
+            if r is None:
+                r = self._rings[key] = BarRing(window or self.window, self.slack)
+            return r
+
+    def last_ts(self, symbol: str, timeframe: str) -> Optional[int]:
+        """ns de la última vela guardada de (símbolo, timeframe); None si aún no hay ventana."""
+        with self._lock:
+            r = self._rings.get((symbol.upper(), timeframe))
+        return r.last_ts if r is not None else None
+
+    def update_bars(self, symbol: str, timeframe: str, bars: List[dict], since_iso: Optional[str] = None,
+                    window: Optional[int] = None) -> pd.DataFrame:
+        """Añade las barras nuevas del broker y devuelve la ventana (vistas, ver BarRing) desde since_iso."""
+        r = self.ring(symbol, timeframe, window)
+        r.extend_bars(bars)
+        return r.frame(parse_ts(since_iso) if since_iso else None)
+
+
+if __name__ == "__main__":
+    import time
+
+    from .data import bars_to_df, load_csv
+
+    p = argparse.ArgumentParser(description="Compara BarRing con bars_to_df vela a vela (simula el loop)")
+    p.add_argument("--file", type=str, required=True)
+    p.add_argument("--window", type=int, default=120)
+    args = p.parse_args()
+
+    df = load_csv(args.file)
+    bars = [{"t": ts.strftime("%Y-%m-%dT%H:%M:%SZ"), "o": r.open, "h": r.high, "l": r.low, "c": r.close,
+             "v": r.volume} for ts, r in zip(df.index, df.itertuples())]
+    ring = BarRing(args.window)
+    t0 = time.perf_counter()
+    for i in range(1, len(bars) + 1):
+        ring.extend_bars(bars[max(0, i - args.window):i])
+        out = ring.frame()
+    t_ring = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(1, len(bars) + 1):
+        ref = bars_to_df(bars[max(0, i - args.window):i])
+    t_df = time.perf_counter() - t0
+    same = np.array_equal(out.to_numpy(), ref.to_numpy(dtype=float)) and out.index.equals(ref.index)
+    print(f"{len(bars)} ticks | ring: {t_ring:.2f}s | bars_to_df: {t_df:.2f}s | última ventana igual: {same}")
@@ -1,8 +1,17 @@
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Sequence, Tuple, Union
+import math
 import statistics
 from enum import Enum
 
+import numpy as np
+import pandas as pd
+
+from .indicators import EWM, RollingMean
+
+# Series de barras aceptadas: listas (API original), arrays de NumPy o columnas de pandas
+BarSeries = Union[Sequence[float], np.ndarray, pd.Series]
+
 
 class Side(str, Enum):
     LONG = "LONG"
@@ -71,6 +80,19 @@ class RiskConfig:
     # Ventanas
     atr_window: int = 14
     liq_window: int = 20
+    atr_smoothing: str = "sma"            # "sma" (media simple del TR) | "wilder" (RMA, alpha=1/window)
+
+
+@dataclass
+class _PositionRisk:
+    """Entrada del libro de riesgo de RiskManager (una por símbolo)."""
+    side: Any
+    qty: float
+    entry: float
+    stop: Optional[float]
+    risk: float = 0.0       # $ en riesgo hasta el stop
+    exposure: float = 0.0   # exposición bruta $
+    count: int = 1          # posiciones agregadas en el símbolo
 
 
 class RiskManager:
@@ -86,11 +108,23 @@ class RiskManager:
     Interfaz esperada del adaptador (inyéctalo en el constructor):
       adapter.get_equity() -> float
       adapter.get_open_positions() -> List[Dict]  # cada dict: {symbol, qty, avg_price, side, stop?}
+                                                  # (solo para cargar el libro: load_positions())
       adapter.get_open_orders() -> List[Dict]     # opcional
       adapter.round_qty(qty: float, lot_size: int) -> int  # opcional
 
     Datos de mercado esperados en assess_entry():
-      bars: Dict con claves "close", "high", "low", "volume" como listas (más reciente al final)
+      bars: Dict con claves "close", "high", "low", "volume" como listas o arrays
+            (más reciente al final), o directamente el DataFrame de velas.
+      Para no recorrer la ventana en cada llamada, bar_state(símbolo).sync(df)
+      mantiene ATR y volumen $ vela a vela y as_bars() los pasa ya calculados.
+
+    Libro de riesgo: calor, exposición bruta y exposición/nº de posiciones por
+    símbolo se mantienen como totales acumulados (O(1) por consulta). Se carga
+    una vez desde el adaptador y luego el llamador informa de los cambios:
+      open_position()   -> apertura
+      update_position() -> scale-out (qty) o movimiento de stop
+      record_close()    -> cierre total (también la saca del libro)
+    Si el estado cambia por fuera, load_positions() lo reconstruye.
     """
 
     def __init__(self, config: RiskConfig, adapter):
@@ -99,18 +133,59 @@ class RiskManager:
         self.consecutive_losses = 0
         self.day_start_equity: Optional[float] = None
         self.trades: List[TradeRecord] = []
+        self._book: Dict[str, _PositionRisk] = {}
+        self._book_loaded = False
+        self._total_risk = 0.0
+        self._gross = 0.0
+        self._n_positions = 0
+        self._bar_states: Dict[str, BarRiskState] = {}
 
     # ---------- Utils ----------
     @staticmethod
-    def _atr(highs: List[float], lows: List[float], closes: List[float], window: int) -> Optional[float]:
-        if len(highs) < window + 1 or len(lows) < window + 1 or len(closes) < window + 1:
+    def _atr(highs: BarSeries, lows: BarSeries, closes: BarSeries, window: int,
+             smoothing: str = "sma") -> Optional[float]:
+        """
+        ATR sobre las últimas velas (listas o arrays). "sma": media de los
+        últimos `window` TR con math.fsum (mismo resultado que statistics.fmean);
+        "wilder": RMA de todos los TR disponibles.
+        """
+        n = min(len(highs), len(lows), len(closes))
+        if n < window + 1:
             return None
-        trs = []
-        for i in range(1, window + 1):
-            h, l, pc = highs[-i], lows[-i], closes[-(i+1)]
-            tr = max(h - l, abs(h - pc), abs(l - pc))
-            trs.append(tr)
-        return statistics.fmean(trs)
+        k = window if smoothing == "sma" else n - 1
+        h = np.asarray(highs[len(highs) - k:], dtype=float)
+        l = np.asarray(lows[len(lows) - k:], dtype=float)
+        pc = np.asarray(closes[len(closes) - k - 1:len(closes) - 1], dtype=float)
+        tr = np.maximum(h - l, np.maximum(np.abs(h - pc), np.abs(l - pc)))
+        if smoothing == "sma":
+            return math.fsum(tr.tolist()) / window
+        rma = EWM(1.0 / window, min_periods=window)
+        for x in tr.tolist():
+            rma.update(x)
+        return rma.value
+
+    @staticmethod
+    def _bar_arrays(bars: Any) -> Dict[str, Any]:
+        """DataFrame de velas -> columnas como arrays (vistas, sin copia); los dicts pasan tal cual."""
+        if isinstance(bars, pd.DataFrame):
+            return {c: bars[c].to_numpy(dtype=float, copy=False) for c in ("close", "high", "low", "volume")
+                    if c in bars.columns}
+        return bars
+
+    def _bars_atr(self, bars: Dict[str, Any]) -> Optional[float]:
+        """ATR(atr_window) de `bars`: usa bars['atr'] si viene precalculado."""
+        if "atr" in bars:
+            return bars["atr"]
+        return self._atr(bars.get("high", []), bars.get("low", []), bars.get("close", []), self.cfg.atr_window,
+                         self.cfg.atr_smoothing)
+
+    # ---------- Estado incremental por símbolo ----------
+    def bar_state(self, key: str) -> "BarRiskState":
+        """BarRiskState de `key` (símbolo o símbolo@timeframe), creado bajo demanda."""
+        st = self._bar_states.get(key)
+        if st is None:
+            st = self._bar_states[key] = BarRiskState(self.cfg.atr_window, self.cfg.liq_window, self.cfg.atr_smoothing)
+        return st
 
     @staticmethod
     def _sma(values: List[float], window: int) -> Optional[float]:
@@ -140,46 +215,96 @@ class RiskManager:
         threshold = self.day_start_equity * (1 - self.cfg.daily_loss_limit_pct)
         return eq <= threshold
 
+    # ---------- Libro de riesgo (totales incrementales) ----------
+    def _position_risk(self, side: Any, qty: float, entry: float, stop: Optional[float]) -> float:
+        # Riesgo aproximado = qty * (entry - stop) (absoluto), si stop no existe, usa default %
+        if not stop:
+            stop = entry * (1 - self.cfg.default_sl_pct) if side == Side.LONG else entry * (1 + self.cfg.default_sl_pct)
+        return abs(entry - stop) * abs(qty)
+
+    def _book_add(self, symbol: str, pr: "_PositionRisk") -> None:
+        self._book[symbol] = pr
+        self._total_risk += pr.risk
+        self._gross += pr.exposure
+        self._n_positions += pr.count
+
+    def _book_remove(self, symbol: str) -> Optional["_PositionRisk"]:
+        pr = self._book.pop(symbol, None)
+        if pr is not None:
+            self._n_positions -= pr.count
+            if self._book:
+                self._total_risk -= pr.risk
+                self._gross -= pr.exposure
+            else:
+                # sin posiciones: se ponen a cero exactos (sin residuo de redondeo)
+                self._total_risk = self._gross = 0.0
+        return pr
+
+    def load_positions(self) -> None:
+        """Reconstruye el libro desde adapter.get_open_positions() (O(n), solo al cargar/reconciliar)."""
+        self._book.clear()
+        self._total_risk = self._gross = 0.0
+        self._n_positions = 0
+        for p in self.adapter.get_open_positions() or []:
+            symbol = p.get("symbol")
+            qty = abs(p.get("qty", 0))
+            entry = p.get("avg_price", 0.0)
+            pr = self._book_remove(symbol) or _PositionRisk(p.get("side"), 0, entry, p.get("stop"), count=0)
+            pr.qty += qty
+            pr.count += 1
+            pr.risk += self._position_risk(p.get("side"), qty, entry, p.get("stop"))
+            pr.exposure += abs(qty * entry)
+            self._book_add(symbol, pr)
+        self._book_loaded = True
+
+    def _ensure_book(self) -> None:
+        if not self._book_loaded:
+            self.load_positions()
+
+    def open_position(self, symbol: str, side: Side, qty: float, entry: float, stop: Optional[float]) -> None:
+        """Registra una posición nueva (o la reemplaza si el símbolo ya estaba)."""
+        self._ensure_book()
+        self._book_remove(symbol)
+        pr = _PositionRisk(side, abs(qty), entry, stop)
+        pr.risk = self._position_risk(side, qty, entry, stop)
+        pr.exposure = abs(qty * entry)
+        self._book_add(symbol, pr)
+
+    def update_position(self, symbol: str, qty: Optional[float] = None, stop: Optional[float] = None) -> None:
+        """Scale-out (nueva qty) y/o stop movido de una posición abierta."""
+        self._ensure_book()
+        pr = self._book.get(symbol)
+        if pr is None:
+            return
+        self.open_position(symbol, pr.side, pr.qty if qty is None else qty, pr.entry,
+                           pr.stop if stop is None else stop)
+
     def _portfolio_heat(self) -> float:
         equity = self.adapter.get_equity()
         if equity <= 0:
             return 1.0
-        open_positions = self.adapter.get_open_positions() or []
-        # Riesgo aproximado = qty * (entry - stop) (absoluto), si stop no existe, usa default %
-        total_risk = 0.0
-        for p in open_positions:
-            entry = p.get("avg_price", 0.0)
-            stop = p.get("stop", None)
-            if not stop:
-                stop = entry * (1 - self.cfg.default_sl_pct) if p.get("side") == Side.LONG else entry * (1 + self.cfg.default_sl_pct)
-            risk_per_share = abs(entry - stop)
-            total_risk += risk_per_share * abs(p.get("qty", 0))
-        return total_risk / equity
+        self._ensure_book()
+        return self._total_risk / equity
 
     def _gross_exposure(self) -> float:
-        open_positions = self.adapter.get_open_positions() or []
-        exposure = 0.0
-        for p in open_positions:
-            exposure += abs(p.get("qty", 0) * p.get("avg_price", 0.0))
-        return exposure
+        self._ensure_book()
+        return self._gross
 
     def _symbol_exposure_pct(self, symbol: str) -> float:
         equity = self.adapter.get_equity()
         if equity <= 0:
             return 1.0
-        open_positions = self.adapter.get_open_positions() or []
-        exposure = 0.0
-        for p in open_positions:
-            if p.get("symbol") == symbol:
-                exposure += abs(p.get("qty", 0) * p.get("avg_price", 0.0))
-        return exposure / equity
+        self._ensure_book()
+        pr = self._book.get(symbol)
+        return (pr.exposure if pr is not None else 0.0) / equity
 
     # ---------- Validaciones previas ----------
     def _basic_guards(self, symbol: str) -> Optional[str]:
-        positions = self.adapter.get_open_positions() or []
-        if len(positions) >= self.cfg.max_positions:
+        self._ensure_book()
+        if self._n_positions >= self.cfg.max_positions:
             return f"Max posiciones ({self.cfg.max_positions})"
-        if sum(1 for p in positions if p.get("symbol") == symbol) >= self.cfg.max_positions_per_symbol:
+        pr = self._book.get(symbol)
+        if (pr.count if pr is not None else 0) >= self.cfg.max_positions_per_symbol:
             return f"Max por símbolo ({self.cfg.max_positions_per_symbol}) en {symbol}"
         if self._daily_loss_limit_hit():
             return "Límite de pérdida diaria alcanzado"
@@ -195,11 +320,12 @@ class RiskManager:
         return None
 
     # ---------- Liquidez ----------
-    def _estimate_liquidity_dollar(self, closes: List[float], volumes: List[float], window: int) -> Optional[float]:
+    def _estimate_liquidity_dollar(self, closes: BarSeries, volumes: BarSeries, window: int) -> Optional[float]:
         if len(closes) < window or len(volumes) < window:
             return None
-        liq = [closes[-i] * volumes[-i] for i in range(1, window + 1)]
-        return statistics.fmean(liq)
+        c = np.asarray(closes[len(closes) - window:], dtype=float)
+        v = np.asarray(volumes[len(volumes) - window:], dtype=float)
+        return math.fsum((c * v).tolist()) / window
 
     # ---------- API principal ----------
     def assess_entry(
@@ -207,26 +333,27 @@ class RiskManager:
         symbol: str,
         side: Side,
         price: float,
-        bars: Dict[str, List[float]],
+        bars: Union[Dict[str, Any], pd.DataFrame],
         custom_stop: Optional[float] = None,
         custom_take_profit: Optional[float] = None,
     ) -> RiskDecision:
         """
         Decide si permitir una entrada y con qué tamaño/stop/tp.
         - price: precio de ejecución estimado (se ajusta por slippage)
-        - bars: debe incluir listas para 'close','high','low','volume'
+        - bars: listas o arrays para 'close','high','low','volume', o el DataFrame
+          de velas (se lee sin copiar). Opcionalmente 'atr' y 'liq' ya calculados
+          (p. ej. BarRiskState.as_bars()), que evitan recalcularlos.
         """
         guard = self._basic_guards(symbol)
         if guard:
             return RiskDecision(False, reason=guard)
 
-        closes = bars.get("close", [])
-        highs = bars.get("high", [])
-        lows = bars.get("low", [])
-        vols = bars.get("volume", [])
-
-        atr = self._atr(highs, lows, closes, self.cfg.atr_window) if self.cfg.use_atr_based_stop else None
-        liq = self._estimate_liquidity_dollar(closes, vols, self.cfg.liq_window)
+        bars = self._bar_arrays(bars)
+        atr = self._bars_atr(bars) if self.cfg.use_atr_based_stop else None
+        if "liq" in bars:
+            liq = bars["liq"]
+        else:
+            liq = self._estimate_liquidity_dollar(bars.get("close", []), bars.get("volume", []), self.cfg.liq_window)
         if liq is not None and liq < self.cfg.min_liquidity_dollar:
             return RiskDecision(False, reason=f"Liquidez insuficiente (${liq:,.0f} < {self.cfg.min_liquidity_dollar:,.0f})")
 
@@ -291,13 +418,11 @@ class RiskManager:
         return RiskDecision(True, qty=qty, entry=est_entry, stop=stop, take_profit=tp, reason="OK", meta=meta)
 
     # ---------- Gestión durante la posición ----------
-    def update_trailing_stop(self, side: Side, current_price: float, stop: float, bars: Dict[str, List[float]]) -> float:
+    def update_trailing_stop(self, side: Side, current_price: float, stop: float,
+                             bars: Union[Dict[str, Any], pd.DataFrame]) -> float:
         if self.cfg.trailing_atr_multiple is None:
             return stop
-        highs = bars.get("high", [])
-        lows = bars.get("low", [])
-        closes = bars.get("close", [])
-        atr = self._atr(highs, lows, closes, self.cfg.atr_window)
+        atr = self._bars_atr(self._bar_arrays(bars))
         if atr is None:
             return stop
         if side == Side.LONG:
@@ -308,6 +433,9 @@ class RiskManager:
 
     # ---------- Registro de resultados ----------
     def record_close(self, symbol: str, side: Side, qty: int, entry: float, stop: float, take_profit: Optional[float], pnl: float):
+        """Registra el cierre total de la posición (racha de pérdidas) y la saca del libro de riesgo."""
+        self._ensure_book()
+        self._book_remove(symbol)
         self.trades.append(TradeRecord(symbol, side, qty, entry, stop, take_profit, pnl))
         if pnl < 0:
             self.consecutive_losses += 1
@@ -325,6 +453,81 @@ class RiskManager:
         return False, "OK"
 
 
+class BarRiskState:
+    """
+    ATR y volumen $ medio de un símbolo mantenidos vela a vela en O(1)
+    (RollingMean / EWM de indicators), para no recorrer la ventana en cada
+    assess_entry / update_trailing_stop.
+    - update(h, l, c, v): vela nueva; revise(...): la última vela cambió.
+    - sync(df): pasa solo las velas nuevas de una ventana (la última vista se
+      revisa); si hay un hueco con la ventana, se reconstruye desde df.
+    """
+
+    def __init__(self, atr_window: int = 14, liq_window: int = 20, smoothing: str = "sma"):
+        self.atr_window = int(atr_window)
+        self.liq_window = int(liq_window)
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self) -> None:
+        if self.smoothing == "wilder":
+            self._tr = EWM(1.0 / self.atr_window, min_periods=self.atr_window)
+        else:
+            self._tr = RollingMean(self.atr_window)
+        self._dollar = RollingMean(self.liq_window)
+        self._prev_close: Optional[float] = None   # close de la vela anterior a la última
+        self._last_close: Optional[float] = None
+        self._last_ts = None
+        self.atr: Optional[float] = None
+        self.liq: Optional[float] = None
+
+    def _step(self, high: float, low: float, close: float, volume: Optional[float], revise: bool) -> None:
+        if not revise:
+            self._prev_close = self._last_close
+        self._last_close = close
+        pc = self._prev_close
+        step = "revise" if revise else "update"
+        if pc is not None:
+            tr = max(high - low, abs(high - pc), abs(low - pc))
+            self.atr = getattr(self._tr, step)(tr)
+        if volume is not None:  # sin volumen no hay estimación de liquidez (como sin 'volume' en bars)
+            self.liq = getattr(self._dollar, step)(close * volume)
+
+    def update(self, high: float, low: float, close: float, volume: Optional[float]) -> None:
+        self._step(float(high), float(low), float(close), None if volume is None else float(volume), revise=False)
+
+    def revise(self, high: float, low: float, close: float, volume: Optional[float]) -> None:
+        self._step(float(high), float(low), float(close), None if volume is None else float(volume),
+                   revise=self._last_close is not None)
+
+    def sync(self, df: pd.DataFrame) -> "BarRiskState":
+        if df.empty:
+            return self
+        index = df.index
+        start = 0
+        if self._last_ts is not None:
+            start = int(index.searchsorted(self._last_ts, side="left"))
+            if start >= len(index) or index[0] > self._last_ts:
+                self.reset()  # hueco: la ventana ya no contiene la última vela vista
+                start = 0
+        h = df["high"].to_numpy(dtype=float, copy=False)
+        l = df["low"].to_numpy(dtype=float, copy=False)
+        c = df["close"].to_numpy(dtype=float, copy=False)
+        v = df["volume"].to_numpy(dtype=float, copy=False) if "volume" in df.columns else None
+        for i in range(start, len(index)):
+            vol = None if v is None else v[i]
+            if self._last_ts is not None and index[i] == self._last_ts:
+                self.revise(h[i], l[i], c[i], vol)
+            else:
+                self.update(h[i], l[i], c[i], vol)
+            self._last_ts = index[i]
+        return self
+
+    def as_bars(self) -> Dict[str, Any]:
+        """Entrada para assess_entry / update_trailing_stop con ATR y liquidez ya calculados."""
+        return {"atr": self.atr, "liq": self.liq}
+
+
 # ------------------ Ejemplo opcional de Adapter mínimo ------------------
 class SimpleAdapter:
     def __init__(self):
@@ -2,14 +2,30 @@
 # (RiskManager Avanzado + --ignore-clock + Ensemble + Protecciones de ganancias)
 
 import sys
+import copy
+import logging
 import time
+import threading
+import contextlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple, Any
 
-from .logger import logger
+import pandas as pd
+
+from .logger import log_event, logger, overhead as log_overhead, set_console, tick_summary
 from .broker_alpaca import BrokerAlpaca
+from .bar_cache import BarCache
+from .snapshot import AccountSnapshot
+from .stream import BarStream
+from .resample import ResampleBook
+from .ring_buffer import RingBook
+from .telemetry import METRICS, reason_label, start_http_server
+from .scheduler import BarCloseScheduler, SymbolScheduler, timeframe_seconds, OK, NOT_TRADABLE, NO_BARS, WARMUP, HALTED, ERROR
+from .config import settings
 from .data import bars_to_df
+from .indicators import STORE as INDICATORS, sma
 from .strategy import MACrossover, RSIStrategy, MACDStrategy, BollingerStrategy
 
 # === Risk Manager avanzado ===
@@ -40,8 +56,33 @@ def iso_utc_hours_back(hours: int) -> str:
     )
 
 
-def build_strategy(args) -> object:
-    st = args.strategy.lower()
+def multi_start_iso(start_iso: str, timeframe: str, limit: int, last_seen: Optional[List[Optional[int]]] = None,
+                    now: Optional[pd.Timestamp] = None) -> str:
+    """
+    Inicio de la petición multi sin --bar-cache-dir (sin él se descargaría
+    toda la ventana --hours-back del universo en cada tick):
+    - last_seen (ns de la última vela en cada BarRing): si todos tienen
+      ventana, desde la más antigua; el ring solo añade las nuevas.
+    - sin ring: las últimas `limit` velas del timeframe (limit × timeframe).
+    Nunca antes de start_iso; la primera carga de un ring usa start_iso entero.
+    """
+    lo = pd.Timestamp(start_iso)
+    if last_seen is not None:
+        if not last_seen or any(t is None for t in last_seen):
+            return start_iso
+        start = pd.Timestamp(min(last_seen), tz="UTC")
+    else:
+        now = now if now is not None else pd.Timestamp.now(tz="UTC")
+        start = now - pd.Timedelta(seconds=int(limit) * timeframe_seconds(timeframe))
+    return max(lo, start).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+STRATEGY_NAMES = ("ma", "rsi", "macd", "bbands")
+
+
+def build_strategy(args, name: Optional[str] = None) -> object:
+    """Estrategia `name` (por defecto --strategy) con los parámetros del CLI."""
+    st = (name or args.strategy).lower()
     if st == "ma":
         return MACrossover(fast=args.fast, slow=args.slow)
     if st == "rsi":
@@ -50,7 +91,20 @@ def build_strategy(args) -> object:
         return MACDStrategy(fast=args.macd_fast, slow=args.macd_slow, signal=args.macd_signal)
     if st == "bbands":
         return BollingerStrategy(window=args.bb_window, k=args.bb_k)
-    raise ValueError(f"Estrategia desconocida: {args.strategy}")
+    raise ValueError(f"Estrategia desconocida: {st}")
+
+
+def warmup_bars(strat: object) -> int:
+    """Velas mínimas antes de evaluar la estrategia base."""
+    if isinstance(strat, MACrossover):
+        return max(strat.fast, strat.slow)
+    if isinstance(strat, RSIStrategy):
+        return strat.period + 1
+    if isinstance(strat, MACDStrategy):
+        return max(strat.slow, strat.signal_p) + 1
+    if isinstance(strat, BollingerStrategy):
+        return strat.window + 1
+    return 0
 
 
 def parse_weights(s: str) -> Dict[str, float]:
@@ -92,12 +146,51 @@ def parse_scale_out(s: str) -> List[Tuple[float, float]]:
     return levels
 
 
+def parse_timeframes(spec: str, default_tf: str, symbols: List[str]) -> Dict[str, List[str]]:
+    """
+    '1Min,5Min,15Min'           -> cada timeframe con todos los símbolos
+    '1Min,15Min:SPY+QQQ'        -> 15Min solo para SPY y QQQ
+    Vacío -> {default_tf: symbols}. Los timeframes se ordenan de menor a mayor.
+    """
+    jobs: Dict[str, List[str]] = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        tf, _, syms = part.partition(":")
+        tf = tf.strip()
+        timeframe_seconds(tf)  # valida el formato
+        chosen = [x.strip().upper() for x in syms.split("+") if x.strip()] if syms else list(symbols)
+        jobs[tf] = chosen
+    if not jobs:
+        jobs = {default_tf: list(symbols)}
+    return dict(sorted(jobs.items(), key=lambda kv: timeframe_seconds(kv[0])))
+
+
+def parse_tf_strategies(spec: str, timeframes: List[str]) -> Dict[str, str]:
+    """'15Min=macd,5Min=rsi' -> {timeframe: estrategia}; los que no aparecen usan --strategy."""
+    out: Dict[str, str] = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        tf, _, name = part.partition("=")
+        tf, name = tf.strip(), name.strip().lower()
+        if tf not in timeframes:
+            raise ValueError(f"--tf-strategies: {tf!r} no está en los timeframes activos {timeframes}")
+        if name not in STRATEGY_NAMES:
+            raise ValueError(f"--tf-strategies: estrategia desconocida {name!r} ({', '.join(STRATEGY_NAMES)})")
+        out[tf] = name
+    return out
+
+
 # ---------------- Adapter para el RiskManager ----------------
 class AlpacaRiskAdapter:
     """
     Envuelve BrokerAlpaca para exponer la API mínima que exige RiskManager:
       - get_equity()
       - get_open_positions()  -> usamos un position_book local para tener stop/tp
+                                 (solo para cargar el libro de riesgo; luego se
+                                 actualiza con open_position/update_position/record_close)
       - get_open_orders()     -> no usado aquí
       - round_qty(qty, lot_size)
     """
@@ -131,91 +224,244 @@ class AlpacaRiskAdapter:
         return max(lot_size, int(qty // lot_size * lot_size))
 
 
+# ---------------- Señales incrementales por símbolo ----------------
+class StreamingSignals:
+    """
+    Modo --signal-mode incremental: mantiene por símbolo una copia con estado de
+    la estrategia base y de las del ensemble, y solo les pasa las velas nuevas
+    (update(bar), O(1) por vela). La última vela del df anterior se vuelve a
+    pasar para recoger correcciones de la vela en formación.
+    Nota: el estado arranca en el primer tick, así que las EMAs usan todo el
+    histórico visto desde entonces y no solo la ventana --lookback.
+    """
+    def __init__(self, strat: object, wrappers: Optional[List[StrategyWrapper]]):
+        self.strat = strat
+        self.wrappers = wrappers or []
+        self._by_symbol: Dict[str, dict] = {}
+        self._lock = threading.Lock()  # alta de símbolos desde varios hilos
+
+    def _state(self, symbol: str) -> dict:
+        with self._lock:
+            st = self._by_symbol.get(symbol)
+            if st is None:
+                st = {
+                    "strat": copy.deepcopy(self.strat),
+                    "wrappers": {w.name: copy.deepcopy(w.strategy) for w in self.wrappers},
+                    "last_ts": None,
+                    "sig": None,
+                    "signals": {},
+                }
+                for s in [st["strat"], *st["wrappers"].values()]:
+                    s.reset()
+                self._by_symbol[symbol] = st
+            return st
+
+    def feed(self, symbol: str, df) -> Tuple[Optional[str], Dict[str, Optional[str]]]:
+        """Procesa las velas nuevas de df y devuelve (señal_base, señales_por_wrapper)."""
+        st = self._state(symbol)
+        new = df if st["last_ts"] is None else df.loc[df.index >= st["last_ts"]]
+        for ts, row in new.iterrows():
+            st["sig"] = st["strat"].update(row)
+            for name, s in st["wrappers"].items():
+                st["signals"][name] = s.update(row)
+            st["last_ts"] = ts
+        return st["sig"], dict(st["signals"])
+
+
 # ---------------- Lógica principal de trading ----------------
-def trade_one_symbol(
+def risk_bars(df: pd.DataFrame, risk: AdvancedRiskManager) -> Dict[str, Any]:
+    """
+    ATR y liquidez para el RiskManager desde su estado incremental por
+    símbolo@timeframe: solo se procesan las velas nuevas de df (O(1) por vela),
+    sin convertir columnas a listas.
+    """
+    key = f"{df.attrs.get('symbol')}@{df.attrs.get('timeframe')}"
+    return risk.bar_state(key).sync(df).as_bars()
+
+
+def open_book_position(position_book: Dict[str, dict], risk: AdvancedRiskManager, symbol: str,
+                       side: Side, decision: RiskDecision, price: float, timeframe: Optional[str] = None) -> None:
+    """Alta en position_book (meta para OCO/trailing/protecciones) y en el libro de riesgo.
+    timeframe: el que abre la posición; solo ese la gestiona después."""
+    entry = decision.entry or price
+    risk_ps = abs(entry - (decision.stop or price)) or (0.01 * price)
+    position_book[symbol] = {
+        "side": side, "qty": decision.qty, "entry": entry,
+        "stop": decision.stop, "take": decision.take_profit,
+        "risk_ps": risk_ps, "be_done": False, "scaled": set(),
+        "peak_px": entry, "peak_pnl": 0.0, "tf": timeframe,
+    }
+    risk.open_position(symbol, side, decision.qty, entry, decision.stop)
+
+
+def assess_entry(risk: AdvancedRiskManager, symbol: str, side: Side, price: float,
+                 bars_dict: Dict[str, Any]) -> RiskDecision:
+    """risk.assess_entry cronometrado (etapa "risk"); los rechazos se cuentan por motivo."""
+    with METRICS.timer("bot_stage_seconds", stage="risk"):
+        decision = risk.assess_entry(symbol, side, price, bars_dict)
+    if not (decision.allow and decision.qty > 0):
+        METRICS.inc("bot_risk_rejections_total", reason=reason_label(decision.reason))
+    return decision
+
+
+def place_market(broker: BrokerAlpaca, symbol: str, side: str, qty: int) -> dict:
+    """broker.place_order_market cronometrado (etapa "order") y contado por lado."""
+    with METRICS.timer("bot_stage_seconds", stage="order"):
+        order = broker.place_order_market(symbol, side, qty)
+    METRICS.inc("bot_orders_total", side=side)
+    return order
+
+
+class TickStats:
+    """Contadores de un tick del loop para la línea de resumen (lo único que se ve con --quiet)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts: Dict[str, int] = {}
+            self.t0 = time.perf_counter()
+            self.log0 = log_overhead()
+
+    def add(self, status: str) -> None:
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def emit(self, label: str) -> None:
+        """Resumen desde el último reset: estados, duración y coste del logging en el hilo del tick."""
+        elapsed = time.perf_counter() - self.t0
+        log = log_overhead()
+        log_s = log["seconds"] - self.log0["seconds"]
+        n_log = int(log["records"] - self.log0["records"])
+        with self._lock:
+            counts = dict(self.counts)
+        share = log_s / elapsed if elapsed > 0 else 0.0
+        parts = " ".join(f"{k}={v}" for k, v in sorted(counts.items())) or "-"
+        tick_summary(f"📊 {label}: {sum(counts.values())} símbolos ({parts}) | {elapsed * 1000:.0f} ms | "
+                     f"log {n_log} reg. {log_s * 1000:.1f} ms ({share:.2%}) | indicadores {INDICATORS.hit_rate:.0%}",
+                     statuses=counts, tick_ms=round(elapsed * 1000, 3), log_records=n_log,
+                     log_ms=round(log_s * 1000, 3), log_share=share)
+        self.reset()
+
+
+def prepare_symbol(
     broker: BrokerAlpaca,
-    risk: AdvancedRiskManager,
     strat: object,
     symbol: str,
     timeframe: str,
     lookback: int,
     start_iso: str,
     args,
-    position_book: Dict[str, dict],
     ensemble: Optional[Ensemble],
     wrappers: Optional[List[StrategyWrapper]],
-    scale_out_levels: List[Tuple[float, float]],
-    session: Dict[str, Any],
-) -> None:
+    streaming: Optional[StreamingSignals] = None,
+    df: Optional[pd.DataFrame] = None,
+    rings: Optional[RingBook] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Fase sin estado compartido (se puede correr en paralelo entre símbolos):
+    tradable, barras, warm-up, MAs y señal. Devuelve (estado, contexto):
+    (OK, ctx) para execute_symbol, o (NOT_TRADABLE | NO_BARS | WARMUP, None)
+    si se omite el tick (el SymbolScheduler decide cuándo reintentar).
+    df: barras ya descargadas (get_bars_multi); si es None se piden aquí.
+    rings: ventanas preasignadas por símbolo (--bar-window ring); las barras
+    pedidas aquí se añaden a su BarRing en lugar de construir un DataFrame nuevo.
+    """
     # Verificamos si es operable
     if not broker.get_asset_tradable(symbol):
-        msg = f"{symbol} no es 'tradable'. Omito este tick."
-        logger.warning(msg)
-        print(f"⚠️  {msg}")
-        time.sleep(1)
-        return
-
-    print(f"⏳ Tick [{symbol}]: pidiendo barras…")
-    bars = broker.get_bars(symbol, timeframe=timeframe, limit=lookback, start_iso=start_iso)
-    df = bars_to_df(bars)
+        log_event(f"⚠️  {symbol} no es 'tradable'. Omito este tick.", symbol=symbol, stage="data", level=logging.WARNING)
+        return NOT_TRADABLE, None
+
+    if df is None:
+        log_event(f"⏳ Tick [{symbol}]: pidiendo barras…", symbol=symbol, stage="data")
+        with METRICS.timer("bot_stage_seconds", stage="bars"):
+            bars = broker.get_bars(symbol, timeframe=timeframe, limit=lookback, start_iso=start_iso)
+            df = rings.update_bars(symbol, timeframe, bars, start_iso) if rings is not None and bars else bars_to_df(bars)
     if df.empty:
-        logger.warning(f"[{symbol}] Sin barras.")
-        print(f"⚠️  [{symbol}] Sin barras.")
-        time.sleep(1)
-        return
+        log_event(f"⚠️  [{symbol}] Sin barras.", symbol=symbol, stage="data", level=logging.WARNING)
+        return NO_BARS, None
+
+    # Clave del IndicatorStore: estrategias, ensemble y RiskManager comparten las series del tick
+    df.attrs["symbol"], df.attrs["timeframe"] = symbol, timeframe
 
-    # Warm-up mínimo según estrategia base
-    min_needed = 0
-    if args.strategy == "ma":
-        min_needed = max(args.fast, args.slow)
-    elif args.strategy == "rsi":
-        min_needed = args.rsi_period + 1
-    elif args.strategy == "macd":
-        min_needed = max(args.macd_slow, args.macd_signal) + 1
-    elif args.strategy == "bbands":
-        min_needed = args.bb_window + 1
+    # Warm-up mínimo según estrategia base (puede ser distinta por timeframe)
+    min_needed = warmup_bars(strat)
 
     if len(df) < min_needed:
-        msg = f"[{symbol}] Warm-up {len(df)}/{min_needed} velas."
-        logger.info(msg)
-        print(f"⏳ {msg}")
-        time.sleep(1)
-        return
+        log_event(f"⏳ [{symbol}] Warm-up {len(df)}/{min_needed} velas.", symbol=symbol, stage="data",
+                  rows=len(df), needed=min_needed)
+        return WARMUP, None
 
+    t_sig = time.perf_counter()
     last = df.iloc[-1]
     price = float(last["close"])
 
     # MAs opcionales para flags por estado
     ma_fast = ma_slow = None
-    if args.strategy == "ma" or args.enter_when_above or args.exit_when_below or args.enter_short_when_below or args.exit_short_when_above:
-        ma_fast = df["close"].rolling(args.fast).mean().iloc[-1]
-        ma_slow = df["close"].rolling(args.slow).mean().iloc[-1]
+    if isinstance(strat, MACrossover) or args.enter_when_above or args.exit_when_below or args.enter_short_when_below or args.exit_short_when_above:
+        ma_fast = sma(df, args.fast).iloc[-1]
+        ma_slow = sma(df, args.slow).iloc[-1]
 
-    # Señal (ensemble o single)
+    # Señal (ensemble o single); en modo incremental solo se procesan velas nuevas
+    base_sig, stream_sigs = streaming.feed(symbol, df) if streaming is not None else (None, None)
     if ensemble is None:
-        sig = strat.signal(df)
-        print(f"🧭 [{symbol}] Señal: {sig or 'HOLD'}")
+        sig = base_sig if streaming is not None else strat.signal(df)
+        METRICS.observe("bot_stage_seconds", time.perf_counter() - t_sig, stage="signal")
+        log_event(f"🧭 [{symbol}] Señal: {sig or 'HOLD'}", symbol=symbol, stage="signal", signal=sig or "HOLD")
     else:
-        sig, meta_sig = ensemble.decide(df, wrappers)  # type: ignore[arg-type]
+        sig, meta_sig = ensemble.decide(df, wrappers, signals=stream_sigs)  # type: ignore[arg-type]
+        METRICS.observe("bot_stage_seconds", time.perf_counter() - t_sig, stage="signal")
         votes = meta_sig["votes"]; sc = meta_sig["score"]
-        print(f"🧭 [{symbol}] Ensemble: {sig} | votes={votes} score={sc:.2f} | {meta_sig.get('reason','')}")
+        log_event(f"🧭 [{symbol}] Ensemble: {sig} | votes={votes} score={sc:.2f} | {meta_sig.get('reason','')}",
+                  symbol=symbol, stage="signal", signal=sig, score=sc)
 
-    print(f"📈 [{symbol}] Última {timeframe}: close={price:.2f}  (rows={len(df)})")
+    log_event(f"📈 [{symbol}] Última {timeframe}: close={price:.2f}  (rows={len(df)})", symbol=symbol, stage="signal",
+              price=price, rows=len(df))
     if args.debug_ma and ma_fast is not None and ma_slow is not None:
-        print(f"🧮 [{symbol}] MA_fast({args.fast})={ma_fast:.4f} | MA_slow({args.slow})={ma_slow:.4f}")
+        log_event(f"🧮 [{symbol}] MA_fast({args.fast})={ma_fast:.4f} | MA_slow({args.slow})={ma_slow:.4f}",
+                  symbol=symbol, stage="signal")
+
+    METRICS.inc("bot_signals_total", signal=sig or "HOLD")
+    return OK, {"df": df, "price": price, "ma_fast": ma_fast, "ma_slow": ma_slow, "sig": sig, "timeframe": timeframe}
+
+
+def execute_symbol(
+    broker: BrokerAlpaca,
+    risk: AdvancedRiskManager,
+    symbol: str,
+    args,
+    position_book: Dict[str, dict],
+    scale_out_levels: List[Tuple[float, float]],
+    session: Dict[str, Any],
+    ctx: Dict[str, Any],
+) -> Optional[str]:
+    """
+    Fase de decisión/ejecución: lee y modifica position_book, session y el RiskManager.
+    Devuelve HALTED si los circuit breakers del RiskManager pausan el trading.
+    """
+    df, price, sig = ctx["df"], ctx["price"], ctx["sig"]
+    timeframe = ctx.get("timeframe")
+    ma_fast, ma_slow = ctx["ma_fast"], ctx["ma_slow"]
 
     # Circuit breakers (pérdida diaria / racha / calor de portafolio)
     halt, why = risk.should_halt_trading()
     if halt:
-        logger.warning(f"[{symbol}] Trading pausado: {why}")
-        print(f"🚨 [{symbol}] Trading pausado: {why}")
-        time.sleep(1)
-        return
+        log_event(f"🚨 [{symbol}] Trading pausado: {why}", symbol=symbol, stage="risk", level=logging.WARNING)
+        return HALTED
 
     # Estado de posición local
     pos_qty = broker.get_position_qty(symbol)  # positivo=long, negativo=short, 0=flat
     has_pos = symbol in position_book
 
+    # Con varios timeframes, la posición (trailing, protecciones y salidas) la gestiona solo el que la abrió
+    owner = position_book[symbol].get("tf") if has_pos else None
+    if owner is not None and timeframe is not None and owner != timeframe:
+        log_event(f"[{symbol}] {timeframe}: posición abierta desde {owner}; la gestiona ese timeframe.",
+                  symbol=symbol, stage="manage", console=False, owner=owner)
+        return None
+
     # ---------- Gestión de posiciones abiertas: trailing + protecciones ----------
     if has_pos:
         meta = position_book[symbol]
@@ -226,16 +472,12 @@ def trade_one_symbol(
         qty: int = meta.get("qty", abs(pos_qty) if pos_qty != 0 else 0) or meta.get("qty", 0)
 
         # Trailing ATR (según RM)
-        bars_dict = {
-            "close": df["close"].tolist(),
-            "high": df["high"].tolist(),
-            "low": df["low"].tolist(),
-            "volume": df["volume"].tolist() if "volume" in df.columns else [1_000_000] * len(df),
-        }
+        bars_dict = risk_bars(df, risk)
         new_stop = risk.update_trailing_stop(side, price, stop or price, bars_dict)
         if stop is None or (side == Side.LONG and new_stop > stop) or (side == Side.SHORT and new_stop < stop):
             meta["stop"] = new_stop
-            print(f"🔧 [{symbol}] Trailing stop -> {new_stop:.2f}")
+            risk.update_position(symbol, stop=new_stop)
+            log_event(f"🔧 [{symbol}] Trailing stop -> {new_stop:.2f}", symbol=symbol, stage="manage", stop=new_stop)
 
         # ---------- Protección de ganancias ----------
         risk_ps = meta.get("risk_ps", max(0.01, 0.01 * price))  # riesgo por acción
@@ -261,7 +503,8 @@ def trade_one_symbol(
         if (not meta.get("be_done")) and (R_now >= args.be_at_r):
             meta["stop"] = entry_px
             meta["be_done"] = True
-            print(f"🏁 [{symbol}] Break-even activado @ {entry_px:.2f} (R={R_now:.2f})")
+            risk.update_position(symbol, stop=entry_px)
+            log_event(f"🏁 [{symbol}] Break-even activado @ {entry_px:.2f} (R={R_now:.2f})", symbol=symbol, stage="manage")
 
         # 4.2 Tomas parciales por niveles R (scale-out)
         for R_level, pct in scale_out_levels:
@@ -269,12 +512,14 @@ def trade_one_symbol(
             if R_now >= R_level and key not in meta.get("scaled", set()) and qty > 1:
                 close_qty = max(1, int(qty * pct))
                 if side == Side.LONG:
-                    broker.place_order_market(symbol, "sell", close_qty)
+                    place_market(broker, symbol, "sell", close_qty)
                 else:
-                    broker.place_order_market(symbol, "buy", close_qty)
+                    place_market(broker, symbol, "buy", close_qty)
                 meta.setdefault("scaled", set()).add(key)
                 meta["qty"] = qty - close_qty
-                print(f"✂️  [{symbol}] Scale-out {pct*100:.0f}% @ R={R_level:.1f} → qty={meta['qty']}")
+                risk.update_position(symbol, qty=meta["qty"])
+                log_event(f"✂️  [{symbol}] Scale-out {pct*100:.0f}% @ R={R_level:.1f} → qty={meta['qty']}",
+                          symbol=symbol, stage="manage", qty=meta["qty"])
                 qty = meta["qty"]
                 if qty <= 0:
                     break
@@ -284,18 +529,19 @@ def trade_one_symbol(
             limit = meta["peak_pnl"] * (1.0 - args.max_giveback_pct)
             if open_pnl <= limit:
                 if side == Side.LONG:
-                    order = broker.place_order_market(symbol, "sell", qty)
+                    order = place_market(broker, symbol, "sell", qty)
                 else:
-                    order = broker.place_order_market(symbol, "buy", qty)
+                    order = place_market(broker, symbol, "buy", qty)
                 pnl = open_pnl
                 risk.record_close(symbol, side, qty, entry_px, meta.get("stop", 0.0), take, pnl)
                 position_book.pop(symbol, None)
-                print(f"🛡️  [{symbol}] Cierre por giveback (devuelto ≥ {args.max_giveback_pct:.0%}) | pnl={pnl:.2f} | id={order.get('id','sin_id')}")
+                log_event(f"🛡️  [{symbol}] Cierre por giveback (devuelto ≥ {args.max_giveback_pct:.0%}) | pnl={pnl:.2f} | id={order.get('id','sin_id')}",
+                          symbol=symbol, stage="exit", pnl=pnl)
                 # objetivo diario
                 session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
                 if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
                     session["halted"] = True
-                    print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+                    log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
                 return
 
         # Chequear OCO (stop/take) o señal de salida explícita
@@ -308,196 +554,244 @@ def trade_one_symbol(
             if close_qty <= 0:
                 close_qty = meta.get("qty", 0)
             if side == Side.LONG:
-                order = broker.place_order_market(symbol, "sell", close_qty)
+                order = place_market(broker, symbol, "sell", close_qty)
             else:
-                order = broker.place_order_market(symbol, "buy", close_qty)
+                order = place_market(broker, symbol, "buy", close_qty)
             pnl = (price - entry_px) * close_qty if side == Side.LONG else (entry_px - price) * close_qty
             risk.record_close(symbol, side, close_qty, entry_px, meta.get("stop", 0.0), take, pnl)
             position_book.pop(symbol, None)
-            print(f"✅ [{symbol}] Cierre -> qty={close_qty} pnl={pnl:.2f} | id={order.get('id','sin_id')}")
+            log_event(f"✅ [{symbol}] Cierre -> qty={close_qty} pnl={pnl:.2f} | id={order.get('id','sin_id')}",
+                      symbol=symbol, stage="exit", qty=close_qty, pnl=pnl)
             # objetivo diario
             session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
             if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
                 session["halted"] = True
-                print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+                log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
             return
 
     # ---------- Flags por estado (MA) ----------
     if args.enter_when_above and pos_qty == 0 and ma_fast is not None and ma_slow is not None and ma_fast > ma_slow:
         side = Side.LONG
-        bars_dict = {
-            "close": df["close"].tolist(),
-            "high": df["high"].tolist(),
-            "low": df["low"].tolist(),
-            "volume": df["volume"].tolist() if "volume" in df.columns else [1_000_000] * len(df),
-        }
-        decision: RiskDecision = risk.assess_entry(symbol, side, price, bars_dict)
+        bars_dict = risk_bars(df, risk)
+        decision: RiskDecision = assess_entry(risk, symbol, side, price, bars_dict)
         if decision.allow and decision.qty > 0:
             broker.cancel_open_orders(symbol)
-            order = broker.place_order_market(symbol, "buy", decision.qty)
-            risk_ps = abs((decision.entry or price) - (decision.stop or price)) or (0.01 * price)
-            position_book[symbol] = {
-                "side": side, "qty": decision.qty, "entry": decision.entry or price,
-                "stop": decision.stop, "take": decision.take_profit,
-                "risk_ps": risk_ps, "be_done": False, "scaled": set(),
-                "peak_px": decision.entry or price, "peak_pnl": 0.0
-            }
-            print(f"✅ (state) BUY [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}")
+            order = place_market(broker, symbol, "buy", decision.qty)
+            open_book_position(position_book, risk, symbol, side, decision, price, timeframe)
+            log_event(f"✅ (state) BUY [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}",
+                      symbol=symbol, stage="entry", qty=decision.qty)
         else:
-            print(f"⛔ [{symbol}] (state) BUY rechazado: {decision.reason}")
+            log_event(f"⛔ [{symbol}] (state) BUY rechazado: {decision.reason}", symbol=symbol, stage="entry")
         return
 
     if args.exit_when_below and pos_qty > 0 and ma_fast is not None and ma_slow is not None and ma_fast < ma_slow:
         qty = pos_qty
         broker.cancel_open_orders(symbol)
-        order = broker.place_order_market(symbol, "sell", qty)
+        order = place_market(broker, symbol, "sell", qty)
         meta = position_book.pop(symbol, {"side": Side.LONG, "qty": qty, "entry": price})
         pnl = (price - meta.get("entry", price)) * qty
         risk.record_close(symbol, Side.LONG, qty, meta.get("entry", price), meta.get("stop", 0.0), meta.get("take"), pnl)
-        print(f"✅ (state) SELL [{symbol}] x{qty} -> id={order.get('id','sin_id')}")
+        log_event(f"✅ (state) SELL [{symbol}] x{qty} -> id={order.get('id','sin_id')}", symbol=symbol, stage="exit", qty=qty, pnl=pnl)
         session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
         if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
             session["halted"] = True
-            print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+            log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
         return
 
     if args.allow_shorts and args.enter_short_when_below and pos_qty == 0 and ma_fast is not None and ma_slow is not None and ma_fast < ma_slow:
         if not broker.get_asset_shortable(symbol):
-            print(f"🚫 [{symbol}] No shortable. Omito apertura de corto.")
+            log_event(f"🚫 [{symbol}] No shortable. Omito apertura de corto.", symbol=symbol, stage="entry")
         else:
             side = Side.SHORT
-            bars_dict = {
-                "close": df["close"].tolist(),
-                "high": df["high"].tolist(),
-                "low": df["low"].tolist(),
-                "volume": df["volume"].tolist() if "volume" in df.columns else [1_000_000] * len(df),
-            }
-            decision: RiskDecision = risk.assess_entry(symbol, side, price, bars_dict)
+            bars_dict = risk_bars(df, risk)
+            decision: RiskDecision = assess_entry(risk, symbol, side, price, bars_dict)
             if decision.allow and decision.qty > 0:
                 broker.cancel_open_orders(symbol)
-                order = broker.place_order_market(symbol, "sell", decision.qty)
-                risk_ps = abs((decision.entry or price) - (decision.stop or price)) or (0.01 * price)
-                position_book[symbol] = {
-                    "side": side, "qty": decision.qty, "entry": decision.entry or price,
-                    "stop": decision.stop, "take": decision.take_profit,
-                    "risk_ps": risk_ps, "be_done": False, "scaled": set(),
-                    "peak_px": decision.entry or price, "peak_pnl": 0.0
-                }
-                print(f"✅ (state) SHORT [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}")
+                order = place_market(broker, symbol, "sell", decision.qty)
+                open_book_position(position_book, risk, symbol, side, decision, price, timeframe)
+                log_event(f"✅ (state) SHORT [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}",
+                          symbol=symbol, stage="entry", qty=decision.qty)
             else:
-                print(f"⛔ [{symbol}] (state) SHORT rechazado: {decision.reason}")
+                log_event(f"⛔ [{symbol}] (state) SHORT rechazado: {decision.reason}", symbol=symbol, stage="entry")
         return
 
     if args.allow_shorts and args.exit_short_when_above and pos_qty < 0 and ma_fast is not None and ma_slow is not None and ma_fast > ma_slow:
         qty = abs(pos_qty)
         broker.cancel_open_orders(symbol)
-        order = broker.place_order_market(symbol, "buy", qty)
+        order = place_market(broker, symbol, "buy", qty)
         meta = position_book.pop(symbol, {"side": Side.SHORT, "qty": qty, "entry": price})
         pnl = (meta.get("entry", price) - price) * qty
         risk.record_close(symbol, Side.SHORT, qty, meta.get("entry", price), meta.get("stop", 0.0), meta.get("take"), pnl)
-        print(f"✅ (state) COVER [{symbol}] x{qty} -> id={order.get('id','sin_id')}")
+        log_event(f"✅ (state) COVER [{symbol}] x{qty} -> id={order.get('id','sin_id')}", symbol=symbol, stage="exit", qty=qty, pnl=pnl)
         session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
         if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
             session["halted"] = True
-            print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+            log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
         return
 
     # ---------- Ejecución por señal clásica (ensemble/single) usando RiskManager ----------
     if sig == "BUY":
         if pos_qty >= 0:
             if pos_qty > 0:
-                msg = f"[{symbol}] Ya estás largo ({pos_qty})."
-                logger.info(msg)
-                print(f"ℹ️  {msg}")
+                log_event(f"ℹ️  [{symbol}] Ya estás largo ({pos_qty}).", symbol=symbol, stage="entry")
             else:
                 side = Side.LONG
-                bars_dict = {
-                    "close": df["close"].tolist(),
-                    "high": df["high"].tolist(),
-                    "low": df["low"].tolist(),
-                    "volume": df["volume"].tolist() if "volume" in df.columns else [1_000_000] * len(df),
-                }
-                decision: RiskDecision = risk.assess_entry(symbol, side, price, bars_dict)
+                bars_dict = risk_bars(df, risk)
+                decision: RiskDecision = assess_entry(risk, symbol, side, price, bars_dict)
                 if decision.allow and decision.qty > 0:
                     broker.cancel_open_orders(symbol)
-                    order = broker.place_order_market(symbol, "buy", decision.qty)
-                    risk_ps = abs((decision.entry or price) - (decision.stop or price)) or (0.01 * price)
-                    position_book[symbol] = {
-                        "side": side, "qty": decision.qty, "entry": decision.entry or price,
-                        "stop": decision.stop, "take": decision.take_profit,
-                        "risk_ps": risk_ps, "be_done": False, "scaled": set(),
-                        "peak_px": decision.entry or price, "peak_pnl": 0.0
-                    }
-                    print(f"✅ BUY [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}")
+                    order = place_market(broker, symbol, "buy", decision.qty)
+                    open_book_position(position_book, risk, symbol, side, decision, price, timeframe)
+                    log_event(f"✅ BUY [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}",
+                              symbol=symbol, stage="entry", qty=decision.qty)
                 else:
-                    print(f"⛔ [{symbol}] BUY rechazado: {decision.reason}")
+                    log_event(f"⛔ [{symbol}] BUY rechazado: {decision.reason}", symbol=symbol, stage="entry")
         else:
             # BUY para cerrar short existente
             qty = abs(pos_qty)
             broker.cancel_open_orders(symbol)
-            order = broker.place_order_market(symbol, "buy", qty)
+            order = place_market(broker, symbol, "buy", qty)
             meta = position_book.pop(symbol, {"side": Side.SHORT, "qty": qty, "entry": price})
             pnl = (meta.get("entry", price) - price) * qty
             risk.record_close(symbol, Side.SHORT, qty, meta.get("entry", price), meta.get("stop", 0.0), meta.get("take"), pnl)
-            print(f"✅ COVER [{symbol}] x{qty} -> id={order.get('id','sin_id')}")
+            log_event(f"✅ COVER [{symbol}] x{qty} -> id={order.get('id','sin_id')}", symbol=symbol, stage="exit", qty=qty, pnl=pnl)
             session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
             if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
                 session["halted"] = True
-                print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+                log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
 
     elif sig == "SELL":
         if pos_qty <= 0:
             if pos_qty < 0:
-                msg = f"[{symbol}] Ya estás en short ({pos_qty}). No incremento."
-                logger.info(msg)
-                print(f"ℹ️  {msg}")
+                log_event(f"ℹ️  [{symbol}] Ya estás en short ({pos_qty}). No incremento.", symbol=symbol, stage="entry")
             else:
                 if args.allow_shorts:
                     if not broker.get_asset_shortable(symbol):
-                        print(f"🚫 [{symbol}] No shortable. Ignoro apertura de corto.")
+                        log_event(f"🚫 [{symbol}] No shortable. Ignoro apertura de corto.", symbol=symbol, stage="entry")
                     else:
                         side = Side.SHORT
-                        bars_dict = {
-                            "close": df["close"].tolist(),
-                            "high": df["high"].tolist(),
-                            "low": df["low"].tolist(),
-                            "volume": df["volume"].tolist() if "volume" in df.columns else [1_000_000] * len(df),
-                        }
-                        decision: RiskDecision = risk.assess_entry(symbol, side, price, bars_dict)
+                        bars_dict = risk_bars(df, risk)
+                        decision: RiskDecision = assess_entry(risk, symbol, side, price, bars_dict)
                         if decision.allow and decision.qty > 0:
                             broker.cancel_open_orders(symbol)
-                            order = broker.place_order_market(symbol, "sell", decision.qty)
-                            risk_ps = abs((decision.entry or price) - (decision.stop or price)) or (0.01 * price)
-                            position_book[symbol] = {
-                                "side": side, "qty": decision.qty, "entry": decision.entry or price,
-                                "stop": decision.stop, "take": decision.take_profit,
-                                "risk_ps": risk_ps, "be_done": False, "scaled": set(),
-                                "peak_px": decision.entry or price, "peak_pnl": 0.0
-                            }
-                            print(f"✅ SHORT [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}")
+                            order = place_market(broker, symbol, "sell", decision.qty)
+                            open_book_position(position_book, risk, symbol, side, decision, price, timeframe)
+                            log_event(f"✅ SHORT [{symbol}] x{decision.qty} @ {decision.entry:.2f} | SL={decision.stop:.2f} TP={decision.take_profit:.2f} | id={order.get('id','sin_id')}",
+                                      symbol=symbol, stage="entry", qty=decision.qty)
                         else:
-                            print(f"⛔ [{symbol}] SHORT rechazado: {decision.reason}")
+                            log_event(f"⛔ [{symbol}] SHORT rechazado: {decision.reason}", symbol=symbol, stage="entry")
                 else:
-                    msg = f"[{symbol}] Señal SELL pero shorts deshabilitados."
-                    logger.info(msg)
-                    print(f"ℹ️  {msg}")
+                    log_event(f"ℹ️  [{symbol}] Señal SELL pero shorts deshabilitados.", symbol=symbol, stage="entry")
         else:
             # SELL para cerrar largo existente
             qty = pos_qty
             broker.cancel_open_orders(symbol)
-            order = broker.place_order_market(symbol, "sell", qty)
+            order = place_market(broker, symbol, "sell", qty)
             meta = position_book.pop(symbol, {"side": Side.LONG, "qty": qty, "entry": price})
             pnl = (price - meta.get("entry", price)) * qty
             risk.record_close(symbol, Side.LONG, qty, meta.get("entry", price), meta.get("stop", 0.0), meta.get("take"), pnl)
-            print(f"✅ SELL [{symbol}] x{qty} -> id={order.get('id','sin_id')}")
+            log_event(f"✅ SELL [{symbol}] x{qty} -> id={order.get('id','sin_id')}", symbol=symbol, stage="exit", qty=qty, pnl=pnl)
             session["pnl_today"] = session.get("pnl_today", 0.0) + pnl
             if args.daily_profit_halt > 0 and session["pnl_today"] >= args.daily_profit_halt:
                 session["halted"] = True
-                print(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.")
+                log_event(f"🧭 Objetivo diario alcanzado: +{session['pnl_today']:.2f}. Pausando nuevas entradas.", symbol=symbol, stage="session")
     else:
-        msg = f"[{symbol}] Sin señal."
-        logger.info(msg)
-        print(msg)
+        log_event(f"[{symbol}] Sin señal.", symbol=symbol, stage="signal")
+
+
+def trade_one_symbol(
+    broker: BrokerAlpaca,
+    risk: AdvancedRiskManager,
+    strat: object,
+    symbol: str,
+    timeframe: str,
+    lookback: int,
+    start_iso: str,
+    args,
+    position_book: Dict[str, dict],
+    ensemble: Optional[Ensemble],
+    wrappers: Optional[List[StrategyWrapper]],
+    scale_out_levels: List[Tuple[float, float]],
+    session: Dict[str, Any],
+    streaming: Optional[StreamingSignals] = None,
+    df: Optional[pd.DataFrame] = None,
+    lock: Optional[threading.Lock] = None,
+    rings: Optional[RingBook] = None,
+) -> str:
+    """
+    Un tick de un símbolo. df: barras ya descargadas (get_bars_multi); si es None
+    se piden aquí. lock: en modo concurrente serializa la fase de ejecución entre
+    símbolos para que position_book, session y el RiskManager sean consistentes.
+    Devuelve el estado del tick (OK, NOT_TRADABLE, NO_BARS, WARMUP, HALTED) para
+    el SymbolScheduler; nunca duerme.
+    """
+    t0 = time.perf_counter()
+    status, ctx = prepare_symbol(broker, strat, symbol, timeframe, lookback, start_iso, args,
+                                 ensemble, wrappers, streaming=streaming, df=df, rings=rings)
+    t1 = time.perf_counter()
+    if ctx is not None:
+        with lock if lock is not None else contextlib.nullcontext():
+            status = execute_symbol(broker, risk, symbol, args, position_book, scale_out_levels, session, ctx) or OK
+    t2 = time.perf_counter()
+    METRICS.observe("bot_stage_seconds", t1 - t0, stage="prepare")
+    if ctx is not None:
+        METRICS.observe("bot_stage_seconds", t2 - t1, stage="execute")
+    METRICS.inc("bot_ticks_total", status=status)
+    # Latencia por etapa: solo al fichero JSON (en consola queda el resumen del tick)
+    log_event(f"[{symbol}] {timeframe}: {status}", symbol=symbol, stage="tick", latency_ms=round((t2 - t0) * 1000, 3),
+              console=False, timeframe=timeframe, status=status,
+              prepare_ms=round((t1 - t0) * 1000, 3), execute_ms=round((t2 - t1) * 1000, 3))
+    return status
+
+
+# ---------------- Construcción (compartida con replay) ----------------
+def default_risk_config() -> RiskConfig:
+    # Config de riesgo avanzada (ajústala a tu gusto)
+    return RiskConfig(
+        account_risk_pct=0.005,     # 0.5% por trade (más conservador)
+        max_positions=4,
+        max_positions_per_symbol=1,
+        min_rr=1.3,                 # más permisivo en rango; súbelo a 2.0 para tendencia
+        use_atr_based_stop=True,
+        atr_window=14,
+        atr_multiple_sl=2.0,        # stop más ancho reduce tamaño y apalancamiento
+        atr_multiple_tp=3.0,        # TP proporcional (RR ~1.5–2)
+        trailing_atr_multiple=1.5,
+        price_precision=2,
+        slippage_pct=0.0005,
+        min_liquidity_dollar=200_000,
+    )
+
+
+def build_ensemble(args) -> Tuple[Optional[Ensemble], Optional[List[StrategyWrapper]]]:
+    """Devuelve (ensemble, wrappers) o (None, None) si --ensemble-mode off."""
+    if args.ensemble_mode == "off":
+        return None, None
+    w = parse_weights(args.ensemble_weights)
+    strat_ma = MACrossover(fast=args.fast, slow=args.slow)
+    strat_macd = MACDStrategy(fast=args.macd_fast, slow=args.macd_slow, signal=args.macd_signal)
+    strat_rsi = RSIStrategy(period=args.rsi_period, buy_level=args.rsi_buy, sell_level=args.rsi_sell)
+    strat_bb = BollingerStrategy(window=args.bb_window, k=args.bb_k)
+
+    wrappers = [
+        StrategyWrapper("ma", strat_ma, w.get("ma", 1.0)),
+        StrategyWrapper("macd", strat_macd, w.get("macd", 1.0)),
+        StrategyWrapper("rsi", strat_rsi, w.get("rsi", 0.5)),
+        StrategyWrapper("bbands", strat_bb, w.get("bbands", 0.5)),
+    ]
+
+    ensemble = Ensemble(
+        mode=args.ensemble_mode,
+        k=args.ensemble_k,
+        min_score=args.ensemble_min_score,
+        primary="ma",
+        use_trend_filter=args.regime_trend_filter,
+        trend_window=args.regime_trend_window,
+        use_atr_filter=args.regime_atr_filter,
+        atr_window=args.regime_atr_window,
+        atr_threshold=args.regime_atr_threshold,
+    )
+    return ensemble, wrappers
 
 
 # ---------------- Main ----------------
@@ -507,6 +801,10 @@ def main(args: argparse.Namespace) -> None:
         print("❌ Debes indicar --symbol TICKER o --symbols A,B,C")
         sys.exit(2)
 
+    set_console("quiet" if args.quiet else "normal", rate=args.console_rate)
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        print(f"📈 Métricas en http://127.0.0.1:{args.metrics_port}/metrics")
     print(f"▶️ Iniciando bot: symbols={symbols}, tf={args.timeframe}, lookback={args.lookback}, strategy={args.strategy}")
 
     if args.dry_run:
@@ -515,12 +813,20 @@ def main(args: argparse.Namespace) -> None:
         return
 
     try:
-        broker = BrokerAlpaca()
+        bar_cache = BarCache(args.bar_cache_dir) if args.bar_cache_dir else None
+        broker = BrokerAlpaca(bar_cache=bar_cache)
     except Exception as e:
         logger.error(f"No se pudo inicializar BrokerAlpaca: {e}")
         print(f"Error inicializando broker: {e}")
         sys.exit(1)
 
+    # Metadatos de activos en bloque (tradable/shortable se sirven desde memoria)
+    try:
+        n_assets = broker.assets.load()
+        logger.info(f"Metadatos de {n_assets} activos cargados.")
+    except Exception as e:
+        logger.warning(f"No se pudo precargar /v2/assets ({e}); se cargarán bajo demanda.")
+
     is_open = broker.get_clock_is_open()
     if not is_open:
         if args.ignore_clock:
@@ -530,62 +836,39 @@ def main(args: argparse.Namespace) -> None:
     else:
         print("✅ Mercado abierto.")
 
-    acct = broker.get_account()
+    # Cuenta y posiciones se sirven desde un snapshot (1 refresco por iteración o tras órdenes propias)
+    snapshot = AccountSnapshot(broker, max_age=args.snapshot_max_age)
+    acct = snapshot.get_account()
     equity = float(acct.get("equity", 10_000))
 
+    # Series de indicadores compartidas por estrategias, ensemble y flags de MA (LRU)
+    INDICATORS.max_entries = args.indicator_cache_size
+
     # Libro local de posiciones con meta (entry/stop/tp) para OCO y trailing
     position_book: Dict[str, dict] = {}
 
-    # Config de riesgo avanzada (ajústala a tu gusto)
-    cfg = RiskConfig(
-        account_risk_pct=0.005,     # 0.5% por trade (más conservador)
-        max_positions=4,
-        max_positions_per_symbol=1,
-        min_rr=1.3,                 # más permisivo en rango; súbelo a 2.0 para tendencia
-        use_atr_based_stop=True,
-        atr_window=14,
-        atr_multiple_sl=2.0,        # stop más ancho reduce tamaño y apalancamiento
-        atr_multiple_tp=3.0,        # TP proporcional (RR ~1.5–2)
-        trailing_atr_multiple=1.5,
-        price_precision=2,
-        slippage_pct=0.0005,
-        min_liquidity_dollar=200_000,
-    )
-
-    risk = AdvancedRiskManager(cfg, AlpacaRiskAdapter(broker, position_book))
+    cfg = default_risk_config()
+    risk = AdvancedRiskManager(cfg, AlpacaRiskAdapter(snapshot, position_book))
     risk.start_of_day()
 
     # Estrategia base (compatibilidad con CLI)
     strat = build_strategy(args)
 
     # Ensemble (si está activo)
-    wrappers: Optional[List[StrategyWrapper]] = None
-    ensemble: Optional[Ensemble] = None
-    if args.ensemble_mode != "off":
-        w = parse_weights(args.ensemble_weights)
-        strat_ma = MACrossover(fast=args.fast, slow=args.slow)
-        strat_macd = MACDStrategy(fast=args.macd_fast, slow=args.macd_slow, signal=args.macd_signal)
-        strat_rsi = RSIStrategy(period=args.rsi_period, buy_level=args.rsi_buy, sell_level=args.rsi_sell)
-        strat_bb = BollingerStrategy(window=args.bb_window, k=args.bb_k)
-
-        wrappers = [
-            StrategyWrapper("ma", strat_ma, w.get("ma", 1.0)),
-            StrategyWrapper("macd", strat_macd, w.get("macd", 1.0)),
-            StrategyWrapper("rsi", strat_rsi, w.get("rsi", 0.5)),
-            StrategyWrapper("bbands", strat_bb, w.get("bbands", 0.5)),
-        ]
-
-        ensemble = Ensemble(
-            mode=args.ensemble_mode,
-            k=args.ensemble_k,
-            min_score=args.ensemble_min_score,
-            primary="ma",
-            use_trend_filter=args.regime_trend_filter,
-            trend_window=args.regime_trend_window,
-            use_atr_filter=args.regime_atr_filter,
-            atr_window=args.regime_atr_window,
-            atr_threshold=args.regime_atr_threshold,
-        )
+    ensemble, wrappers = build_ensemble(args)
+
+    # Timeframes activos y símbolos de cada uno (--timeframes; por defecto solo --timeframe)
+    tf_jobs = parse_timeframes(args.timeframes, args.timeframe, symbols)
+    # Estrategia base por timeframe (--tf-strategies; el resto usa --strategy)
+    try:
+        tf_names = parse_tf_strategies(args.tf_strategies, list(tf_jobs))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    strat_by_tf = {tf: build_strategy(args, tf_names[tf]) if tf in tf_names else strat for tf in tf_jobs}
+    streaming_by_tf: Dict[str, StreamingSignals] = (
+        {tf: StreamingSignals(strat_by_tf[tf], wrappers) for tf in tf_jobs} if args.signal_mode == "incremental" else {}
+    )
 
     # Protección de ganancias: parseo de scale-out y sesión
     scale_out_levels = parse_scale_out(args.scale_out)
@@ -595,58 +878,235 @@ def main(args: argparse.Namespace) -> None:
         "Loop multi-símbolo: %s, tf=%s, lookback=%s, strategy=%s, hours_back=%s, allow_shorts=%s, ignore_clock=%s, ensemble_mode=%s",
         symbols, args.timeframe, args.lookback, args.strategy, args.hours_back, args.allow_shorts, args.ignore_clock, args.ensemble_mode
     )
-    print("🔁 Loop iniciado. CTRL+C para detener.")
+    # Concurrencia por símbolo (--max-concurrency > 1)
+    exec_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=args.max_concurrency, thread_name_prefix="sym") if args.max_concurrency > 1 else None
+
+    # Reintentos por símbolo sin bloquear el loop (backoff + circuit breaker)
+    scheduler = SymbolScheduler(base_delay=args.retry_base_seconds, max_delay=args.retry_max_seconds,
+                                breaker_threshold=args.breaker_threshold, breaker_cooldown=args.breaker_cooldown)
+    tick_stats = TickStats()
+
+    def run_symbol(sym: str, timeframe: str, start_iso: Optional[str], df: Optional[pd.DataFrame] = None) -> None:
+        status = ERROR
+        try:
+            status = trade_one_symbol(
+                broker=snapshot,
+                risk=risk,
+                strat=strat_by_tf[timeframe],
+                symbol=sym,
+                timeframe=timeframe,
+                lookback=args.lookback,
+                start_iso=start_iso,
+                args=args,
+                position_book=position_book,
+                ensemble=ensemble,
+                wrappers=wrappers,
+                scale_out_levels=scale_out_levels,
+                session=session,
+                streaming=streaming_by_tf.get(timeframe),
+                df=df,
+                lock=exec_lock,
+                rings=rings,
+            )
+        except Exception as e_sym:
+            logger.exception(f"❌ Error procesando [{sym}] {timeframe}: {e_sym}", extra={"symbol": sym, "stage": "tick"})
+        finally:
+            scheduler.report(f"{sym}@{timeframe}", status)
+            tick_stats.add(status)
+
+    # --tf-source resample: los timeframes > 1Min se construyen desde las velas de 1m (sin llamadas extra)
+    resampler = ResampleBook(origin=args.resample_origin, include_partial=args.partial_bars)
+    max_ratio = max(timeframe_seconds(tf) // 60 for tf in tf_jobs)
+    minute_limit = args.lookback * max_ratio + max_ratio  # + una cubeta para la vela en formación
+
+    # --bar-window ring: ventanas preasignadas por símbolo; cada tick solo añade las velas nuevas
+    rings = RingBook(args.lookback) if args.bar_window == "ring" else None
+    minute_rings = RingBook(minute_limit) if args.bar_window == "ring" else None
+
+    def to_frame(sym: str, timeframe: str, bars: List[dict], start_iso: str, book: Optional[RingBook]) -> pd.DataFrame:
+        if not bars:
+            return pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
+        return book.update_bars(sym, timeframe, bars, start_iso) if book is not None else bars_to_df(bars)
+
+    def fetch_multi(syms: List[str], timeframe: str, limit: int, start_iso: str,
+                    book: Optional[RingBook]) -> Dict[str, pd.DataFrame]:
+        fetch_iso = start_iso
+        if bar_cache is None:  # con caché ya se piden solo las barras nuevas
+            last_seen = [book.last_ts(s, timeframe) for s in syms] if book is not None else None
+            fetch_iso = multi_start_iso(start_iso, timeframe, limit, last_seen)
+        with METRICS.timer("bot_stage_seconds", stage="bars_multi"):
+            if book is None:
+                return broker.get_bars_multi(syms, timeframe=timeframe, limit=limit, start_iso=fetch_iso)
+            raw = broker.get_bars_multi(syms, timeframe=timeframe, limit=limit, start_iso=fetch_iso, frames=False)
+            return {s: to_frame(s, timeframe, b, start_iso, book) for s, b in raw.items()}
+
+    def minute_frames(syms: List[str], start_iso: str, memo: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Velas de 1m de syms; se piden una sola vez por tick (memo compartido entre timeframes)."""
+        missing = [s for s in syms if s not in memo]
+        if missing:
+            if args.fetch_mode == "multi":
+                memo.update(fetch_multi(missing, "1Min", minute_limit, start_iso, minute_rings))
+            else:
+                for s in missing:
+                    with METRICS.timer("bot_stage_seconds", stage="bars"):
+                        bars = broker.get_bars(s, timeframe="1Min", limit=minute_limit, start_iso=start_iso)
+                        memo[s] = to_frame(s, "1Min", bars, start_iso, minute_rings)
+        return {s: memo[s] for s in syms}
+
+    def run_timeframe(timeframe: str, tf_symbols: List[str], memo: Dict[str, pd.DataFrame]) -> None:
+        """Evalúa los símbolos de un timeframe que no estén en backoff."""
+        due_keys, skipped = scheduler.due([f"{s}@{timeframe}" for s in tf_symbols])
+        due = [k.rsplit("@", 1)[0] for k in due_keys]
+        log_event(f"📋 Tick {timeframe}: {len(due)} símbolos a evaluar, {len(skipped)} omitidos "
+                  f"(backoff/circuit breaker: {len(scheduler.open_breakers())} abiertos)", stage="schedule",
+                  timeframe=timeframe, due=len(due), skipped=len(skipped))
+        if not due:
+            return
+
+        start_iso = iso_utc_hours_back(args.hours_back)
+        frames: Optional[Dict[str, pd.DataFrame]] = None
+        if args.tf_source == "resample" and (timeframe != "1Min" or max_ratio > 1):
+            log_event(f"⏳ {timeframe}: velas desde 1m de {len(due)} símbolos…", stage="data", timeframe=timeframe)
+            base = minute_frames(due, start_iso, memo)
+            if timeframe == "1Min":
+                frames = {s: df.tail(args.lookback) for s, df in base.items()}
+            else:
+                now = pd.Timestamp.now(tz="UTC")
+                with METRICS.timer("bot_stage_seconds", stage="resample"):
+                    frames = {s: resampler.update(s, timeframe, df, limit=args.lookback, now=now) for s, df in base.items()}
+        elif args.fetch_mode == "multi":
+            # Una (o pocas) llamadas para todo el universo en lugar de una por símbolo
+            log_event(f"⏳ Pidiendo barras {timeframe} de {len(due)} símbolos…", stage="data", timeframe=timeframe)
+            frames = fetch_multi(due, timeframe, args.lookback, start_iso, rings)
+
+        def poll_symbol(sym: str) -> None:
+            run_symbol(sym, timeframe, start_iso, frames.get(sym) if frames is not None else None)
+
+        if pool is None:
+            for sym in due:
+                poll_symbol(sym)
+        else:
+            # Fase de datos/señal en paralelo; la de ejecución se serializa con exec_lock
+            list(pool.map(poll_symbol, due))
+
+    # --data-mode stream: barras por WebSocket; cada cierre de vela dispara su símbolo
+    feed: Optional[BarStream] = None
+    if args.data_mode == "stream":
+        if list(tf_jobs) != ["1Min"]:
+            print("❌ --data-mode stream entrega velas de 1 minuto: usa --timeframe 1Min sin --timeframes")
+            sys.exit(2)
+        feed = BarStream(args.stream_url, symbols, lookback=args.lookback,
+                         trades=args.stream_trades, quotes=args.stream_quotes)
+        try:
+            feed.seed(broker.get_bars_multi(symbols, timeframe="1Min", limit=args.lookback,
+                                            start_iso=iso_utc_hours_back(args.hours_back)))
+        except Exception as e:
+            logger.warning(f"No se pudo precargar histórico para el stream ({e}); se esperará al warm-up.")
+        feed.start()
+        print(f"📡 Stream de barras: {args.stream_url}")
+
+    # Stream + pool: como mucho una tarea por símbolo (StreamingSignals y BarRiskState son por símbolo);
+    # las velas que llegan mientras tanto se agrupan en la última ventana pendiente
+    stream_inflight: Dict[str, Optional[pd.DataFrame]] = {}
+    stream_lock = threading.Lock()
+
+    def run_stream_symbol(sym: str, df: pd.DataFrame) -> None:
+        while True:
+            run_symbol(sym, "1Min", None, df)
+            with stream_lock:
+                df = stream_inflight.get(sym)
+                if df is None:
+                    stream_inflight.pop(sym, None)
+                    return
+                stream_inflight[sym] = None
+    last_bar_ts = None
+
+    # --schedule bar-close: despertar tras el cierre de vela de cada timeframe en lugar de --poll-seconds
+    bar_close: Optional[BarCloseScheduler] = None
+    if args.schedule == "bar-close" and feed is None:
+        bar_close = BarCloseScheduler(delay=args.bar_close_delay)
+        for tf, tf_symbols in tf_jobs.items():
+            bar_close.register(tf, tf_symbols)
+
+    print(f"🔁 Loop iniciado ({', '.join(f'{tf}: {len(s)} símbolos' for tf, s in tf_jobs.items())}). CTRL+C para detener.")
 
     while True:
         try:
             if session.get("halted"):
-                print("⏸️  Objetivo diario cumplido: pausa activa. Reanuda reiniciando o cambia --daily-profit-halt.")
+                log_event("⏸️  Objetivo diario cumplido: pausa activa. Reanuda reiniciando o cambia --daily-profit-halt.",
+                          stage="session")
                 time.sleep(30)
                 continue
 
             if not broker.get_clock_is_open() and not args.ignore_clock:
-                msg = "Mercado cerrado. Reintentando en 60s."
-                logger.info(msg)
-                print(f"⏸️  {msg}")
+                log_event("⏸️  Mercado cerrado. Reintentando en 60s.", stage="session")
                 time.sleep(60)
                 continue
 
-            start_iso = iso_utc_hours_back(args.hours_back)
-
-            for sym in symbols:
-                try:
-                    trade_one_symbol(
-                        broker=broker,
-                        risk=risk,
-                        strat=strat,
-                        symbol=sym,
-                        timeframe=args.timeframe,
-                        lookback=args.lookback,
-                        start_iso=start_iso,
-                        args=args,
-                        position_book=position_book,
-                        ensemble=ensemble,
-                        wrappers=wrappers,
-                        scale_out_levels=scale_out_levels,
-                        session=session,
-                    )
-                except Exception as e_sym:
-                    logger.exception(f"Error procesando [{sym}]: {e_sym}")
-                    print(f"❌ Error en símbolo [{sym}]: {e_sym}")
-
-            time.sleep(args.poll_seconds)
+            if feed is not None:
+                item = feed.next_bar(timeout=5.0)
+                if item is None:
+                    continue
+                sym, df = item
+                if not scheduler.is_due(f"{sym}@1Min"):
+                    continue
+                # Un refresco de snapshot (y una línea de resumen) por minuto de velas, no por símbolo
+                if not df.empty and df.index[-1] != last_bar_ts:
+                    if last_bar_ts is not None:
+                        tick_stats.emit(f"Stream {last_bar_ts:%H:%M}")
+                    last_bar_ts = df.index[-1]
+                    snapshot.mark_stale()
+                if pool is None:
+                    run_symbol(sym, "1Min", None, df)
+                else:
+                    with stream_lock:
+                        if sym in stream_inflight:
+                            # El símbolo sigue en curso: solo se guarda la ventana más reciente
+                            stream_inflight[sym] = df
+                            continue
+                        stream_inflight[sym] = None
+                    pool.submit(run_stream_symbol, sym, df)
+                continue
+
+            if bar_close is not None:
+                with METRICS.timer("bot_stage_seconds", stage="sleep"):
+                    boundary, jobs = bar_close.wait_next()
+                d = bar_close.drift
+                closed_at = datetime.fromtimestamp(boundary, tz=timezone.utc).strftime("%H:%M:%S")
+                log_event(f"🕐 Cierre {closed_at} UTC: {', '.join(jobs) or '-'} | deriva {d['last'] * 1000:.0f} ms "
+                          f"(media {d['mean'] * 1000:.0f}, máx {d['max'] * 1000:.0f})", stage="schedule",
+                          drift_ms=round(d["last"] * 1000, 3))
+            else:
+                jobs = tf_jobs
+
+            snapshot.mark_stale()
+            tick_stats.reset()
+            memo: Dict[str, pd.DataFrame] = {}
+            with METRICS.timer("bot_stage_seconds", stage="tick"):
+                for tf, tf_symbols in jobs.items():
+                    run_timeframe(tf, tf_symbols, memo)
+            tick_stats.emit(f"Tick {', '.join(jobs) or '-'}")
+
+            if bar_close is None:
+                with METRICS.timer("bot_stage_seconds", stage="sleep"):
+                    time.sleep(args.poll_seconds)
 
         except KeyboardInterrupt:
-            logger.info("Bot detenido manualmente.")
+            logger.info(f"Bot detenido manualmente. HTTP stats: {broker.stats} | snapshot: {snapshot.stats} | scheduler: {scheduler.stats} | indicadores: {INDICATORS.stats} | deriva: {bar_close.drift if bar_close else '-'}")
             print("🛑 Bot detenido manualmente.")
             break
         except Exception as e:
-            logger.exception(f"Error en loop principal: {e}")
-            print(f"❌ Error en loop: {e}")
+            logger.exception(f"❌ Error en loop principal: {e}")
             time.sleep(10)
 
+    if feed is not None:
+        feed.stop()
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-if __name__ == "__main__":
+
+def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Paper-trading multi-símbolo (Alpaca) con estrategias, ensemble, control de riesgo avanzado y protecciones de ganancias")
     # símbolos
     p.add_argument("--symbol", type=str, default="AAPL")
@@ -656,6 +1116,55 @@ if __name__ == "__main__":
     p.add_argument("--lookback", type=int, default=120)
     p.add_argument("--hours-back", type=int, default=24)
     p.add_argument("--poll-seconds", type=int, default=10)
+    p.add_argument("--bar-cache-dir", type=str, default="",
+                   help="Activa la caché incremental de barras persistida en esta carpeta (ej. data/bar_cache)")
+    p.add_argument("--snapshot-max-age", type=float, default=30.0,
+                   help="Segundos máximos que se reutiliza el snapshot de cuenta/posiciones dentro de una iteración")
+    p.add_argument("--bar-window", type=str, default="ring", choices=["ring", "frame"],
+                   help="ring: ventana de velas preasignada por símbolo (solo se añaden las nuevas, vistas sin copia); "
+                        "frame: DataFrame nuevo por tick (bars_to_df)")
+    p.add_argument("--quiet", action="store_true",
+                   help="Consola: solo una línea de resumen por tick (y errores); el detalle sigue en logs/bot.log")
+    p.add_argument("--console-rate", type=float, default=20.0,
+                   help="Máximo de líneas/s en consola (las sobrantes solo van al log; 0 = sin límite)")
+    p.add_argument("--metrics-port", type=int, default=0,
+                   help="Sirve métricas Prometheus (latencia por etapa/endpoint, señales, órdenes, rechazos) "
+                        "en 127.0.0.1:<puerto>/metrics (0 = desactivado)")
+    p.add_argument("--indicator-cache-size", type=int, default=4096,
+                   help="Máximo de series en la caché LRU de indicadores compartida por tick")
+    p.add_argument("--max-concurrency", type=int, default=8,
+                   help="Símbolos evaluados en paralelo por tick (1 = secuencial)")
+    p.add_argument("--data-mode", type=str, default="poll", choices=["poll", "stream"],
+                   help="poll = get_bars cada --poll-seconds; stream = velas de 1m por WebSocket al cerrar")
+    p.add_argument("--stream-url", type=str, default=settings.alpaca_stream_url,
+                   help="URL del feed WebSocket (ej. ws://127.0.0.1:8765 con src.stream_server)")
+    p.add_argument("--stream-trades", action="store_true", help="Suscribirse también a trades")
+    p.add_argument("--stream-quotes", action="store_true", help="Suscribirse también a quotes")
+    p.add_argument("--retry-base-seconds", type=float, default=5.0,
+                   help="Espera antes de reevaluar un símbolo omitido (warm-up, sin barras...); se duplica en fallos seguidos")
+    p.add_argument("--retry-max-seconds", type=float, default=300.0, help="Tope del backoff por símbolo")
+    p.add_argument("--breaker-threshold", type=int, default=5, help="Fallos seguidos que abren el circuit breaker del símbolo")
+    p.add_argument("--breaker-cooldown", type=float, default=900.0, help="Segundos con el circuit breaker abierto")
+    p.add_argument("--timeframes", type=str, default="",
+                   help="Varios timeframes a la vez: '1Min,5Min,15Min' o '1Min,15Min:SPY+QQQ' (vacío = --timeframe). "
+                        "Cada posición la gestiona solo el timeframe que la abrió")
+    p.add_argument("--tf-strategies", type=str, default="",
+                   help="Estrategia base por timeframe: '15Min=macd,5Min=rsi' (el resto usa --strategy; "
+                        "con --ensemble-mode manda el ensemble)")
+    p.add_argument("--tf-source", type=str, default="api", choices=["resample", "api"],
+                   help="api = pedirlos al broker (por defecto); resample = timeframes > 1Min desde velas de 1m "
+                        "(sin llamadas extra; con huecos de 1m en IEX puede diferir de las velas del broker)")
+    p.add_argument("--resample-origin", type=str, default="epoch", choices=["epoch", "session"],
+                   help="Alineación de cubetas: epoch (como Alpaca) o session (desde la apertura 09:30 NY)")
+    p.add_argument("--partial-bars", action="store_true",
+                   help="Incluye la vela en formación del timeframe mayor al remuestrear")
+    p.add_argument("--schedule", type=str, default="poll", choices=["poll", "bar-close"],
+                   help="poll = dormir --poll-seconds; bar-close = despertar tras el cierre de vela de cada timeframe")
+    p.add_argument("--bar-close-delay", type=float, default=0.3,
+                   help="Segundos tras la frontera de vela antes de pedir barras (modo bar-close)")
+    p.add_argument("--fetch-mode", type=str, default="multi", choices=["multi", "single"],
+                   help="multi = barras de todo el universo en pocas llamadas (sin --bar-cache-dir solo pide "
+                        "desde la última vela de cada ventana, o lookback × timeframe); single = una llamada por símbolo")
     p.add_argument("--dry-run", action="store_true")
     p.add_argument("--ignore-clock", action="store_true", help="No pausar aunque el mercado esté cerrado (usa histórico)")
     # estrategia base (compatibilidad)
@@ -664,6 +1173,8 @@ if __name__ == "__main__":
     p.add_argument("--fast", type=int, default=3, help="MA rápida")
     p.add_argument("--slow", type=int, default=7, help="MA lenta")
     p.add_argument("--debug-ma", action="store_true")
+    p.add_argument("--signal-mode", type=str, default="batch", choices=["batch", "incremental"],
+                   help="batch = signal(df) completo cada tick; incremental = update(bar) O(1) por vela nueva")
     # RSI params
     p.add_argument("--rsi-period", type=int, default=14)
     p.add_argument("--rsi-buy", type=float, default=30.0)
@@ -706,8 +1217,11 @@ if __name__ == "__main__":
                    help="Cierra si devuelve más de esta fracción (0–1) del PnL pico por trade.")
     p.add_argument("--daily-profit-halt", type=float, default=300.0,
                    help="Pausa nuevas entradas al alcanzar este PnL realizado del día (USD).")
+    return p
 
-    args = p.parse_args()
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
 
     # Validación suave para 'ma'
     if args.strategy == "ma" and args.fast >= args.slow:
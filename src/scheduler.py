@@ -0,0 +1,195 @@
+# src/scheduler.py
+"""
+Planificador por símbolo para el loop de run_paper.
+
+trade_one_symbol ya no duerme: devuelve un estado y el SymbolScheduler decide
+cuándo volver a evaluar ese símbolo. El loop pide due() en cada tick, evalúa
+solo los símbolos que tocan y sigue sin bloquear al resto.
+
+- OK: se reinicia el historial de fallos.
+- WARMUP / HALTED: esperados; se reintenta tras `base_delay` sin penalizar.
+- NOT_TRADABLE / NO_BARS / ERROR: fallos; backoff exponencial
+  (base_delay · 2^(n-1), hasta max_delay).
+- Tras `breaker_threshold` fallos seguidos se abre el circuit breaker del
+  símbolo durante `breaker_cooldown`; al vencer se permite un intento
+  (half-open): si sale bien se cierra, si falla vuelve a abrirse.
+
+BarCloseScheduler (--schedule bar-close) sustituye el sleep fijo de
+--poll-seconds: despierta justo tras el cierre de vela de cada timeframe.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .logger import logger
+
+# Estados devueltos por trade_one_symbol
+OK = "ok"
+NOT_TRADABLE = "not_tradable"
+NO_BARS = "no_bars"
+WARMUP = "warmup"
+HALTED = "halted"
+ERROR = "error"
+
+_BENIGN = {WARMUP, HALTED}
+
+
+@dataclass
+class _SymbolState:
+    failures: int = 0
+    retry_at: float = 0.0
+    breaker_open: bool = False
+    last_status: str = OK
+
+
+class SymbolScheduler:
+    def __init__(
+        self,
+        base_delay: float = 5.0,
+        max_delay: float = 300.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 900.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        - clock: función que devuelve segundos (en replay, el reloj virtual)
+        """
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.breaker_threshold = int(breaker_threshold)
+        self.breaker_cooldown = float(breaker_cooldown)
+        self.clock = clock
+        self._state: Dict[str, _SymbolState] = {}
+        self._lock = threading.Lock()
+        self.stats = {"evaluated": 0, "skipped": 0, "breaker_trips": 0}
+
+    def _get(self, symbol: str) -> _SymbolState:
+        st = self._state.get(symbol)
+        if st is None:
+            st = self._state[symbol] = _SymbolState()
+        return st
+
+    def is_due(self, symbol: str) -> bool:
+        with self._lock:
+            return self.clock() >= self._get(symbol).retry_at
+
+    def due(self, symbols: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Parte el universo en (a evaluar ahora, omitidos por backoff/breaker)."""
+        now = self.clock()
+        run, skipped = [], []
+        with self._lock:
+            for sym in symbols:
+                (run if now >= self._get(sym).retry_at else skipped).append(sym)
+            self.stats["evaluated"] += len(run)
+            self.stats["skipped"] += len(skipped)
+        return run, skipped
+
+    def report(self, symbol: str, status: str) -> None:
+        """Registra el resultado del tick de un símbolo y fija su próximo turno."""
+        now = self.clock()
+        with self._lock:
+            st = self._get(symbol)
+            st.last_status = status
+            if status == OK:
+                if st.breaker_open:
+                    logger.info(f"[{symbol}] Circuit breaker cerrado.")
+                st.failures, st.retry_at, st.breaker_open = 0, 0.0, False
+                return
+            if status in _BENIGN:
+                st.retry_at = now + self.base_delay
+                return
+            st.failures += 1
+            if st.breaker_open or st.failures >= self.breaker_threshold:
+                if not st.breaker_open:
+                    self.stats["breaker_trips"] += 1
+                    logger.warning(f"[{symbol}] Circuit breaker abierto tras {st.failures} fallos ({status}); "
+                                   f"reintento en {self.breaker_cooldown:.0f}s.")
+                st.breaker_open = True
+                st.retry_at = now + self.breaker_cooldown
+                return
+            st.retry_at = now + min(self.max_delay, self.base_delay * 2 ** (st.failures - 1))
+
+    def open_breakers(self) -> List[str]:
+        with self._lock:
+            return [s for s, st in self._state.items() if st.breaker_open]
+
+
+# ---------------- Despertar al cierre de vela ----------------
+_TF_RE = re.compile(r"^(\d+)(Min|Hour|Day)$")
+_TF_UNIT = {"Min": 60, "Hour": 3600, "Day": 86400}
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """'1Min' -> 60, '15Min' -> 900, '1Hour' -> 3600, '1Day' -> 86400 (formato de Alpaca)."""
+    m = _TF_RE.match(timeframe)
+    if not m:
+        raise ValueError(f"Timeframe no soportado: {timeframe!r} (usa NMin, NHour o NDay)")
+    return int(m.group(1)) * _TF_UNIT[m.group(2)]
+
+
+class BarCloseScheduler:
+    """
+    Duerme hasta `delay` segundos después de la próxima frontera de vela de
+    cualquiera de los timeframes registrados y devuelve los que acaban de
+    cerrar (1Min, 5Min y 15Min comparten frontera cada 15 min). Las fronteras
+    se alinean al epoch UTC, como las velas de Alpaca.
+    Mide la deriva (despertar real - frontera - delay) para vigilar el loop.
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.3,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.delay = float(delay)
+        self.clock = clock
+        self.sleep = sleep
+        self._jobs: Dict[str, List[str]] = {}
+        self._last_boundary: Dict[str, float] = {}
+        self.drift = {"count": 0, "last": 0.0, "mean": 0.0, "max": 0.0}
+
+    def register(self, timeframe: str, symbols: Iterable[str]) -> None:
+        timeframe_seconds(timeframe)  # valida
+        merged = self._jobs.setdefault(timeframe, [])
+        merged.extend(s for s in symbols if s not in merged)
+
+    @property
+    def jobs(self) -> Dict[str, List[str]]:
+        return dict(self._jobs)
+
+    def next_boundary(self, now: float) -> Tuple[float, List[str]]:
+        """(instante de la próxima frontera, timeframes que cierran en ella)."""
+        best, closing = float("inf"), []
+        for tf in self._jobs:
+            step = timeframe_seconds(tf)
+            b = (int(now // step) + 1) * step
+            if b < best:
+                best, closing = b, [tf]
+            elif b == best:
+                closing.append(tf)
+        return best, closing
+
+    def wait_next(self) -> Tuple[float, Dict[str, List[str]]]:
+        """Bloquea hasta la próxima frontera + delay; devuelve (frontera, {timeframe: símbolos})."""
+        boundary, closing = self.next_boundary(self.clock() - self.delay)
+        wait = boundary + self.delay - self.clock()
+        if wait > 0:
+            self.sleep(wait)
+        drift = self.clock() - boundary - self.delay
+        d = self.drift
+        d["count"] += 1
+        d["last"] = drift
+        d["mean"] += (drift - d["mean"]) / d["count"]
+        d["max"] = max(d["max"], drift)
+        closed = {}
+        for tf in closing:
+            # si el loop se retrasó más de una vela, no se dispara dos veces la misma frontera
+            if self._last_boundary.get(tf) != boundary:
+                self._last_boundary[tf] = boundary
+                closed[tf] = list(self._jobs[tf])
+        return boundary, closed
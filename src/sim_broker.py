@@ -0,0 +1,209 @@
+# src/sim_broker.py
+"""
+Broker simulado con la misma superficie que BrokerAlpaca, alimentado con
+barras históricas y un reloj virtual. Permite ejecutar run_paper.trade_one_symbol
+tal cual (break-even, scale-out, giveback, trailing ATR, ensemble) en replay.
+
+- Solo son visibles las barras con timestamp <= reloj (la barra etiquetada con
+  su inicio se considera cerrada cuando el reloj llega a ella).
+- Las órdenes a mercado se llenan al instante al último close visible
+  ± slippage (bps). No hay órdenes pendientes.
+- sleep() no bloquea: acumula segundos virtuales para el informe.
+"""
+from __future__ import annotations
+
+import itertools
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data import bars_to_df
+
+
+class SimClock:
+    """Reloj virtual (UTC) controlado por el driver del replay."""
+
+    def __init__(self, now: Optional[pd.Timestamp] = None):
+        self.now: pd.Timestamp = now if now is not None else pd.Timestamp(0, tz="UTC")
+        self.slept_seconds = 0.0
+
+    def set(self, ts: pd.Timestamp) -> None:
+        self.now = ts
+
+    def sleep(self, seconds: float) -> None:
+        self.slept_seconds += float(seconds)
+
+    def iso_hours_back(self, hours: int) -> str:
+        return (self.now - pd.Timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _SymbolBars:
+    """Columnas de un símbolo en arrays + timestamps ISO precalculados (una sola vez)."""
+
+    def __init__(self, df: pd.DataFrame):
+        idx = df.index if df.index.tz is not None else df.index.tz_localize("UTC")
+        idx = idx.tz_convert("UTC")
+        self.ts = idx.as_unit("ns").asi8  # pandas 3 puede leer el CSV en µs
+        self.iso = idx.strftime("%Y-%m-%dT%H:%M:%SZ").to_numpy()
+        self.o = df["open"].to_numpy(dtype=float)
+        self.h = df["high"].to_numpy(dtype=float)
+        self.l = df["low"].to_numpy(dtype=float)
+        self.c = df["close"].to_numpy(dtype=float)
+        self.v = df["volume"].to_numpy(dtype=float) if "volume" in df.columns else np.full(len(df), 1_000_000.0)
+
+    def visible_end(self, now_ns: int) -> int:
+        """Índice (exclusivo) de la última barra visible."""
+        return int(np.searchsorted(self.ts, now_ns, side="right"))
+
+
+class SimBroker:
+    def __init__(
+        self,
+        data: Dict[str, pd.DataFrame],
+        cash: float = 10_000.0,
+        clock: Optional[SimClock] = None,
+        timeframe: str = "1Min",
+        slippage_bps: float = 0.0,
+        fee_per_order: float = 0.0,
+        shortable: bool = True,
+    ):
+        self.clock = clock or SimClock()
+        self.timeframe = timeframe
+        self.cash = float(cash)
+        self.slippage_bps = float(slippage_bps)
+        self.fee_per_order = float(fee_per_order)
+        self.shortable = shortable
+        self._bars = {sym.upper(): _SymbolBars(df.sort_index()) for sym, df in data.items()}
+        self._positions: Dict[str, Dict[str, float]] = {}  # symbol -> {qty, avg_price}
+        self._ids = itertools.count(1)
+        self.fills: List[Dict[str, Any]] = []
+
+    # ---------- Reloj ----------
+    def sleep(self, seconds: float) -> None:
+        self.clock.sleep(seconds)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._bars)
+
+    def timeline(self) -> np.ndarray:
+        """Timestamps (ns, UTC) de todas las barras de todos los símbolos, ordenados."""
+        return np.unique(np.concatenate([b.ts for b in self._bars.values()]))
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        b = self._bars.get(symbol.upper())
+        if b is None:
+            return None
+        end = b.visible_end(self.clock.now.value)
+        return float(b.c[end - 1]) if end > 0 else None
+
+    # ---------- Cuenta ----------
+    def _equity(self) -> float:
+        eq = self.cash
+        for sym, p in self._positions.items():
+            px = self.last_price(sym)
+            eq += p["qty"] * (px if px is not None else p["avg_price"])
+        return eq
+
+    def get_account(self) -> Dict[str, Any]:
+        eq = self._equity()
+        return {"equity": str(eq), "cash": str(self.cash), "buying_power": str(max(0.0, eq)), "status": "ACTIVE"}
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        out = []
+        for sym, p in self._positions.items():
+            px = self.last_price(sym) or p["avg_price"]
+            out.append({
+                "symbol": sym,
+                "qty": str(int(p["qty"])),
+                "avg_entry_price": str(p["avg_price"]),
+                "market_value": str(p["qty"] * px),
+                "side": "long" if p["qty"] > 0 else "short",
+            })
+        return out
+
+    # ---------- Datos ----------
+    def get_bars(self, symbol: str, timeframe: str = "1Min", limit: int = 120, start_iso: str | None = None):
+        if timeframe != self.timeframe:
+            raise ValueError(f"SimBroker cargado con {self.timeframe}; se pidió {timeframe}")
+        b = self._bars.get(symbol.upper())
+        if b is None:
+            return []
+        end = b.visible_end(self.clock.now.value)
+        start = max(0, end - int(limit))
+        if start_iso:
+            start = max(start, int(np.searchsorted(b.ts, pd.Timestamp(start_iso).value, side="left")))
+        return [
+            {"t": b.iso[i], "o": b.o[i], "h": b.h[i], "l": b.l[i], "c": b.c[i], "v": b.v[i]}
+            for i in range(start, end)
+        ]
+
+    def get_bars_multi(self, symbols: List[str], timeframe: str = "1Min", limit: int = 120,
+                       start_iso: str | None = None, frames: bool = True) -> Dict[str, Any]:
+        out = {}
+        for sym in symbols:
+            bars = self.get_bars(sym, timeframe=timeframe, limit=limit, start_iso=start_iso)
+            if not frames:
+                out[sym.upper()] = bars
+            else:
+                out[sym.upper()] = bars_to_df(bars) if bars else pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
+        return out
+
+    def get_clock_is_open(self) -> bool:
+        return True
+
+    def get_asset_tradable(self, symbol: str) -> bool:
+        return symbol.upper() in self._bars
+
+    def get_asset_shortable(self, symbol: str) -> bool:
+        return self.shortable and symbol.upper() in self._bars
+
+    def get_position_qty(self, symbol: str) -> int:
+        p = self._positions.get(symbol.upper())
+        return int(p["qty"]) if p else 0
+
+    # ---------- Órdenes ----------
+    def cancel_open_orders(self, symbol: str) -> None:
+        return None  # las órdenes simuladas se llenan al instante
+
+    def place_order_market(self, symbol: str, side: str, qty: int, tif: str = "day") -> dict:
+        symbol = symbol.upper()
+        px = self.last_price(symbol)
+        if px is None or qty <= 0:
+            return {"id": None, "status": "rejected", "symbol": symbol}
+        slip = px * self.slippage_bps / 10_000.0
+        fill = px + slip if side == "buy" else px - slip
+        signed = qty if side == "buy" else -qty
+
+        pos = self._positions.get(symbol, {"qty": 0.0, "avg_price": 0.0})
+        old = pos["qty"]
+        new = old + signed
+        if old == 0 or (old > 0) == (signed > 0):
+            # abre o aumenta: precio medio ponderado
+            pos["avg_price"] = (old * pos["avg_price"] + signed * fill) / new
+        elif new != 0 and (new > 0) != (old > 0):
+            # cruza de largo a corto (o viceversa): el remanente abre al precio del fill
+            pos["avg_price"] = fill
+        pos["qty"] = new
+        if new == 0:
+            self._positions.pop(symbol, None)
+        else:
+            self._positions[symbol] = pos
+
+        self.cash -= signed * fill + self.fee_per_order
+        order = {
+            "id": f"sim-{next(self._ids)}",
+            "symbol": symbol,
+            "side": side,
+            "qty": str(qty),
+            "status": "filled",
+            "filled_avg_price": str(fill),
+            "filled_at": self.clock.now.isoformat(),
+        }
+        self.fills.append(order)
+        return order
+
+    def place_order_bracket(self, symbol: str, side: str, qty: int, take_profit_pct: float, stop_loss_pct: float, tif: str = "gtc") -> dict:
+        """Se simula como orden a mercado; las patas TP/SL no se modelan."""
+        return self.place_order_market(symbol, side, qty, tif)
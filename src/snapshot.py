@@ -0,0 +1,92 @@
+# src/snapshot.py
+"""
+Snapshot de cuenta y posiciones para el loop de run_paper.
+
+AccountSnapshot envuelve al broker y sirve get_account / get_positions /
+get_position_qty desde memoria. Se refresca:
+  - una vez por iteración del loop (mark_stale() al empezar cada vuelta),
+  - si tiene más de `max_age` segundos,
+  - tras cualquier orden propia (place_order_*), que lo marca como obsoleto.
+El resto de métodos se delegan tal cual al broker.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List
+
+
+class AccountSnapshot:
+    def __init__(self, broker: Any, max_age: float = 30.0):
+        self.broker = broker
+        self.max_age = float(max_age)
+        self._account: Dict[str, Any] = {}
+        self._positions: List[Dict[str, Any]] = []
+        self._qty: Dict[str, int] = {}
+        self._taken_at = 0.0
+        self._stale = True
+        self._lock = threading.RLock()
+        self.stats = {"refreshes": 0, "hits": 0}
+
+    def __getattr__(self, name: str) -> Any:
+        # Solo se llama para atributos que no existen aquí: delega en el broker
+        if name == "broker":
+            raise AttributeError(name)
+        return getattr(self.broker, name)
+
+    # ---------- Ciclo de vida ----------
+    def mark_stale(self) -> None:
+        with self._lock:
+            self._stale = True
+
+    def refresh(self) -> None:
+        """Pide cuenta y posiciones al broker (2 llamadas)."""
+        account = self.broker.get_account()
+        positions = self.broker.get_positions()
+        qty: Dict[str, int] = {}
+        for p in positions:
+            try:
+                qty[str(p.get("symbol", "")).upper()] = int(float(p.get("qty", "0")))
+            except (TypeError, ValueError):
+                continue
+        with self._lock:
+            self._account, self._positions, self._qty = account, positions, qty
+            self._taken_at = time.time()
+            self._stale = False
+            self.stats["refreshes"] += 1
+
+    def _ensure(self) -> None:
+        with self._lock:
+            if self._stale or time.time() - self._taken_at >= self.max_age:
+                self.refresh()
+            else:
+                self.stats["hits"] += 1
+
+    # ---------- Lecturas desde memoria ----------
+    def get_account(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure()
+            return self._account
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._ensure()
+            return list(self._positions)
+
+    def get_position_qty(self, symbol: str) -> int:
+        with self._lock:
+            self._ensure()
+            return self._qty.get(symbol.upper(), 0)
+
+    # ---------- Órdenes: invalidan el snapshot ----------
+    def place_order_market(self, *args, **kwargs) -> dict:
+        try:
+            return self.broker.place_order_market(*args, **kwargs)
+        finally:
+            self.mark_stale()
+
+    def place_order_bracket(self, *args, **kwargs) -> dict:
+        try:
+            return self.broker.place_order_bracket(*args, **kwargs)
+        finally:
+            self.mark_stale()
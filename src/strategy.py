@@ -1,12 +1,78 @@
 # src/strategy.py
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Any, Optional, Tuple
 
-class MACrossover:
+from .indicators import EWM, STORE, RollingMean, RollingVar, ema, rolling_std, sma
+
+
+class _Streaming:
+    """
+    Soporte común del modo incremental update(bar) -> señal.
+    - bar: dict o fila (pd.Series) con 'close' (o 'c') y opcionalmente 'timestamp'/'t'.
+      Si llega otra vez la misma marca de tiempo, se trata como corrección de la
+      última vela (revise) en lugar de una vela nueva.
+    - Guarda los dos últimos valores del indicador (prev, now) para detectar cruces.
+    """
+
+    def _reset_stream(self) -> None:
+        self._n = 0
+        self._last_ts = None
+        self._prev: Any = None
+        self._now: Any = None
+
+    def _read_bar(self, bar) -> Tuple[float, bool]:
+        close = bar["close"] if "close" in bar else bar["c"]
+        ts = bar.get("timestamp", bar.get("t")) if hasattr(bar, "get") else None
+        if ts is None and isinstance(bar, pd.Series):
+            ts = bar.name
+        revise = self._n > 0 and ts is not None and ts == self._last_ts
+        if ts is not None:
+            self._last_ts = ts
+        return float(close), revise
+
+    def _push(self, now: Any, revise: bool) -> None:
+        if not revise:
+            self._prev = self._now
+            self._n += 1
+        self._now = now
+
+
+def _cross_signals(buy: pd.Series, sell: pd.Series) -> pd.Series:
+    """Convierte máscaras booleanas BUY/SELL en una serie "BUY"/"SELL"/None."""
+    out = np.full(len(buy), None, dtype=object)
+    out[buy.to_numpy(dtype=bool)] = "BUY"
+    out[sell.to_numpy(dtype=bool)] = "SELL"
+    return pd.Series(out, index=buy.index, name="signal", dtype=object)
+
+
+class MACrossover(_Streaming):
     def __init__(self, fast: int = 10, slow: int = 30):
         assert fast < slow, "fast debe ser < slow"
         self.fast = fast
         self.slow = slow
+        self.reset()
+
+    def reset(self) -> None:
+        """Reinicia el estado del modo incremental."""
+        self._ma_fast = RollingMean(self.fast)
+        self._ma_slow = RollingMean(self.slow)
+        self._reset_stream()
+
+    def update(self, bar) -> Optional[str]:
+        """Procesa una vela nueva en O(1); equivale a signal() sobre todas las velas vistas."""
+        close, revise = self._read_bar(bar)
+        step = "revise" if revise else "update"
+        f = getattr(self._ma_fast, step)(close)
+        s = getattr(self._ma_slow, step)(close)
+        self._push(None if f is None or s is None else f - s, revise)
+        if self._n < self.slow + 2 or self._prev is None or self._now is None:
+            return None
+        if self._prev <= 0 and self._now > 0:
+            return "BUY"
+        if self._prev >= 0 and self._now < 0:
+            return "SELL"
+        return None
 
     def signal(self, df: pd.DataFrame) -> Optional[str]:
         if "close" not in df.columns:
@@ -14,8 +80,8 @@ class MACrossover:
         prices = df["close"]
         if len(prices) < self.slow + 2:
             return None
-        ma_fast = prices.rolling(self.fast).mean()
-        ma_slow = prices.rolling(self.slow).mean()
+        ma_fast = sma(df, self.fast)
+        ma_slow = sma(df, self.slow)
         prev_cross = ma_fast.iloc[-2] - ma_slow.iloc[-2]
         now_cross  = ma_fast.iloc[-1] - ma_slow.iloc[-1]
         if pd.notna(prev_cross) and pd.notna(now_cross):
@@ -24,14 +90,71 @@ class MACrossover:
             if prev_cross >= 0 and now_cross < 0:
                 return "SELL"
         return None
+
+    def signal_series(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Versión vectorizada de signal(): devuelve la señal de cada barra
+        ("BUY"/"SELL"/None) en una sola pasada. El valor en la fila i es el
+        mismo que daría signal(df.iloc[:i+1]).
+        """
+        if "close" not in df.columns:
+            raise ValueError("El DataFrame debe contener columna 'close'")
+        prices = df["close"]
+        ma_fast = prices.rolling(self.fast).mean()
+        ma_slow = prices.rolling(self.slow).mean()
+        now_cross = ma_fast - ma_slow
+        prev_cross = now_cross.shift(1)
+        # signal() exige al menos slow + 2 filas
+        warm = pd.Series(np.arange(len(df)) >= self.slow + 1, index=df.index)
+        buy = warm & (prev_cross <= 0) & (now_cross > 0)
+        sell = warm & (prev_cross >= 0) & (now_cross < 0)
+        return _cross_signals(buy, sell)
 # En src/strategy.py (añadir debajo de MACrossover)
 import pandas as pd
 
-class RSIStrategy:
+class RSIStrategy(_Streaming):
     def __init__(self, period: int = 14, buy_level: float = 30.0, sell_level: float = 70.0):
         self.period = period
         self.buy_level = buy_level
         self.sell_level = sell_level
+        self.reset()
+
+    def reset(self) -> None:
+        """Reinicia el estado del modo incremental (medias de Wilder)."""
+        self._avg_gain = EWM(1 / self.period, min_periods=self.period)
+        self._avg_loss = EWM(1 / self.period, min_periods=self.period)
+        self._last_close: Optional[float] = None
+        self._prev_close: Optional[float] = None
+        self._reset_stream()
+
+    def update(self, bar) -> Optional[str]:
+        """Procesa una vela nueva en O(1); equivale a signal() sobre todas las velas vistas."""
+        close, revise = self._read_bar(bar)
+        if not revise:
+            self._prev_close = self._last_close
+        self._last_close = close
+        step = "revise" if revise else "update"
+        if self._prev_close is None:
+            gain = loss = None
+        else:
+            delta = close - self._prev_close
+            gain = delta if delta > 0 else 0.0
+            loss = -(delta if delta < 0 else 0.0)
+        g = getattr(self._avg_gain, step)(gain)
+        l = getattr(self._avg_loss, step)(loss)
+        rsi = None
+        if g is not None and l is not None:
+            rs = g / (l if l != 0 else 1e-12)
+            rsi = 100 - (100 / (1 + rs))
+        self._push(rsi, revise)
+        r0, r1 = self._prev, self._now
+        if self._n < 2 or r0 is None or r1 is None:
+            return None
+        if r0 <= self.buy_level and r1 > self.buy_level:
+            return "BUY"
+        if r0 >= self.sell_level and r1 < self.sell_level:
+            return "SELL"
+        return None
 
     def rsi(self, s: pd.Series) -> pd.Series:
         delta = s.diff()
@@ -42,8 +165,16 @@ class RSIStrategy:
         rs = avg_gain / (avg_loss.replace(0, 1e-12))
         return 100 - (100 / (1 + rs))
 
-    def signal(self, df: pd.DataFrame) -> str | None:
+    def signal_series(self, df: pd.DataFrame) -> pd.Series:
+        """Versión vectorizada de signal(): señal de cada barra en una pasada."""
         rsi = self.rsi(df["close"])
+        r0 = rsi.shift(1)
+        buy = (r0 <= self.buy_level) & (rsi > self.buy_level)
+        sell = (r0 >= self.sell_level) & (rsi < self.sell_level)
+        return _cross_signals(buy, sell)
+
+    def signal(self, df: pd.DataFrame) -> str | None:
+        rsi = STORE.get(df, "rsi", (self.period,), lambda: self.rsi(df["close"]))
         r0, r1 = rsi.iloc[-2], rsi.iloc[-1]
         # BUY cuando cruza hacia arriba nivel de sobreventa
         if r0 <= self.buy_level and r1 > self.buy_level:
@@ -54,19 +185,50 @@ class RSIStrategy:
         return None
 
 
-class MACDStrategy:
+class MACDStrategy(_Streaming):
     def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
         self.fast = fast
         self.slow = slow
         self.signal_p = signal
+        self.reset()
 
-    def signal(self, df: pd.DataFrame) -> str | None:
+    def reset(self) -> None:
+        """Reinicia el estado del modo incremental (estado de las tres EMAs)."""
+        self._ema_fast = EWM.from_span(self.fast)
+        self._ema_slow = EWM.from_span(self.slow)
+        self._ema_sig = EWM.from_span(self.signal_p)
+        self._reset_stream()
+
+    def update(self, bar) -> Optional[str]:
+        """Procesa una vela nueva en O(1); equivale a signal() sobre todas las velas vistas."""
+        close, revise = self._read_bar(bar)
+        step = "revise" if revise else "update"
+        macd = getattr(self._ema_fast, step)(close) - getattr(self._ema_slow, step)(close)
+        sig = getattr(self._ema_sig, step)(macd)
+        self._push(macd - sig, revise)
+        if self._n < 2:
+            return None
+        if self._prev <= 0 and self._now > 0:
+            return "BUY"
+        if self._prev >= 0 and self._now < 0:
+            return "SELL"
+        return None
+
+    def signal_series(self, df: pd.DataFrame) -> pd.Series:
+        """Versión vectorizada de signal(): señal de cada barra en una pasada."""
         close = df["close"]
-        ema_fast = close.ewm(span=self.fast, adjust=False).mean()
-        ema_slow = close.ewm(span=self.slow, adjust=False).mean()
-        macd = ema_fast - ema_slow
-        sig = macd.ewm(span=self.signal_p, adjust=False).mean()
-        hist_prev, hist_curr = (macd - sig).iloc[-2], (macd - sig).iloc[-1]
+        macd = close.ewm(span=self.fast, adjust=False).mean() - close.ewm(span=self.slow, adjust=False).mean()
+        hist = macd - macd.ewm(span=self.signal_p, adjust=False).mean()
+        prev = hist.shift(1)
+        return _cross_signals((prev <= 0) & (hist > 0), (prev >= 0) & (hist < 0))
+
+    def _hist(self, df: pd.DataFrame) -> pd.Series:
+        macd = ema(df, self.fast) - ema(df, self.slow)
+        return macd - macd.ewm(span=self.signal_p, adjust=False).mean()
+
+    def signal(self, df: pd.DataFrame) -> str | None:
+        hist = STORE.get(df, "macd_hist", (self.fast, self.slow, self.signal_p), lambda: self._hist(df))
+        hist_prev, hist_curr = hist.iloc[-2], hist.iloc[-1]
         if hist_prev <= 0 and hist_curr > 0:
             return "BUY"
         if hist_prev >= 0 and hist_curr < 0:
@@ -74,17 +236,57 @@ class MACDStrategy:
         return None
 
 
-class BollingerStrategy:
+class BollingerStrategy(_Streaming):
     def __init__(self, window: int = 20, k: float = 2.0):
         self.window = window
         self.k = k
+        self.reset()
 
-    def signal(self, df: pd.DataFrame) -> str | None:
+    def reset(self) -> None:
+        """Reinicia el estado del modo incremental (media y varianza móviles)."""
+        self._ma = RollingMean(self.window)
+        self._var = RollingVar(self.window)
+        self._reset_stream()
+
+    def update(self, bar) -> Optional[str]:
+        """Procesa una vela nueva en O(1); equivale a signal() sobre todas las velas vistas."""
+        close, revise = self._read_bar(bar)
+        step = "revise" if revise else "update"
+        ma = getattr(self._ma, step)(close)
+        getattr(self._var, step)(close)
+        std = self._var.std
+        if ma is None or std is None:
+            self._push((close, None, None), revise)
+        else:
+            self._push((close, ma + self.k * std, ma - self.k * std), revise)
+        if self._n < 2:
+            return None
+        (c0, u0, l0), (c1, u1, l1) = self._prev, self._now
+        if l0 is None or l1 is None:
+            return None
+        if c0 <= l0 and c1 > l1:
+            return "BUY"
+        if c0 >= u0 and c1 < u1:
+            return "SELL"
+        return None
+
+    def signal_series(self, df: pd.DataFrame) -> pd.Series:
+        """Versión vectorizada de signal(): señal de cada barra en una pasada."""
         close = df["close"]
         ma = close.rolling(self.window).mean()
         std = close.rolling(self.window).std()
         upper = ma + self.k * std
         lower = ma - self.k * std
+        buy = (close.shift(1) <= lower.shift(1)) & (close > lower)
+        sell = (close.shift(1) >= upper.shift(1)) & (close < upper)
+        return _cross_signals(buy, sell)
+
+    def signal(self, df: pd.DataFrame) -> str | None:
+        close = df["close"]
+        ma = sma(df, self.window)
+        std = rolling_std(df, self.window)
+        upper = ma + self.k * std
+        lower = ma - self.k * std
         c0, c1 = close.iloc[-2], close.iloc[-1]
         u0, u1 = upper.iloc[-2], upper.iloc[-1]
         l0, l1 = lower.iloc[-2], lower.iloc[-1]
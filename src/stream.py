@@ -0,0 +1,200 @@
+# src/stream.py
+"""
+Feed de barras por WebSocket (protocolo de market data v2 de Alpaca) para
+--data-mode stream de run_paper.
+
+- Un hilo en segundo plano mantiene la conexión (auth + subscribe, reconexión
+  con backoff) y acumula por símbolo una ventana en memoria (BarRing de
+  `lookback` barras en arrays preasignados; window_df() devuelve una copia
+  tomada bajo el lock, porque el hilo del stream sigue escribiendo).
+- Cada barra 'b' llega cuando su minuto ya cerró: se encola el símbolo y el
+  hilo principal lo recoge con next_bar() para llamar a trade_one_symbol.
+- Las barras corregidas ('u', updatedBars) reemplazan a la de igual timestamp
+  sin disparar un tick nuevo; suben la versión de la ventana, así que el
+  siguiente tick no reutiliza indicadores cacheados con la vela vieja.
+- Trades/quotes opcionales: solo se guarda el último de cada símbolo.
+
+websockets es opcional: solo se importa al arrancar el stream.
+
+Prueba offline con el servidor local (src/stream_server.py):
+  python -m src.stream_server --data AAA=data/AAA.csv --port 8765
+  python -m src.stream --url ws://127.0.0.1:8765 --symbols AAA
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .config import settings
+from .logger import logger
+from .ring_buffer import BarRing, parse_ts
+
+
+class BarStream:
+    def __init__(
+        self,
+        url: str,
+        symbols: Iterable[str],
+        lookback: int = 120,
+        trades: bool = False,
+        quotes: bool = False,
+        key: Optional[str] = None,
+        secret: Optional[str] = None,
+    ):
+        self.url = url
+        self.symbols = [s.upper() for s in symbols]
+        self.lookback = int(lookback)
+        self.trades = trades
+        self.quotes = quotes
+        self.key = key if key is not None else settings.alpaca_api_key
+        self.secret = secret if secret is not None else settings.alpaca_api_secret
+        self._windows: Dict[str, BarRing] = {s: BarRing(self.lookback) for s in self.symbols}
+        self.last_trade: Dict[str, Dict[str, Any]] = {}
+        self.last_quote: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._ready: "queue.Queue[str]" = queue.Queue()
+        self._pending: Set[str] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"connects": 0, "bars": 0, "updated_bars": 0, "trades": 0, "quotes": 0, "errors": 0}
+
+    # ---------- Ventanas ----------
+    def seed(self, frames: Dict[str, pd.DataFrame]) -> None:
+        """Precarga las ventanas con histórico (ej. get_bars_multi) para no esperar al warm-up."""
+        with self._lock:
+            for sym, df in frames.items():
+                win = self._windows.get(sym.upper())
+                if win is None or df is None or df.empty:
+                    continue
+                win.reset()
+                win.extend_df(df)
+
+    def window_df(self, symbol: str) -> pd.DataFrame:
+        with self._lock:
+            win = self._windows.get(symbol.upper())
+            if win is None or not len(win):
+                return pd.DataFrame(columns=["open", "high", "low", "close", "volume"])
+            return win.frame().copy()
+
+    def _on_bar(self, msg: Dict[str, Any], updated: bool) -> None:
+        sym = str(msg.get("S", "")).upper()
+        t = msg.get("t")
+        with self._lock:
+            win = self._windows.get(sym)
+            if win is None or t is None:
+                return
+            ts = parse_ts(t)
+            older = bool(len(win)) and ts < win.last_ts
+            # mismo timestamp: se sustituye; anterior: se corrige si sigue en la ventana
+            win.append(ts, *(float(msg.get(k) or 0.0) for k in ("o", "h", "l", "c", "v")))
+            if older:
+                return
+            if updated:
+                self.stats["updated_bars"] += 1
+                return
+            self.stats["bars"] += 1
+            if sym in self._pending:
+                return  # ya hay un tick pendiente; usará la ventana más reciente
+            self._pending.add(sym)
+        self._ready.put(sym)
+
+    def next_bar(self, timeout: Optional[float] = None) -> Optional[Tuple[str, pd.DataFrame]]:
+        """Bloquea hasta que cierre una barra; devuelve (símbolo, ventana) o None si vence el timeout."""
+        try:
+            sym = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._pending.discard(sym)
+        return sym, self.window_df(sym)
+
+    # ---------- Conexión ----------
+    def _dispatch(self, messages: List[Dict[str, Any]]) -> None:
+        for m in messages:
+            kind = m.get("T")
+            if kind in ("b", "u"):
+                self._on_bar(m, updated=(kind == "u"))
+            elif kind == "t":
+                self.last_trade[str(m.get("S", "")).upper()] = m
+                self.stats["trades"] += 1
+            elif kind == "q":
+                self.last_quote[str(m.get("S", "")).upper()] = m
+                self.stats["quotes"] += 1
+            elif kind == "error":
+                self.stats["errors"] += 1
+                logger.error(f"Stream: error {m.get('code')}: {m.get('msg')}")
+
+    async def _session(self, websockets) -> None:
+        async with websockets.connect(self.url, ping_interval=20, max_queue=None) as ws:
+            self.stats["connects"] += 1
+            await ws.send(json.dumps({"action": "auth", "key": self.key, "secret": self.secret}))
+            sub: Dict[str, Any] = {"action": "subscribe", "bars": self.symbols, "updatedBars": self.symbols}
+            if self.trades:
+                sub["trades"] = self.symbols
+            if self.quotes:
+                sub["quotes"] = self.symbols
+            await ws.send(json.dumps(sub))
+            logger.info(f"Stream conectado a {self.url} ({len(self.symbols)} símbolos)")
+            async for raw in ws:
+                if self._stop.is_set():
+                    return
+                data = json.loads(raw)
+                self._dispatch(data if isinstance(data, list) else [data])
+
+    async def _run(self) -> None:
+        import websockets  # dependencia opcional (solo en --data-mode stream)
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                await self._session(websockets)
+                backoff = 1.0
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                logger.warning(f"Stream desconectado ({e}); reintento en {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="bar-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Cliente de prueba del feed de barras por WebSocket")
+    p.add_argument("--url", type=str, default=settings.alpaca_stream_url)
+    p.add_argument("--symbols", type=str, required=True, help="A,B,C")
+    p.add_argument("--lookback", type=int, default=120)
+    p.add_argument("--trades", action="store_true")
+    p.add_argument("--quotes", action="store_true")
+    p.add_argument("--max-bars", type=int, default=0, help="Termina tras N barras (0 = sin límite)")
+    args = p.parse_args()
+
+    stream = BarStream(args.url, args.symbols.split(","), lookback=args.lookback, trades=args.trades, quotes=args.quotes)
+    stream.start()
+    seen = 0
+    try:
+        while not args.max_bars or seen < args.max_bars:
+            item = stream.next_bar(timeout=5.0)
+            if item is None:
+                print(f"… sin barras (stats={stream.stats})")
+                continue
+            sym, df = item
+            seen += 1
+            last = df.iloc[-1]
+            print(f"🕯️  [{sym}] {df.index[-1]} close={last['close']:.2f} (ventana={len(df)})")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.stop()
+    print(f"Stats: {stream.stats}")
@@ -0,0 +1,122 @@
+# src/stream_server.py
+"""
+Servidor WebSocket local que imita el feed de market data v2 de Alpaca
+(auth, subscribe, mensajes 'b' de barras y, si se piden, 't'/'q') a partir de
+CSVs históricos. Sirve para probar --data-mode stream sin conexión.
+
+- Acepta cualquier key/secret.
+- Cada `--interval` segundos emite la siguiente barra de cada símbolo suscrito.
+- Con --rebase-time los timestamps se reescriben a minutos consecutivos que
+  terminan en el último minuto cerrado al suscribirse (ninguno en el futuro).
+
+Ejemplo:
+  python -m src.stream_server --data AAA=data/AAA.csv,BBB=data/BBB.csv --port 8765 --interval 1
+  python -m src.run_paper --symbols AAA,BBB --data-mode stream --stream-url ws://127.0.0.1:8765 ...
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from .data import load_csv
+from .replay import parse_data_arg
+
+
+def _bar_messages(df: pd.DataFrame, symbol: str) -> List[Dict[str, Any]]:
+    out = []
+    for ts, row in df.iterrows():
+        out.append({
+            "T": "b", "S": symbol, "t": ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "o": float(row["open"]), "h": float(row["high"]), "l": float(row["low"]),
+            "c": float(row["close"]), "v": float(row.get("volume", 0.0)),
+        })
+    return out
+
+
+class FeedServer:
+    def __init__(self, data: Dict[str, pd.DataFrame], interval: float = 1.0, rebase_time: bool = False):
+        self.bars = {sym.upper(): _bar_messages(df, sym.upper()) for sym, df in data.items()}
+        self.interval = float(interval)
+        self.rebase_time = rebase_time
+
+    async def handler(self, ws) -> None:
+        import websockets
+
+        await ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        subs: Dict[str, List[str]] = {"bars": [], "trades": [], "quotes": []}
+        pump = None
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                action = msg.get("action")
+                if action == "auth":
+                    await ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+                elif action == "subscribe":
+                    for kind in subs:
+                        subs[kind] = sorted(set(subs[kind]) | {s.upper() for s in msg.get(kind, [])})
+                    await ws.send(json.dumps([{"T": "subscription", **subs}]))
+                    if pump is None:
+                        pump = asyncio.ensure_future(self._pump(ws, subs))
+        except websockets.ConnectionClosed:
+            pass  # el cliente se fue sin cerrar limpio
+        finally:
+            if pump is not None:
+                pump.cancel()
+
+    async def _pump(self, ws, subs: Dict[str, List[str]]) -> None:
+        i = 0
+        # --rebase-time: base fija; la barra i es base + i y la última cae en el último minuto cerrado
+        longest = max((len(self.bars.get(sym) or []) for sym in subs["bars"]), default=0)
+        base = pd.Timestamp.now(tz="UTC").floor("min") - pd.Timedelta(minutes=longest)
+        while True:
+            await asyncio.sleep(self.interval)
+            batch = []
+            for sym in subs["bars"]:
+                seq = self.bars.get(sym)
+                if not seq or i >= len(seq):
+                    continue
+                bar = dict(seq[i])
+                if self.rebase_time:
+                    bar["t"] = (base + pd.Timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+                batch.append(bar)
+                if sym in subs["trades"]:
+                    batch.append({"T": "t", "S": sym, "p": bar["c"], "s": 100, "t": bar["t"]})
+                if sym in subs["quotes"]:
+                    batch.append({"T": "q", "S": sym, "bp": bar["c"] - 0.01, "ap": bar["c"] + 0.01,
+                                  "bs": 1, "as": 1, "t": bar["t"]})
+            if not batch:
+                return  # histórico agotado
+            await ws.send(json.dumps(batch))
+            i += 1
+
+
+async def serve(server: FeedServer, host: str, port: int) -> None:
+    import websockets  # dependencia opcional
+
+    async with websockets.serve(server.handler, host, port):
+        print(f"📡 Feed local en ws://{host}:{port} ({', '.join(server.bars)})")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Feed WebSocket local (formato Alpaca v2) desde CSVs")
+    p.add_argument("--data", type=str, default="", help="SYM=ruta.csv,SYM2=ruta2.csv")
+    p.add_argument("--data-dir", type=str, default="", help="Carpeta con SYM.csv")
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--interval", type=float, default=1.0, help="Segundos entre barras")
+    p.add_argument("--rebase-time", action="store_true", help="Reescribe los timestamps al minuto actual")
+    args = p.parse_args()
+
+    paths = parse_data_arg(args.data, args.data_dir)
+    if not paths:
+        p.error("Indica --data SYM=ruta.csv o --data-dir")
+    try:
+        asyncio.run(serve(FeedServer({s: load_csv(path) for s, path in paths.items()}, args.interval, args.rebase_time),
+                          args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,307 @@
+# src/sweep.py
+"""
+Barrido de parámetros (grid search) en paralelo para el backtester.
+
+- Genera combinaciones para cada estrategia (ma, rsi, macd, bbands) y para los
+  modos de ensemble (consensus, weighted, stacked).
+- Reparte las combinaciones en un pool de procesos. Las barras se cargan una
+  sola vez en memoria compartida (multiprocessing.shared_memory); cada worker
+  las adjunta al arrancar, sin pickle del DataFrame por tarea.
+- Cada combinación usa las señales vectorizadas (signal_series) y la
+  simulación long-only de backtest.simulate_long_only.
+- Los resultados se van escribiendo en <out>.partial.csv conforme llegan y al
+  final se ordenan (Sharpe, retorno) en <out> (.csv o .parquet).
+
+Ejemplo:
+  python -m src.sweep --file data/AAPL_1m.csv --out data/sweep.csv \
+      --ma-fast 3:20:1 --ma-slow 10:60:5 --bb-k 1.5,2,2.5 --workers 16
+  python -m src.sweep --store data/store --symbol AAPL --start 2024-01-01 --end 2024-06-30 ...
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .backtest import _infer_steps_per_year, simulate_long_only
+from .bar_store import add_store_args, load_store_args
+from .data import load_csv
+from .ensemble import Ensemble, StrategyWrapper
+from .metrics import equity_to_returns, max_drawdown, sharpe_ratio, total_return
+from .strategy import BollingerStrategy, MACDStrategy, MACrossover, RSIStrategy
+
+COLUMNS = ["open", "high", "low", "close", "volume"]
+ENSEMBLE_MODES = ["consensus", "weighted", "stacked"]
+
+
+# ---------------- Rangos de parámetros ----------------
+def parse_range(s: str, cast=float) -> List[Any]:
+    """
+    "a:b:paso" (b incluido) o lista "x,y,z" -> lista de valores.
+    Ej: "3:9:2" -> [3, 5, 7, 9]; "1.5,2" -> [1.5, 2.0]
+    """
+    s = (s or "").strip()
+    if not s:
+        return []
+    if ":" in s:
+        parts = [float(x) for x in s.split(":")]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1.0
+        vals = np.arange(start, stop + step / 2, step)
+        return [cast(round(v, 10)) for v in vals]
+    return [cast(x) for x in s.split(",") if x.strip()]
+
+
+_FLAG_SUFFIX = {"buy_level": "buy", "sell_level": "sell"}
+
+
+def build_grid(args) -> List[Tuple[str, Dict[str, Any]]]:
+    """Lista de tareas (tipo, params). Para el ensemble, los miembros usan el
+    primer valor de cada rango de su estrategia."""
+    kinds = [k.strip().lower() for k in args.strategies.split(",") if k.strip()]
+    grids = {
+        "ma": {"fast": parse_range(args.ma_fast, int), "slow": parse_range(args.ma_slow, int)},
+        "rsi": {"period": parse_range(args.rsi_period, int), "buy_level": parse_range(args.rsi_buy),
+                "sell_level": parse_range(args.rsi_sell)},
+        "macd": {"fast": parse_range(args.macd_fast, int), "slow": parse_range(args.macd_slow, int),
+                 "signal": parse_range(args.macd_signal, int)},
+        "bbands": {"window": parse_range(args.bb_window, int), "k": parse_range(args.bb_k)},
+    }
+    # El ensemble usa el primer valor de cada rango de todos los miembros
+    needed = set(grids) if "ensemble" in kinds else {k for k in kinds if k in grids}
+    for kind in sorted(needed):
+        for key, vals in grids[kind].items():
+            if not vals:
+                flag = f"--{kind.replace('bbands', 'bb')}-{_FLAG_SUFFIX.get(key, key)}"
+                raise ValueError(f"Rango vacío en {flag}" + (" (lo usa el ensemble)" if kind not in kinds else ""))
+    tasks: List[Tuple[str, Dict[str, Any]]] = []
+    for kind in kinds:
+        if kind == "ensemble":
+            continue
+        if kind not in grids:
+            raise ValueError(f"Estrategia desconocida en --strategies: {kind}")
+        keys = list(grids[kind])
+        for combo in itertools.product(*(grids[kind][k] for k in keys)):
+            params = dict(zip(keys, combo))
+            if kind in {"ma", "macd"} and params["fast"] >= params["slow"]:
+                continue
+            tasks.append((kind, params))
+
+    if "ensemble" in kinds:
+        members = {name: {k: v[0] for k, v in g.items()} for name, g in grids.items()}
+        for mode in [m.strip() for m in args.ensemble_modes.split(",") if m.strip()]:
+            if mode not in ENSEMBLE_MODES:
+                raise ValueError(f"Modo de ensemble desconocido: {mode}")
+            # weighted no usa k ni los demás modos min_score: un solo valor para no repetir combinaciones
+            ks = [1] if mode == "weighted" else parse_range(args.ensemble_k, int)
+            scores = parse_range(args.ensemble_min_score) if mode == "weighted" else [1.0]
+            for k, min_score in itertools.product(ks, scores):
+                tasks.append(("ensemble", {"mode": mode, "k": k, "min_score": min_score, "members": members}))
+    return tasks
+
+
+def make_strategy(kind: str, params: Dict[str, Any]):
+    if kind == "ma":
+        return MACrossover(fast=params["fast"], slow=params["slow"])
+    if kind == "rsi":
+        return RSIStrategy(period=params["period"], buy_level=params["buy_level"], sell_level=params["sell_level"])
+    if kind == "macd":
+        return MACDStrategy(fast=params["fast"], slow=params["slow"], signal=params["signal"])
+    if kind == "bbands":
+        return BollingerStrategy(window=params["window"], k=params["k"])
+    raise ValueError(f"Estrategia desconocida: {kind}")
+
+
+# ---------------- Datos compartidos ----------------
+class SharedBars:
+    """Barras OHLCV + timestamps en un bloque de memoria compartida (creado por el padre)."""
+
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        self.shape = (n, len(COLUMNS) + 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, n * self.shape[1] * 8))
+        arr = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        arr[:, 0] = df.index.as_unit("ns").asi8.view(np.float64)  # ns desde epoch, reinterpretado sin pérdida
+        for j, col in enumerate(COLUMNS, start=1):
+            arr[:, j] = df[col].to_numpy(dtype=float) if col in df.columns else np.nan
+        self.tz = str(df.index.tz) if df.index.tz is not None else None
+
+    def spec(self) -> Tuple[str, Tuple[int, int], Optional[str]]:
+        return self.shm.name, self.shape, self.tz
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _attach(name: str, forked: bool) -> shared_memory.SharedMemory:
+    """
+    Abre el bloque del padre sin quitarle el registro en el resource tracker.
+    Con fork el worker comparte el tracker del padre: desregistrar desde aquí
+    borraría el registro del padre (KeyError por worker y sin limpieza si el
+    padre muere). Con spawn/forkserver cada worker tiene el suyo.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if not forked:
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return shm
+
+
+def _init_worker(spec: Tuple[str, Tuple[int, int], Optional[str]], cash: float, fee: float, steps_per_year: int,
+                 forked: bool = True) -> None:
+    name, shape, tz = spec
+    shm = _attach(name, forked)  # el padre es el dueño del bloque
+    arr = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    index = pd.DatetimeIndex(arr[:, 0].view(np.int64).view("datetime64[ns]"), name="timestamp")
+    if tz:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    df = pd.DataFrame({col: arr[:, j] for j, col in enumerate(COLUMNS, start=1)}, index=index, copy=False)
+    _WORKER.update(shm=shm, df=df, close=arr[:, 4], cash=cash, fee=fee, spy=steps_per_year, members={})
+
+
+def _member_signals(name: str, params: Dict[str, Any]) -> np.ndarray:
+    """Señales de un miembro del ensemble, cacheadas por worker."""
+    key = (name, tuple(sorted(params.items())))
+    cache = _WORKER["members"]
+    if key not in cache:
+        cache[key] = make_strategy(name, params).signal_series(_WORKER["df"]).to_numpy()
+    return cache[key]
+
+
+def _ensemble_signals(mode: str, k: int, min_score: float, members: Dict[str, Dict[str, Any]],
+                      weights: Dict[str, float]) -> np.ndarray:
+    """Señales del ensemble en todo el histórico (Ensemble.decide_series, sin filtros de régimen)."""
+    df = _WORKER["df"]
+    matrix = pd.DataFrame({name: pd.Series(_member_signals(name, params), index=df.index, dtype=object)
+                           for name, params in members.items()})
+    wrappers = [StrategyWrapper(name, None, weights.get(name, 1.0)) for name in members]
+    ens = Ensemble(mode=mode, k=k, min_score=min_score, primary="ma")
+    return ens.decide_series(df, wrappers, signals=matrix)["signal"].to_numpy()
+
+
+def _evaluate(task: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    kind, params = task
+    if kind == "ensemble":
+        weights = {"ma": 1.0, "macd": 1.0, "rsi": 0.5, "bbands": 0.5}
+        sig = _ensemble_signals(params["mode"], params["k"], params["min_score"], params["members"], weights)
+        label = {"mode": params["mode"], "k": params["k"], "min_score": params["min_score"]}
+    else:
+        sig = make_strategy(kind, params).signal_series(_WORKER["df"]).to_numpy()
+        label = params
+    equity, _, _ = simulate_long_only(_WORKER["close"], sig, _WORKER["cash"], 0, _WORKER["fee"])
+    eq = pd.Series(equity)
+    return {
+        "strategy": kind,
+        "params": ";".join(f"{k}={v}" for k, v in label.items()),
+        "total_return": total_return(eq),
+        "sharpe": sharpe_ratio(equity_to_returns(eq), steps_per_year=_WORKER["spy"]),
+        "max_drawdown": max_drawdown(eq),
+    }
+
+
+def _evaluate_chunk(chunk: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [_evaluate(t) for t in chunk]
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ---------------- Runner ----------------
+def run_sweep(df: pd.DataFrame, tasks: List[Tuple[str, Dict[str, Any]]], out: str, workers: int = 0,
+              cash: float = 10_000.0, fee: float = 0.0, steps_per_year: int = 0, chunksize: int = 0) -> pd.DataFrame:
+    """Ejecuta las tareas en paralelo, escribe resultados en streaming y devuelve la tabla ordenada."""
+    workers = workers or os.cpu_count() or 1
+    spy = steps_per_year or _infer_steps_per_year(df)
+    chunksize = chunksize or max(1, min(64, len(tasks) // (workers * 8) or 1))
+    partial = f"{out}.partial.csv"
+    fields = ["strategy", "params", "total_return", "sharpe", "max_drawdown"]
+
+    ctx = multiprocessing.get_context()
+    shared = SharedBars(df)
+    rows: List[Dict[str, Any]] = []
+    t0 = time.time()
+    try:
+        with open(partial, "w", newline="", encoding="utf-8") as fh, ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(shared.spec(), cash, fee, spy, ctx.get_start_method() == "fork"),
+        ) as pool:
+            writer = csv.DictWriter(fh, fieldnames=fields)
+            writer.writeheader()
+            futures = [pool.submit(_evaluate_chunk, c) for c in _chunks(tasks, chunksize)]
+            for fut in as_completed(futures):
+                batch = fut.result()
+                writer.writerows(batch)
+                fh.flush()
+                rows.extend(batch)
+                print(f"\r{len(rows)}/{len(tasks)} combinaciones ({time.time() - t0:.1f}s)", end="", flush=True)
+        print()
+    finally:
+        shared.close()
+
+    table = pd.DataFrame(rows, columns=fields).sort_values(["sharpe", "total_return"], ascending=False)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    if out.endswith(".parquet"):
+        table.to_parquet(out, index=False)  # requiere pyarrow o fastparquet
+    else:
+        table.to_csv(out, index=False)
+    os.remove(partial)
+    return table
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Barrido de parámetros en paralelo (estrategias y ensemble)")
+    p.add_argument("--file", default="", help="CSV: timestamp, open, high, low, close, volume")
+    add_store_args(p)
+    p.add_argument("--out", default="data/sweep.csv", help="Salida ordenada (.csv o .parquet)")
+    p.add_argument("--workers", type=int, default=0, help="Procesos (0 = nº de CPUs)")
+    p.add_argument("--chunksize", type=int, default=0, help="Combinaciones por tarea (0 = auto)")
+    p.add_argument("--cash", type=float, default=10_000.0)
+    p.add_argument("--fee", type=float, default=0.0)
+    p.add_argument("--steps-per-year", type=int, default=0, help="Override de anualización (0 = inferir)")
+    p.add_argument("--strategies", default="ma,rsi,macd,bbands,ensemble",
+                   help="Lista de: ma, rsi, macd, bbands, ensemble")
+    # Rangos "a:b:paso" o listas "x,y"
+    p.add_argument("--ma-fast", default="3:15:2")
+    p.add_argument("--ma-slow", default="10:60:10")
+    p.add_argument("--rsi-period", default="7:21:7")
+    p.add_argument("--rsi-buy", default="25,30")
+    p.add_argument("--rsi-sell", default="70,75")
+    p.add_argument("--macd-fast", default="8:12:2")
+    p.add_argument("--macd-slow", default="21:30:3")
+    p.add_argument("--macd-signal", default="9")
+    p.add_argument("--bb-window", default="10:30:5")
+    p.add_argument("--bb-k", default="1.5,2,2.5")
+    p.add_argument("--ensemble-modes", default="consensus,weighted,stacked")
+    p.add_argument("--ensemble-k", default="1:3:1")
+    p.add_argument("--ensemble-min-score", default="1,1.5,2")
+    args = p.parse_args()
+
+    if not args.file and not args.store:
+        p.error("Indica --file o --store/--symbol")
+    bars = load_store_args(args) if args.store else load_csv(args.file)
+    try:
+        grid = build_grid(args)
+    except ValueError as e:
+        p.error(str(e))
+    print(f"▶️ Sweep: {len(grid)} combinaciones, {len(bars)} barras")
+    res = run_sweep(bars, grid, args.out, workers=args.workers, cash=args.cash, fee=args.fee,
+                    steps_per_year=args.steps_per_year, chunksize=args.chunksize)
+    print(res.head(10).to_string(index=False))
+    print(f"✅ Resultados en {args.out}")
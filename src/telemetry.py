@@ -0,0 +1,248 @@
+# src/telemetry.py
+"""
+Métricas del loop en vivo: latencia por etapa, latencia HTTP por endpoint y
+contadores (señales, órdenes, rechazos del RiskManager por motivo).
+
+- Histogramas de cubetas fijas (observe = bisect + suma bajo un lock, ~2 µs);
+  p50/p95/p99 se interpolan dentro de la cubeta, como histogram_quantile de
+  Prometheus.
+- render() produce el formato de texto de Prometheus; start_http_server()
+  lo sirve en http://127.0.0.1:<puerto>/metrics (run_paper --metrics-port).
+- METRICS es el registro compartido del proceso; METRICS.enabled = False
+  desactiva la recogida (para medir el overhead).
+
+Ejemplo:
+  python -m src.run_paper --symbols AAPL,MSFT --metrics-port 9108 ...
+  curl -s http://127.0.0.1:9108/metrics | grep bot_stage_seconds_quantile
+  python -m src.telemetry --bench
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Segundos: de 100 µs (señal con caché) a 60 s (sleep del loop)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Cubetas acumulables de una serie (nombre + etiquetas)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # la última es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Interpolación lineal dentro de la cubeta que contiene el rango q·count."""
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]  # en +Inf: cota inferior conocida
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                return lo + (self.bounds[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # nombre -> (tipo, ayuda)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, Histogram]] = {}
+        self._keys: Dict[tuple, Labels] = {}  # etiquetas tal cual -> clave normalizada (cardinalidad baja)
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def _key(self, labels: Dict[str, object]) -> Labels:
+        raw = tuple(labels.items())
+        key = self._keys.get(raw)
+        if key is None:
+            key = self._keys[raw] = _labels(labels)
+        return key
+
+    def inc(self, name: str, value: float = 1.0, **labels: object) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels: object) -> None:
+        if self.enabled:
+            self._observe(name, self._key(labels), seconds)
+
+    def _observe(self, name: str, key: Labels, seconds: float) -> None:
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = Histogram()
+            h.observe(seconds)
+
+    def timer(self, name: str, **labels: object) -> "_Timer":
+        """with METRICS.timer("bot_stage_seconds", stage="signal"): ..."""
+        return _Timer(self, name, self._key(labels))
+
+    def quantiles(self, name: str) -> Dict[Labels, Dict[float, float]]:
+        with self._lock:
+            return {k: {q: h.quantile(q) for q in QUANTILES} for k, h in self._hists.get(name, {}).items()}
+
+    def render(self) -> str:
+        """Formato de texto de Prometheus (0.0.4)."""
+        out: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = self._help.get(name, ("counter", name))
+                out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                out += [f"{name}{_fmt_labels(k)} {v:g}" for k, v in sorted(series.items())]
+            for name, series in sorted(self._hists.items()):
+                _, help_text = self._help.get(name, ("histogram", name))
+                out += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for k, h in sorted(series.items()):
+                    acc = 0
+                    for bound, c in zip(list(h.bounds) + [float("inf")], h.counts):
+                        acc += c
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        out.append(f"{name}_bucket{_fmt_labels(k, ('le', le))} {acc}")
+                    out.append(f"{name}_sum{_fmt_labels(k)} {h.sum:.9g}")
+                    out.append(f"{name}_count{_fmt_labels(k)} {h.count}")
+                qname = f"{name}_quantile"
+                out += [f"# HELP {qname} p50/p95/p99 estimados de {name}", f"# TYPE {qname} gauge"]
+                for k, h in sorted(series.items()):
+                    out += [f"{qname}{_fmt_labels(k, ('quantile', f'{q:g}'))} {h.quantile(q):.9g}" for q in QUANTILES]
+        return "\n".join(out) + "\n"
+
+    def report(self, name: str) -> str:
+        """Resumen legible: una línea por serie con p50/p95/p99 en ms."""
+        lines = []
+        for k, qs in sorted(self.quantiles(name).items()):
+            tag = ",".join(f"{a}={b}" for a, b in k) or "-"
+            lines.append(f"{tag}: " + " ".join(f"p{int(q * 100)}={v * 1000:.2f}ms" for q, v in qs.items()))
+        return "\n".join(lines)
+
+
+class _Timer:
+    """Context manager de Registry.timer (clase con __slots__: más barato que @contextmanager)."""
+
+    __slots__ = ("registry", "name", "key", "t0")
+
+    def __init__(self, registry: Registry, name: str, key: Labels):
+        self.registry, self.name, self.key = registry, name, key
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.registry.enabled:
+            self.registry._observe(self.name, self.key, time.perf_counter() - self.t0)
+
+
+METRICS = Registry()
+METRICS.describe("bot_stage_seconds", "histogram", "Latencia por etapa del tick (s)")
+METRICS.describe("bot_http_seconds", "histogram", "Latencia HTTP por endpoint de Alpaca (s)")
+METRICS.describe("bot_http_requests_total", "counter", "Peticiones HTTP por endpoint, método y status")
+METRICS.describe("bot_signals_total", "counter", "Señales generadas por valor")
+METRICS.describe("bot_orders_total", "counter", "Órdenes de mercado enviadas por lado")
+METRICS.describe("bot_risk_rejections_total", "counter", "Entradas rechazadas por el RiskManager por motivo")
+METRICS.describe("bot_ticks_total", "counter", "Ticks por símbolo por estado")
+
+_ID_SEGMENT = re.compile(r"/(stocks|assets|orders|positions)/(?!bars(?:/|$))[^/?]+")
+
+
+def endpoint_label(url: str) -> str:
+    """URL -> plantilla de endpoint sin símbolos ni ids (/v2/orders/{id}, /stocks/{symbol}/bars...)."""
+    path = re.sub(r"^https?://[^/]+", "", url).split("?", 1)[0]
+    path = _ID_SEGMENT.sub(lambda m: f"/{m.group(1)}/{{id}}" if m.group(1) == "orders"
+                           else f"/{m.group(1)}/{{symbol}}", path)
+    return path
+
+
+def reason_label(reason: str) -> str:
+    """Motivo de RiskDecision sin cifras ni símbolo ("RR 1.10 < min 1.3" -> "RR")."""
+    head = re.match(r"[^\d(\$]*", reason or "").group().rstrip(" =<>:")
+    return re.sub(r"\s+en\s+\S+$", "", head) or "otro"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = METRICS
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass  # sin una línea por scrape en consola
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Registry = METRICS) -> ThreadingHTTPServer:
+    """Sirve /metrics en un hilo daemon; devuelve el servidor (shutdown() para pararlo)."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Microbenchmark del coste de instrumentar (observe/timer/inc)")
+    p.add_argument("--bench", action="store_true")
+    p.add_argument("--n", type=int, default=200_000)
+    args = p.parse_args()
+
+    reg = Registry()
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        with reg.timer("bot_stage_seconds", stage="signal"):
+            pass
+    t_timer = (time.perf_counter() - t0) / args.n
+    t0 = time.perf_counter()
+    for i in range(args.n):
+        reg.inc("bot_signals_total", signal="BUY")
+    t_inc = (time.perf_counter() - t0) / args.n
+    print(f"timer: {t_timer * 1e6:.2f} µs/obs | inc: {t_inc * 1e6:.2f} µs/obs")
+    print(reg.report("bot_stage_seconds"))
@@ -0,0 +1,25 @@
+# tests/conftest.py
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_bars(n: int = 400, seed: int = 0, start: str = "2024-01-02 14:30", freq: str = "min") -> pd.DataFrame:
+    """Velas OHLCV sintéticas (paseo aleatorio) con índice "timestamp" UTC, como data.load_csv."""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range(start, periods=n, freq=freq, tz="UTC", name="timestamp")
+    close = 100 + rng.normal(0, 0.2, n).cumsum()
+    open_ = np.r_[close[0], close[:-1]]
+    spread = rng.uniform(0.01, 0.3, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.integers(100, 10_000, n).astype(float),
+    }, index=idx)
+
+
+@pytest.fixture
+def bars() -> pd.DataFrame:
+    return make_bars()
@@ -0,0 +1,26 @@
+# tests/test_bar_cache.py
+import pandas as pd
+
+from src.bar_cache import BarCache
+
+
+def _bars(start: str, n: int):
+    idx = pd.date_range(start, periods=n, freq="min", tz="UTC")
+    return [{"t": t, "o": 1.0, "h": 1.0, "l": 1.0, "c": float(i), "v": 1} for i, t in
+            enumerate(idx.strftime("%Y-%m-%dT%H:%M:%SZ"))]
+
+
+def test_incremental_fetch_pages_through_long_gap():
+    """Tras un hueco de más de una página, la caché pide hasta el final (no sirve una ventana vieja)."""
+    feed = _bars("2024-01-02 14:30", 3_000)
+    calls = []
+
+    def fetcher(symbol, timeframe, limit, start_iso):
+        calls.append(start_iso)
+        return [b for b in feed if start_iso is None or b["t"] >= start_iso][:limit]
+
+    cache = BarCache(cache_dir=None)
+    cache.merge("AAA", "1Min", feed[:100])
+    out = cache.fetch(fetcher, "AAA", "1Min", limit=120, incremental_limit=1_000)
+    assert [b["t"] for b in out] == [b["t"] for b in feed[-120:]]
+    assert len(calls) == 3  # desde la vela 99: 1000 (llena) + 1000 (llena) + 903
@@ -0,0 +1,47 @@
+# tests/test_bar_store.py
+"""BarStore.read == load_csv + filtro por fechas (end inclusivo; una fecha sola cubre el día)."""
+import pandas as pd
+import pytest
+
+from src.bar_store import BarStore
+from src.data import load_csv
+from tests.conftest import make_bars
+
+
+@pytest.fixture
+def csv_and_store(tmp_path):
+    df = make_bars(2_000, freq="h", start="2024-01-15 00:00")  # cruza 3 particiones mensuales
+    path = tmp_path / "AAA.csv"
+    df.to_csv(path)
+    store = BarStore(str(tmp_path / "store"))
+    store.convert_csv(str(path), "AAA", "1Hour", chunksize=300)
+    return load_csv(str(path)), store
+
+
+def _ref(df, start, end):
+    out = df
+    if start:
+        out = out.loc[pd.Timestamp(start, tz="UTC"):]
+    if end:
+        out = out.loc[:end]  # cadena: .loc incluye todo lo que cae en esa fecha/hora
+    out.index = out.index.as_unit("ns")
+    return out
+
+
+@pytest.mark.parametrize("start,end", [
+    (None, None),
+    ("2024-01-20", "2024-02-29"),  # fin de mes: el último día entero
+    ("2024-02-01 05:00", "2024-03-10 17:00"),
+    ("2024-03-01", "2024-03-01"),
+])
+def test_store_matches_csv(csv_and_store, start, end):
+    df, store = csv_and_store
+    got = store.read("AAA", "1Hour", start=start, end=end)
+    pd.testing.assert_frame_equal(got, _ref(df, start, end), check_freq=False)
+
+
+def test_date_only_end_includes_whole_day(csv_and_store):
+    _, store = csv_and_store
+    got = store.read("AAA", "1Hour", start="2024-02-29", end="2024-02-29")
+    assert len(got) == 24
+    assert got.index[-1] == pd.Timestamp("2024-02-29 23:00", tz="UTC")
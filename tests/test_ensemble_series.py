@@ -0,0 +1,35 @@
+# tests/test_ensemble_series.py
+"""decide_series(df) fila a fila == decide(df.iloc[:i+1])."""
+import pytest
+
+from src.ensemble import Ensemble, StrategyWrapper
+from src.strategy import BollingerStrategy, MACrossover, RSIStrategy
+
+
+def _wrappers():
+    return [
+        StrategyWrapper("ma", MACrossover(fast=3, slow=7), weight=1.0),
+        StrategyWrapper("rsi", RSIStrategy(period=5, buy_level=45, sell_level=55), weight=0.7),
+        StrategyWrapper("bollinger", BollingerStrategy(window=10, k=0.5), weight=0.4),
+    ]
+
+
+@pytest.mark.parametrize("mode,k", [("consensus", 1), ("consensus", 2), ("weighted", 1), ("stacked", 2)])
+@pytest.mark.parametrize("gates", [False, True])
+def test_decide_series_matches_decide(mode, k, gates, bars):
+    bars = bars.iloc[:250]
+    ens = Ensemble(mode=mode, k=k, min_score=0.9, primary="ma",
+                   use_trend_filter=gates, trend_window=20,
+                   use_atr_filter=gates, atr_window=5, atr_threshold=0.002)
+    wrappers = _wrappers()
+    series = ens.decide_series(bars, wrappers)
+    decided = 0
+    for i in range(1, len(bars)):
+        final, meta = ens.decide(bars.iloc[: i + 1], wrappers)
+        row = series.iloc[i]
+        assert row["signal"] == final, f"vela {i}"
+        assert (row["buys"], row["sells"]) == (meta["votes"]["BUY"], meta["votes"]["SELL"])
+        assert row["score"] == meta["score"]
+        assert {w.name: row[w.name] for w in wrappers} == meta["signals"]
+        decided += final != "HOLD"
+    assert decided > 0
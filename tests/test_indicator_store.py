@@ -0,0 +1,42 @@
+# tests/test_indicator_store.py
+"""IndicatorStore: una corrección en la ventana ring invalida las series cacheadas."""
+from src.indicators import IndicatorStore
+from src.ring_buffer import BarRing
+from tests.conftest import make_bars
+
+
+def _ring(df, window=50):
+    ring = BarRing(window)
+    ring.extend_df(df)
+    return ring
+
+
+def _sma(store, ring):
+    df = ring.frame()
+    df.attrs["symbol"], df.attrs["timeframe"] = "AAA", "1Min"
+    return store.get(df, "sma", ("close", 5), lambda: df["close"].rolling(5).mean().copy())
+
+
+def test_corrected_older_bar_misses_cache():
+    df = make_bars(80)
+    ring, store = _ring(df), IndicatorStore()
+    before = _sma(store, ring)
+    assert _sma(store, ring) is before  # misma ventana: hit
+
+    ts = int(ring.arrays()["ts"][-10])
+    o, h, l, c, v = ring.frame().iloc[-10]
+    ring.append(ts, o, h + 5, l, c + 5, v)  # corrige una vela que no es la última
+
+    after = _sma(store, ring)
+    assert after is not before
+    assert after.iloc[-10] != before.iloc[-10]
+    assert store.stats == {"hits": 1, "misses": 2, "evictions": 0, "uncached": 0}
+
+
+def test_identical_rewrite_keeps_cache():
+    df = make_bars(80)
+    ring, store = _ring(df), IndicatorStore()
+    before = _sma(store, ring)
+    ring.extend_df(df.iloc[-5:])  # el broker devuelve otra vez la última vela sin cambios
+    assert ring.version == 0
+    assert _sma(store, ring) is before
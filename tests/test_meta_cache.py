@@ -0,0 +1,22 @@
+# tests/test_meta_cache.py
+from src.meta_cache import AssetCache
+
+
+def test_failed_bulk_load_backs_off_and_fetches_single_assets():
+    calls = {"all": 0, "one": []}
+
+    def fetch_all():
+        calls["all"] += 1
+        raise ConnectionError("503")
+
+    def fetch_one(symbol):
+        calls["one"].append(symbol)
+        return {"symbol": symbol, "tradable": True}
+
+    cache = AssetCache(fetch_all, fetch_one, retry_seconds=60)
+    for _ in range(3):
+        for sym in ("AAA", "BBB"):
+            assert cache.tradable(sym)
+    assert calls["all"] == 1  # un único intento hasta que pase retry_seconds
+    assert calls["one"] == ["AAA", "BBB"]
+    assert cache.stats["bulk_failures"] == 1
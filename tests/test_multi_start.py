@@ -0,0 +1,30 @@
+# tests/test_multi_start.py
+"""multi_start_iso: sin caché, la petición multi no baja toda la ventana --hours-back en cada tick."""
+import pandas as pd
+
+from src.run_paper import multi_start_iso
+
+HOURS_BACK = "2024-03-04T10:00:00Z"
+NOW = pd.Timestamp("2024-03-05 15:00", tz="UTC")
+
+
+def _ns(s):
+    return pd.Timestamp(s, tz="UTC").value
+
+
+def test_frame_mode_uses_lookback_times_timeframe():
+    assert multi_start_iso(HOURS_BACK, "1Min", 120, now=NOW) == "2024-03-05T13:00:00Z"
+    assert multi_start_iso(HOURS_BACK, "15Min", 20, now=NOW) == "2024-03-05T10:00:00Z"
+
+
+def test_never_before_hours_back():
+    assert multi_start_iso(HOURS_BACK, "1Hour", 120, now=NOW) == HOURS_BACK
+
+
+def test_ring_mode_starts_at_oldest_last_bar():
+    last = [_ns("2024-03-05 14:58"), _ns("2024-03-05 14:55")]
+    assert multi_start_iso(HOURS_BACK, "1Min", 120, last) == "2024-03-05T14:55:00Z"
+
+
+def test_ring_mode_first_load_uses_hours_back():
+    assert multi_start_iso(HOURS_BACK, "1Min", 120, [_ns("2024-03-05 14:58"), None]) == HOURS_BACK
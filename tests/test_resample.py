@@ -0,0 +1,46 @@
+# tests/test_resample.py
+"""Resampler incremental == pandas resample (solo cubetas completas)."""
+import pandas as pd
+import pytest
+
+from src.resample import Resampler
+from tests.conftest import make_bars
+
+AGG = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+
+
+def _feed(df: pd.DataFrame, r: Resampler, window: int = 300) -> pd.DataFrame:
+    """Simula el loop: una vela nueva por update() sobre una ventana deslizante."""
+    out = None
+    for end in range(1, len(df) + 1):
+        out = r.update(df.iloc[max(0, end - window):end])
+    return out
+
+
+def _complete(df: pd.DataFrame, rule: str, **kw) -> pd.DataFrame:
+    """pandas resample sin la primera ni la última cubeta si no tienen todos sus minutos."""
+    full = df.resample(rule, label="left", closed="left", **kw).agg(AGG).dropna()
+    counts = df["close"].resample(rule, label="left", closed="left", **kw).count()
+    per_bucket = int(pd.Timedelta(rule) / pd.Timedelta("1min"))
+    full = full[counts.reindex(full.index) == per_bucket]
+    full.index = full.index.as_unit("ns")
+    return full
+
+
+@pytest.mark.parametrize("timeframe,rule", [("5Min", "5min"), ("15Min", "15min")])
+def test_epoch_buckets_match_pandas(timeframe, rule):
+    df = make_bars(2_000, start="2024-01-02 14:33")  # empieza a mitad de cubeta
+    out = _feed(df, Resampler(timeframe))
+    expected = _complete(df, rule)
+    assert out.index[0] == expected.index[0]  # la cubeta inicial incompleta no aparece
+    pd.testing.assert_frame_equal(out, expected, check_freq=False, check_names=False)
+
+
+def test_session_buckets_match_pandas():
+    # Cruza el cambio de horario de EE. UU. (10-mar-2024)
+    df = make_bars(6_000, start="2024-03-07 14:40")
+    out = _feed(df, Resampler("1Hour", origin="session"))
+    local = df.tz_convert("America/New_York")
+    expected = _complete(local, "60min", offset="30min").tz_convert("UTC")
+    expected.index.name = "timestamp"
+    pd.testing.assert_frame_equal(out, expected, check_freq=False, check_names=False)
@@ -0,0 +1,50 @@
+# tests/test_ring_buffer.py
+"""Las vistas entregadas por BarRing no cambian por correcciones, resets ni `slack` velas nuevas."""
+import numpy as np
+
+from src.ring_buffer import BarRing
+from src.stream import BarStream
+from tests.conftest import make_bars
+
+
+def _snapshot(df):
+    return df.to_numpy().copy(), df.index.copy()
+
+
+def _unchanged(df, snap):
+    return np.array_equal(df.to_numpy(), snap[0]) and df.index.equals(snap[1])
+
+
+def test_views_survive_corrections_and_slack_appends():
+    bars = make_bars(200)
+    ring = BarRing(50, slack=8)
+    ring.extend_df(bars.iloc[:100])
+    view = ring.frame()
+    snap = _snapshot(view)
+
+    ts = int(ring.arrays()["ts"][-1])
+    ring.append(ts, 1.0, 2.0, 0.5, 1.5, 10.0)  # vela en formación reescrita
+    ts = int(ring.arrays()["ts"][-20])
+    ring.append(ts, 1.0, 2.0, 0.5, 1.5, 10.0)  # corrección de una vela anterior
+    for ts, row in zip(bars.index[100:108].as_unit("ns").asi8, bars.iloc[100:108].to_numpy()):
+        ring.append(int(ts), *row)  # hasta `slack` velas nuevas
+    assert _unchanged(view, snap)
+    assert ring.frame()["close"].iat[-9] == 1.5  # la ventana actual sí ve la corrección
+
+    view = ring.frame()
+    snap = _snapshot(view)
+    ring.extend_df(bars.iloc[150:160])  # hueco: reset
+    assert _unchanged(view, snap)
+    assert ring.frame().index.equals(bars.index[150:160])
+
+
+def test_stream_window_is_a_copy():
+    bars = make_bars(150)
+    stream = BarStream("ws://unused", ["AAA"], lookback=30)  # slack 64 por defecto
+    stream.seed({"AAA": bars.iloc[:40]})
+    df = stream.window_df("AAA")
+    snap = _snapshot(df)
+    for ts, row in bars.iloc[40:].iterrows():  # más velas que el slack
+        stream._on_bar({"S": "AAA", "t": ts.isoformat(), "o": row.open, "h": row.high, "l": row.low,
+                        "c": row.close, "v": row.volume}, updated=False)
+    assert _unchanged(df, snap)
@@ -0,0 +1,44 @@
+# tests/test_risk_state.py
+"""
+BarRiskState (O(1) por vela) == RiskManager._atr / _estimate_liquidity_dollar sobre la
+ventana, salvo el redondeo de las sumas móviles (rel 1e-12).
+"""
+import pytest
+
+from src.risk_manager_avanzado import BarRiskState, RiskConfig, RiskManager, SimpleAdapter
+
+
+@pytest.mark.parametrize("smoothing", ["sma", "wilder"])
+def test_update_matches_window(smoothing, bars):
+    rm = RiskManager(RiskConfig(), SimpleAdapter())
+    st = BarRiskState(atr_window=14, liq_window=20, smoothing=smoothing)
+    h, l, c, v = (bars[f].to_numpy() for f in ("high", "low", "close", "volume"))
+    for i in range(len(bars)):
+        st.update(h[i], l[i], c[i], v[i])
+        atr = RiskManager._atr(h[: i + 1], l[: i + 1], c[: i + 1], 14, smoothing)
+        liq = rm._estimate_liquidity_dollar(c[: i + 1], v[: i + 1], 20)
+        if atr is None:
+            assert st.atr is None, f"vela {i}"
+        else:
+            assert st.atr == pytest.approx(atr, rel=1e-12), f"vela {i}"
+        if liq is None:
+            assert st.liq is None, f"vela {i}"
+        else:
+            assert st.liq == pytest.approx(liq, rel=1e-12), f"vela {i}"
+
+
+def test_sync_revises_last_bar_and_rebuilds_after_gap(bars):
+    rm = RiskManager(RiskConfig(), SimpleAdapter())
+    st = BarRiskState(atr_window=14, liq_window=20)
+    st.sync(bars.iloc[:100])
+    fixed = bars.iloc[:101].copy()
+    fixed.iloc[-2, fixed.columns.get_loc("high")] += 1.0  # la última vela vista cambia
+    st.sync(fixed.iloc[-30:])
+    cols = {f: fixed[f].to_numpy() for f in ("high", "low", "close", "volume")}
+    assert st.atr == pytest.approx(RiskManager._atr(cols["high"], cols["low"], cols["close"], 14), rel=1e-12)
+    assert st.liq == pytest.approx(rm._estimate_liquidity_dollar(cols["close"], cols["volume"], 20), rel=1e-12)
+
+    later = bars.iloc[200:260]  # no contiene la última vela vista: se reconstruye
+    st.sync(later)
+    cols = {f: later[f].to_numpy() for f in ("high", "low", "close", "volume")}
+    assert st.atr == pytest.approx(RiskManager._atr(cols["high"], cols["low"], cols["close"], 14), rel=1e-12)
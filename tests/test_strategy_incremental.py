@@ -0,0 +1,37 @@
+# tests/test_strategy_incremental.py
+"""update(bar) en streaming da la misma señal que signal(df) sobre las velas vistas."""
+import pytest
+
+from src.strategy import BollingerStrategy, MACDStrategy, MACrossover, RSIStrategy
+
+STRATEGIES = [
+    lambda: MACrossover(fast=3, slow=7),
+    lambda: RSIStrategy(period=5, buy_level=40, sell_level=60),
+    lambda: MACDStrategy(fast=5, slow=13, signal=4),
+    lambda: BollingerStrategy(window=10, k=1.0),
+]
+
+
+@pytest.mark.parametrize("make", STRATEGIES)
+def test_update_matches_signal(make, bars):
+    batch, stream = make(), make()
+    seen = 0
+    for i in range(len(bars)):
+        got = stream.update(bars.iloc[i])
+        if i >= 1:
+            assert got == batch.signal(bars.iloc[: i + 1]), f"vela {i}"
+            seen += got is not None
+    assert seen > 0  # los datos de prueba generan señales
+
+
+@pytest.mark.parametrize("make", STRATEGIES)
+def test_revised_bar_matches_signal(make, bars):
+    """Repetir el timestamp de la última vela es una corrección, no una vela nueva."""
+    stream = make()
+    for i in range(len(bars) - 1):
+        stream.update(bars.iloc[i])
+    fixed = bars.copy()
+    fixed.iloc[-2, fixed.columns.get_loc("close")] += 0.5
+    got = stream.update(fixed.iloc[-2])
+    assert got == make().signal(fixed.iloc[:-1])
+    assert stream.update(fixed.iloc[-1]) == make().signal(fixed)
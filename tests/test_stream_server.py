@@ -0,0 +1,35 @@
+# tests/test_stream_server.py
+"""FeedServer --rebase-time: barras consecutivas a 1 minuto y ninguna en el futuro."""
+import asyncio
+import json
+
+import pandas as pd
+
+from src.stream_server import FeedServer
+from tests.conftest import make_bars
+
+
+class _FakeWS:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, raw):
+        self.sent.extend(json.loads(raw))
+
+
+def test_rebased_bars_are_one_minute_apart_and_not_in_future():
+    server = FeedServer({"AAA": make_bars(30), "BBB": make_bars(20, seed=1)}, interval=0.0, rebase_time=True)
+    ws = _FakeWS()
+    asyncio.run(server._pump(ws, {"bars": ["AAA", "BBB"], "trades": [], "quotes": []}))
+    now = pd.Timestamp.now(tz="UTC")
+
+    for sym, n in (("AAA", 30), ("BBB", 20)):
+        ts = pd.DatetimeIndex([pd.Timestamp(m["t"]) for m in ws.sent if m["S"] == sym])
+        assert len(ts) == n
+        assert (ts[1:] - ts[:-1] == pd.Timedelta(minutes=1)).all()
+        assert ts[-1] < now.floor("min")  # solo minutos ya cerrados
+    aaa = [pd.Timestamp(m["t"]) for m in ws.sent if m["S"] == "AAA"]
+    bbb = [pd.Timestamp(m["t"]) for m in ws.sent if m["S"] == "BBB"]
+    assert aaa[:20] == bbb  # misma barra i, mismo timestamp en todos los símbolos
+    # la serie más larga acaba en el último minuto cerrado (tolerando un cambio de minuto durante el test)
+    assert now.floor("min") - aaa[-1] in (pd.Timedelta(minutes=1), pd.Timedelta(minutes=2))
@@ -0,0 +1,23 @@
+# tests/test_sweep.py
+"""build_grid: cada combinación del ensemble aparece una sola vez."""
+from types import SimpleNamespace
+
+from src.sweep import build_grid
+
+
+def _args(**kw):
+    base = dict(strategies="ensemble", ma_fast="3", ma_slow="10", rsi_period="7", rsi_buy="30", rsi_sell="70",
+                macd_fast="8", macd_slow="21", macd_signal="9", bb_window="20", bb_k="2",
+                ensemble_modes="consensus,weighted,stacked", ensemble_k="1:3:1", ensemble_min_score="1,1.5,2")
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+def test_weighted_ignores_k_and_others_ignore_min_score():
+    tasks = build_grid(_args())
+    combos = [(p["mode"], p["k"], p["min_score"]) for _, p in tasks]
+    assert len(combos) == len(set(combos))
+    assert sorted(c for c in combos if c[0] == "weighted") == [("weighted", 1, 1.0), ("weighted", 1, 1.5),
+                                                                ("weighted", 1, 2.0)]
+    assert sum(c[0] == "consensus" for c in combos) == 3
+    assert sum(c[0] == "stacked" for c in combos) == 3
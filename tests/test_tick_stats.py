@@ -0,0 +1,35 @@
+# tests/test_tick_stats.py
+"""TickStats.emit deja en el log la línea de resumen del tick."""
+import logging
+
+from src.logger import logger
+from src.run_paper import TickStats
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_emit_logs_summary():
+    cap = _Capture()
+    logger.addHandler(cap)
+    try:
+        stats = TickStats()
+        for status in ("OK", "OK", "WARMUP"):
+            stats.add(status)
+        stats.emit("Tick")
+    finally:
+        logger.removeHandler(cap)
+
+    summaries = [r for r in cap.records if getattr(r, "summary", False)]
+    assert len(summaries) == 1
+    rec = summaries[0]
+    assert rec.getMessage().startswith("📊 Tick: 3 símbolos (OK=2 WARMUP=1)")
+    assert "indicadores" in rec.getMessage()
+    assert rec.fields["statuses"] == {"OK": 2, "WARMUP": 1}
+    assert stats.counts == {}  # emit reinicia los contadores
@@ -0,0 +1,42 @@
+# tests/test_timeframes.py
+import pytest
+
+from src.risk_manager_avanzado import Side
+from src.run_paper import build_parser, execute_symbol, parse_tf_strategies
+
+
+class _Broker:
+    def __init__(self, qty: int):
+        self.qty = qty
+        self.orders = []
+
+    def get_position_qty(self, symbol):
+        return self.qty
+
+    def place_order_market(self, symbol, side, qty, tif="day"):
+        self.orders.append((symbol, side, qty))
+        return {"id": "x"}
+
+
+class _Risk:
+    def should_halt_trading(self):
+        return False, ""
+
+
+def test_position_is_managed_only_by_its_timeframe(bars):
+    args = build_parser().parse_args([])
+    book = {"AAA": {"side": Side.LONG, "qty": 10, "entry": 100.0, "stop": 99.0, "take": 110.0, "tf": "1Min"}}
+    broker = _Broker(qty=10)
+    ctx = {"df": bars, "price": 50.0, "ma_fast": None, "ma_slow": None, "sig": "SELL", "timeframe": "15Min"}
+    # Stop tocado y señal de salida en 15Min: no cierra la posición abierta desde 1Min
+    execute_symbol(broker, _Risk(), "AAA", args, book, [], {"pnl_today": 0.0}, ctx)
+    assert broker.orders == []
+    assert "AAA" in book
+
+
+def test_parse_tf_strategies_validates_names_and_timeframes():
+    assert parse_tf_strategies("15Min=MACD", ["1Min", "15Min"]) == {"15Min": "macd"}
+    with pytest.raises(ValueError):
+        parse_tf_strategies("5Min=rsi", ["1Min"])
+    with pytest.raises(ValueError):
+        parse_tf_strategies("1Min=foo", ["1Min"])